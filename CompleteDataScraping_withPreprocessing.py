@@ -1,20 +1,43 @@
-import time
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from pymongo import MongoClient
 import datetime
 from dateutil import parser
-from pymongo import UpdateOne
 import os
-import shutil
+from urllib.parse import quote
+from page_readiness import (
+    wait_for, document_ready, clickable, new_window_opened, element_has_text, rows_present, rows_stable,
+    table_signature, table_refreshed, print_step_timings,
+    LIVE_EQUITY_ROWS, HISTORICAL_ROWS, ANNOUNCEMENT_ROWS,
+)
+from dom_extract import extract_table, expand_announcement_rows, extract_fields
+from mongo_writer import BulkWriter
+from download_manager import download_file, print_download_stats
+from browser_factory import create_browser, warm_browser, profile_path, record_page, print_browser_stats
+from run_metrics import (
+    begin_run_metrics, begin_company, track_stage, stage_rows, stage_error, end_company, write_run_report,
+)
+from csv_ingest import ingest_historical_csv, ingest_announcements_csv
+from typed_schema import typed_document, to_float
+from scrape_checkpoints import (
+    period_filter, new_historical_rows, new_announcements, advance_written_checkpoint, start_run, mark_done, finish_run,
+)
 
 # MongoDB Setup
 client = MongoClient("mongodb://localhost:27017/")
 
+# All scraped documents go through this write-behind buffer instead of one round trip each
+writer = BulkWriter(client)
+
 # Configuration for download directory
-DOWNLOAD_DIR = "D:\\Downloads\\NSE_Data"
+DOWNLOAD_DIR = os.environ.get("NSE_DOWNLOAD_DIR", "D:\\Downloads\\NSE_Data")
+
+# Point this at a local stand-in server (see nse_replay.py) to scrape recorded pages offline
+NSE_BASE_URL = os.environ.get("NSE_BASE_URL", "https://www.nseindia.com")
+
+LIVE_EQUITY_URL = NSE_BASE_URL + "/market-data/live-equity-market"
+
+QUOTE_URL = NSE_BASE_URL + "/get-quotes/equity?symbol="
 
 def ensure_download_directory(company_name):
     """Create company-specific directory if it doesn't exist"""
@@ -22,43 +45,6 @@ def ensure_download_directory(company_name):
     os.makedirs(company_dir, exist_ok=True)
     return company_dir
 
-def wait_for_download_complete(download_dir, timeout=60, check_interval=1):
-    """Wait for all downloads to complete in the specified directory"""
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        time.sleep(check_interval)
-        # Check if any .crdownload files exist
-        if not any(fname.endswith('.crdownload') for fname in os.listdir(download_dir)):
-            # Check if any .csv files exist
-            csv_files = [f for f in os.listdir(download_dir) if f.endswith('.csv')]
-            if csv_files:
-                return csv_files
-    return []
-
-def rename_and_move_files(company_dir, company_name):
-    """Rename and organize downloaded files into proper structure"""
-    downloaded_files = os.listdir(DOWNLOAD_DIR)
-    moved_files = []
-    
-    for filename in downloaded_files:
-        src_path = os.path.join(DOWNLOAD_DIR, filename)
-        
-        if filename.startswith('Quote-Equity-') and filename.endswith('.csv'):
-            # Historical data file
-            new_name = f"{company_name}_historical_data.csv"
-            dest_path = os.path.join(company_dir, new_name)
-            shutil.move(src_path, dest_path)
-            moved_files.append(dest_path)
-            
-        elif filename.startswith('CF-AN-equities-') and filename.endswith('.csv'):
-            # Announcements file
-            new_name = f"{company_name}_announcements_data.csv"
-            dest_path = os.path.join(company_dir, new_name)
-            shutil.move(src_path, dest_path)
-            moved_files.append(dest_path)
-    
-    return moved_files
-
 def format_date_for_id(date_value):
     """Convert various date formats to YYYY-MM-DD format for _id"""
     if isinstance(date_value, str):
@@ -85,369 +71,466 @@ def clean_announcement_text(text):
     return text
 
 def clean_numeric_value(value):
-    """Remove commas and other non-numeric characters from a string (except decimal point)"""
-    if isinstance(value, str):
-        # Remove commas, currency symbols, and any other non-numeric characters (except .)
-        cleaned = ''.join(c for c in value if c.isdigit() or c == '.')
-        return cleaned if cleaned else value  # Return original if cleaning results in empty string
-    return value
-
-def scrape_nse_historical_data():
-    options = uc.ChromeOptions()
+    """Parse a displayed number such as '1,234.50' or '₹ 12.3' into a float (None for '-' and other placeholders)"""
+    return to_float(value)
+
+def create_driver(download_dir=DOWNLOAD_DIR, profile_dir=None):
+    """Start a lean (headless, heavy resources blocked) Chrome that saves downloads into download_dir"""
+    return create_browser(download_dir=download_dir, profile_dir=profile_dir or profile_path("scraper"))
+
+def live_equity_symbols(driver, rows):
+    """Symbols in the given rows of equityStockTable (1-based, as in XPath), read in one browser call"""
+    table = extract_table(driver, LIVE_EQUITY_ROWS)
+    return [table[i - 1][0] for i in rows if i - 1 < len(table) and table[i - 1] and table[i - 1][0]]
+
+def scrape_company(driver, symbol, main_tab, download_dir=DOWNLOAD_DIR):
+    """Scrape historical data, trade information and announcements for symbol's row of equityStockTable"""
+    # Click on the company name (Opens in a new tab); found by symbol, since rows move when the table reloads
+    company_xpath = f"//table[@id='equityStockTable']//tbody/tr/td[1]/a[normalize-space()='{symbol}']"
+    company_link = wait_for(driver, clickable((By.XPATH, company_xpath)), "company_link")
+    company_name = company_link.text.strip()
+    print(f"\nProcessing company: {company_name}")
+    begin_company(company_name)
+    track_stage("navigation")
+
+    try:
+        # Open company page in new tab
+        company_link.click()
+
+        # Switch to the new tab
+        new_tab = wait_for(driver, new_window_opened([main_tab]), "company_tab_opened")
+        driver.switch_to.window(new_tab)
+
+        result = scrape_company_page(driver, company_name, main_tab, new_tab, download_dir)
+    except Exception:
+        stage_error()
+        end_company(False)
+        raise
+    end_company(result is not None)
+    return result
+
+def scrape_symbol(driver, symbol, main_tab, download_dir=DOWNLOAD_DIR):
+    """Open the quote page of symbol in a new tab and scrape it, without going through equityStockTable"""
+    print(f"\nProcessing company: {symbol}")
+    begin_company(symbol)
+    track_stage("navigation")
+
+    try:
+        driver.switch_to.new_window("tab")
+        new_tab = driver.current_window_handle
+        driver.get(QUOTE_URL + quote(symbol))
+
+        result = scrape_company_page(driver, symbol, main_tab, new_tab, download_dir)
+    except Exception:
+        stage_error()
+        end_company(False)
+        raise
+    end_company(result is not None)
+    return result
+
+def scrape_historical_table(driver, company_name):
+    """Fallback when the historical CSV is unavailable: read the rendered table and queue its rows"""
+    # Scrape the historical data table (original MongoDB storage)
+    rows = extract_table(driver, HISTORICAL_ROWS)
+    
+    historical_data_list = []
+    for cols in rows:
+        if len(cols) >= 14:
+            entry = {
+                "_id": cols[0],
+                "Date": cols[0],
+                "Series": cols[1],
+                "OPEN": clean_numeric_value(cols[2]),
+                "HIGH": clean_numeric_value(cols[3]),
+                "LOW": clean_numeric_value(cols[4]),
+                "PREV_CLOSE": clean_numeric_value(cols[5]),
+                "LTP": clean_numeric_value(cols[6]),
+                "CLOSE": clean_numeric_value(cols[7]),
+                "VWAP": clean_numeric_value(cols[8]),
+                "52W_H": clean_numeric_value(cols[9]),
+                "52W_L": clean_numeric_value(cols[10]),
+                "VOLUME": clean_numeric_value(cols[11]),
+                "VALUE": clean_numeric_value(cols[12]),
+                "No_of_Trades": clean_numeric_value(cols[13])
+            }
+            historical_data_list.append(typed_document("historical_data", entry))
+
+    # Skip rows older than what is already stored
+    historical_data_list = new_historical_rows(company_name, historical_data_list)
+    writer.upsert_many(company_name, "historical_data", historical_data_list)
+    print(f"Scraped and stored historical data for {company_name} in MongoDB.")
+    return historical_data_list
+
+def scrape_announcements_table(driver, company_name):
+    """Fallback when the announcements CSV is unavailable: expand and read the rendered table and queue its rows"""
+    # Expand every "Read More" and read the whole table in one browser call
+    announcements_data_list = []
+    try:
+        announcement_rows = expand_announcement_rows(driver, ANNOUNCEMENT_ROWS)
+        
+        for row in announcement_rows:
+            cols = row["cells"]
+
+            if len(cols) >= 4:
+                subject = row["subject"]
+                announcement_text = row["details"]
+                broadcast_time = row["broadcast_time"]
+
+                # Skip empty or duplicate-like rows
+                if not subject and not announcement_text:
+                    continue
+                if "..." in announcement_text and not row["has_read_more"]:
+                    continue
+
+                # Clean up the announcement text
+                announcement_text = clean_announcement_text(announcement_text)
+
+                # _id is a hash of the symbol, broadcast time, subject and text, so same-day announcements stay apart
+                announcements_data_list.append(typed_document("announcements", {
+                    "Subject": subject,
+                    "Announcement": announcement_text,
+                    "Broadcast Date/Time": broadcast_time
+                }, company_name))
+    except Exception as e:
+        print(f"Failed to scrape announcements table for {company_name}:", e)
+        stage_error()
+
+    # Store announcements data in MongoDB
+    announcements_data_list = new_announcements(company_name, announcements_data_list)
+    if announcements_data_list:
+        writer.upsert_many(company_name, "announcements", announcements_data_list)
+        print(f"Scraped and stored announcements data for {company_name} in MongoDB.")
+    else:
+        print(f"No announcements data found for {company_name}.")
+    return announcements_data_list
+
+def scrape_company_page(driver, company_name, main_tab, new_tab, download_dir=DOWNLOAD_DIR):
+    """Run the per-company steps on an open quote page (new_tab); closes its tabs and returns to main_tab when done"""
+    # Create company-specific directory
+    company_dir = ensure_download_directory(company_name)
+
+    # Only ask for the period not yet covered by this symbol's checkpoint (1Y on the first run)
+    historical_period, announcements_period = period_filter(company_name)
+
+    wait_for(driver, document_ready(), "company_page_ready", required=False)
+
+    # Click on "Historical Data"
+    try:
+        historical_data_tab = wait_for(driver, clickable((By.ID, "loadHistoricalData")), "historical_tab")
+        driver.execute_script("arguments[0].click();", historical_data_tab)
+        wait_for(driver, rows_present(HISTORICAL_ROWS), "historical_table")
+    except Exception as e:
+        print("Failed to click on 'Historical Data':", e)
+        stage_error()
+        driver.close()
+        driver.switch_to.window(main_tab)
+        return None
+    
+    # Click on the period filter ("1Y" unless a checkpoint allows a shorter one)
+    try:
+        period_button = wait_for(driver, clickable((By.ID, historical_period)), "period_filter")
+        period_button.click()
+
+        # Click on "Filter" button after selecting the period
+        filter_button = wait_for(driver, clickable((By.ID, "tradeDataFilter")), "filter_button")
+        before = table_signature(driver, HISTORICAL_ROWS)
+        filter_button.click()
+        wait_for(driver, table_refreshed(HISTORICAL_ROWS, before), "historical_filtered")
+    except Exception as e:
+        print(f"Failed to click on '{historical_period}' filter or 'Filter' button:", e)
+        stage_error()
+        driver.close()
+        driver.switch_to.window(main_tab)
+        return None
+
+    # Click on Download (.csv) button for historical data
+    track_stage("historical_download")
+    historical_csv = None
+    try:
+        download_button = wait_for(driver, clickable((By.ID, "tradeDataDownload")), "historical_download_button")
+
+        # Download into a directory of its own and move exactly that file into place
+        historical_csv = download_file(
+            driver, download_button.click, download_dir, company_name, "historical",
+            os.path.join(company_dir, f"{company_name}_historical_data.csv")
+        )
+        print(f"Successfully downloaded {os.path.basename(historical_csv)} for {company_name}")
+    except Exception as e:
+        print("Failed to download historical data CSV:", e)
+        stage_error()
+
+    # The downloaded CSV is the primary source; the rendered table is only a fallback
+    track_stage("historical_ingest")
+    historical_data_list = []
+    ingested = False
+    if historical_csv:
+        try:
+            count = ingest_historical_csv(historical_csv, company_name, writer)
+            print(f"Ingested {count} historical rows for {company_name} from CSV.")
+            stage_rows(count)
+            ingested = True
+        except Exception as e:
+            print("Failed to ingest historical data CSV:", e)
+            stage_error()
+    if not ingested:
+        track_stage("historical_dom")
+        historical_data_list = scrape_historical_table(driver, company_name)
+        stage_rows(len(historical_data_list))
+
+    # Click on "Trade Information" tab
+    track_stage("trade_information")
+    try:
+        trade_info_tab = wait_for(driver, clickable((By.ID, "infoTrade")), "trade_info_tab")
+        trade_info_tab.click()
+        wait_for(driver, element_has_text("orderBookTradeVol"), "trade_information", required=False)
+
+        # Scrape the Trade Information table
+        try:
+            fields = extract_fields(driver, {
+                "Traded Volume (Lakhs)": ("id", "orderBookTradeVol"),
+                "Traded Value (₹ Cr)": ("id", "orderBookTradeVal"),
+                "Total Market Cap (₹ Cr)": ("id", "orderBookTradeTMC"),
+                "Free Float Market Cap (₹ Cr)": ("id", "orderBookTradeFFMC"),
+                "Impact Cost": ("id", "orderBookTradeIC"),
+                "% of Deliverable / Traded Quantity": ("id", "orderBookDeliveryTradedQty"),
+                "Applicable Margin Rate": ("id", "orderBookAppMarRate"),
+                "Face Value": ("id", "mainFaceValue")
+            })
+            scraped_at = datetime.datetime.now()
+            trade_info_data = {
+                "_id": format_date_for_id(scraped_at),
+                "Traded Volume (Lakhs)": clean_numeric_value(fields["Traded Volume (Lakhs)"]),
+                "Traded Value (₹ Cr)": clean_numeric_value(fields["Traded Value (₹ Cr)"]),
+                "Total Market Cap (₹ Cr)": clean_numeric_value(fields["Total Market Cap (₹ Cr)"]),
+                "Free Float Market Cap (₹ Cr)": clean_numeric_value(fields["Free Float Market Cap (₹ Cr)"]),
+                "Impact Cost": clean_numeric_value(fields["Impact Cost"]),
+                "% of Deliverable / Traded Quantity": clean_numeric_value(fields["% of Deliverable / Traded Quantity"]),
+                "Applicable Margin Rate": clean_numeric_value(fields["Applicable Margin Rate"]),
+                "Face Value": clean_numeric_value(fields["Face Value"]),
+                "Scraped_At": scraped_at
+            }
+
+            writer.upsert(company_name, "trade_information", typed_document("trade_information", trade_info_data))
+
+            stage_rows(1)
+            print(f"Scraped and stored trade information for {company_name} in MongoDB.")
+        except Exception as e:
+            print("Failed to scrape Trade Information table:", e)
+            stage_error()
+
+        # Scrape the Price Information table
+        track_stage("price_information")
+        try:
+            wait_for(driver, element_has_text("week52highVal"), "price_information", required=False)
+            fields = extract_fields(driver, {
+                "52 Week High": ("id", "week52highVal"),
+                "52 Week High Date": ("id", "week52HighDate"),
+                "52 Week Low": ("id", "week52lowVal"),
+                "52 Week Low Date": ("id", "week52LowDate"),
+                "Upper Band": ("id", "upperbandVal"),
+                "Lower Band": ("id", "lowerbandVal"),
+                "Price Band (%)": ("id", "pricebandVal"),
+                "Daily Volatility": ("id", "orderBookTradeDV"),
+                "Annualised Volatility": ("id", "orderBookTradeAV"),
+                "Tick Size": ("id", "tickSize")
+            })
+            scraped_at = datetime.datetime.now()
+            price_info_data = {
+                "_id": format_date_for_id(scraped_at),
+                "52 Week High": clean_numeric_value(fields["52 Week High"]),
+                "52 Week High Date": fields["52 Week High Date"],
+                "52 Week Low": clean_numeric_value(fields["52 Week Low"]),
+                "52 Week Low Date": fields["52 Week Low Date"],
+                "Upper Band": clean_numeric_value(fields["Upper Band"]),
+                "Lower Band": clean_numeric_value(fields["Lower Band"]),
+                "Price Band (%)": clean_numeric_value(fields["Price Band (%)"]),
+                "Daily Volatility": clean_numeric_value(fields["Daily Volatility"]),
+                "Annualised Volatility": clean_numeric_value(fields["Annualised Volatility"]),
+                "Tick Size": clean_numeric_value(fields["Tick Size"]),
+                "Scraped_At": scraped_at
+            }
+
+            writer.upsert(company_name, "price_information", typed_document("price_information", price_info_data))
+
+            stage_rows(1)
+            print(f"Scraped and stored price information for {company_name} in MongoDB.")
+        except Exception as e:
+            print("Failed to scrape Price Information table:", e)
+            stage_error()
+
+        # Scrape the Securities Information table
+        track_stage("securities_information")
+        try:
+            wait_for(driver, element_has_text("Listed"), "securities_information", required=False)
+            fields = extract_fields(driver, {
+                "Status": ("id", "Listed"),
+                "Trading Status": ("id", "Active"),
+                "Date of Listing": ("xpath", "//td[@id='Date_of_Listing']/following-sibling::td"),
+                "Adjusted P/E": ("xpath", "//td[@id='SectoralIndxPE']/following-sibling::td"),
+                "Symbol P/E": ("xpath", "//td[@id='Symbol_PE']/following-sibling::td"),
+                "Index": ("xpath", "//td[@id='Sectoral_Index']/following-sibling::td"),
+                "Basic Industry": ("xpath", "//span[@id='BasicIndustry']/ancestor::td/following-sibling::td")
+            })
+            scraped_at = datetime.datetime.now()
+            securities_info_data = {
+                "_id": format_date_for_id(scraped_at),
+                "Status": fields["Status"],
+                "Trading Status": fields["Trading Status"],
+                "Date of Listing": fields["Date of Listing"],
+                "Adjusted P/E": fields["Adjusted P/E"],
+                "Symbol P/E": fields["Symbol P/E"],
+                "Index": fields["Index"],
+                "Basic Industry": fields["Basic Industry"],
+                "Scraped_At": scraped_at
+            }
+
+            writer.upsert(company_name, "securities_information", typed_document("securities_information", securities_info_data))
+
+            stage_rows(1)
+            print(f"Scraped and stored securities information for {company_name} in MongoDB.")
+        except Exception as e:
+            print("Failed to scrape Securities Information table:", e)
+            stage_error()
     
-    # Set default download directory
-    prefs = {
-        "download.default_directory": DOWNLOAD_DIR,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    options.add_experimental_option("prefs", prefs)
+    except Exception as e:
+        print("Failed to click on 'Trade Information':", e)
+        stage_error()
+        driver.close()
+        driver.switch_to.window(main_tab)
+        return None
+
+    # Click on the arrow image (View All)
+    track_stage("announcements_navigation")
+    try:
+        view_all_arrow = wait_for(driver, EC.presence_of_element_located((By.ID, "ann_quoteRedirect")), "view_all_arrow")
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_all_arrow)
+        view_all_arrow = wait_for(driver, clickable((By.ID, "ann_quoteRedirect")), "view_all_arrow_clickable")
+        view_all_arrow.click()
+    except Exception as e:
+        print("Failed to click on 'View All' arrow after scrolling:", e)
+        stage_error()
+        driver.close()
+        driver.switch_to.window(main_tab)
+        return None
     
-    driver = uc.Chrome(options=options)
-    driver.get("https://www.nseindia.com/market-data/live-equity-market")
+    # Click on the period filter and View all button for announcements which opens a new tab
+    announcements_period_xpath = f"//a[@data-val='{announcements_period}']"
+    try:
+        announcements_period_link = wait_for(driver, clickable((By.XPATH, announcements_period_xpath)), "announcements_filter")
+        announcements_period_link.click()
+        announcements_view_all = wait_for(driver, clickable((By.ID, "corp-annc-link")), "announcements_view_all")
+        known_tabs = driver.window_handles
+        announcements_view_all.click()
+    except Exception as e:
+        print(f"Failed to click on '{announcements_period}' filter in announcements:", e)
+        stage_error()
+        driver.close()
+        driver.switch_to.window(new_tab)
+        return None
+
+    # Switch to the new announcements tab
+    announcements_tab = wait_for(driver, new_window_opened(known_tabs), "announcements_tab_opened")
+    driver.switch_to.window(announcements_tab)
+    announcements_period_link = wait_for(driver, clickable((By.XPATH, announcements_period_xpath)), "announcements_page_filter")
+    announcements_period_link.click()
+    wait_for(driver, rows_stable(ANNOUNCEMENT_ROWS), "announcements_table", required=False)
+
+    # Click on Download (.csv) button for announcements
+    track_stage("announcements_download")
+    announcements_csv = None
+    try:
+        download_button = wait_for(driver, clickable((By.ID, "CFanncEquity-download")), "announcements_download_button")
+
+        announcements_csv = download_file(
+            driver, download_button.click, download_dir, company_name, "announcements",
+            os.path.join(company_dir, f"{company_name}_announcements_data.csv")
+        )
+        print(f"Successfully downloaded {os.path.basename(announcements_csv)} for {company_name}")
+    except Exception as e:
+        print("Failed to download announcements CSV:", e)
+        stage_error()
+
+    # Same for announcements: the CSV already has the full text, so nothing needs expanding
+    track_stage("announcements_ingest")
+    announcements_data_list = []
+    ingested = False
+    if announcements_csv:
+        try:
+            count = ingest_announcements_csv(announcements_csv, company_name, writer)
+            print(f"Ingested {count} announcements for {company_name} from CSV.")
+            stage_rows(count)
+            ingested = True
+        except Exception as e:
+            print("Failed to ingest announcements CSV:", e)
+            stage_error()
+    if not ingested:
+        track_stage("announcements_dom")
+        announcements_data_list = scrape_announcements_table(driver, company_name)
+        stage_rows(len(announcements_data_list))
+
+    # Close the announcements tab and switch back to company tab
+    record_page(driver, f"{company_name}:announcements")
+    driver.close()
+    driver.switch_to.window(new_tab)
+    
+    # Close the company tab and switch back to main tab
+    record_page(driver, company_name)
+    driver.close()
+    driver.switch_to.window(main_tab)
+
+    # Move the checkpoint only once this company's documents are actually in MongoDB
+    track_stage("mongo_flush")
+    if not advance_written_checkpoint(writer, company_name, historical_data_list, announcements_data_list):
+        stage_error()
+
+    return company_name
+
+def scrape_nse_historical_data(keep_warm=False):
+    """Scrape the first 5 companies of the live equity table and return the run report.
+
+    keep_warm leaves the browser running for the next call.
+    """
+    begin_run_metrics("scrape_nse_historical_data")
+    if keep_warm:
+        with warm_browser("scraper", download_dir=DOWNLOAD_DIR) as driver:
+            scrape_live_equity_rows(driver)
+    else:
+        driver = create_driver()
+        try:
+            scrape_live_equity_rows(driver)
+        finally:
+            # Close the browser when done with all companies
+            driver.quit()
 
-    wait = WebDriverWait(driver, 20)
-    time.sleep(10)  # Let the main table load
+    writer.flush()
+    writer.report()
+    print("\nCompleted scraping for all 5 companies.")
+    print_step_timings()
+    print_download_stats()
+    print_browser_stats()
+    return write_run_report(writer)
+
+def scrape_live_equity_rows(driver):
+    driver.get(LIVE_EQUITY_URL)
+
+    wait_for(driver, rows_present(LIVE_EQUITY_ROWS, min_rows=2), "live_equity_table")  # Let the main table load
 
     # Store the main tab handle
     main_tab = driver.current_window_handle
 
-    # Loop through first 5 companies (rows 2 to 6 in the table)
-    for i in range(2, 7):
+    # Loop through first 5 companies (rows 2 to 6 in the table), skipping those finished by a run interrupted today
+    for symbol in start_run("scrape_nse_historical_data", live_equity_symbols(driver, range(2, 7))):
         try:
-            # Click on the company name (Opens in a new tab)
-            company_xpath = f"//table[@id='equityStockTable']//tbody/tr[{i}]/td[1]/a"
-            company_link = wait.until(EC.element_to_be_clickable((By.XPATH, company_xpath)))
-            company_name = company_link.text.strip()
-            print(f"\nProcessing company {i-1}: {company_name}")
-            
-            # Create company-specific directory
-            company_dir = ensure_download_directory(company_name)
-            
-            # Open company page in new tab
-            company_link.click()
-            time.sleep(5)
-
-            # Switch to the new tab
-            new_tab = [tab for tab in driver.window_handles if tab != main_tab][0]
-            driver.switch_to.window(new_tab)
-            time.sleep(5)
-
-            # Click on "Historical Data"
-            try:
-                historical_data_tab = wait.until(EC.element_to_be_clickable((By.ID, "loadHistoricalData")))
-                driver.execute_script("arguments[0].click();", historical_data_tab)
-                time.sleep(5)
-            except Exception as e:
-                print("Failed to click on 'Historical Data':", e)
-                driver.close()
-                driver.switch_to.window(main_tab)
-                continue
-            
-            # Click on "1Y" filter
-            try:
-                one_year_filter = wait.until(EC.element_to_be_clickable((By.ID, "oneY")))
-                one_year_filter.click()
-                time.sleep(3)
-
-                # Click on "Filter" button after selecting 1Y
-                filter_button = wait.until(EC.element_to_be_clickable((By.ID, "tradeDataFilter")))
-                filter_button.click()
-                time.sleep(5)
-            except Exception as e:
-                print("Failed to click on '1Y' filter or 'Filter' button:", e)
-                driver.close()
-                driver.switch_to.window(main_tab)
-                continue
-
-            # Click on Download (.csv) button for historical data
-            try:
-                download_button = wait.until(EC.element_to_be_clickable((By.ID, "tradeDataDownload")))
-                download_button.click()
-                time.sleep(5)
-                
-                # Wait for download to complete and rename/move files
-                downloaded_files = wait_for_download_complete(DOWNLOAD_DIR)
-                moved_files = rename_and_move_files(company_dir, company_name)
-                
-                if moved_files:
-                    print(f"Successfully downloaded and organized files for {company_name}:")
-                    for f in moved_files:
-                        print(f" - {os.path.basename(f)}")
-                else:
-                    print(f"Failed to verify download for {company_name}")
-            except Exception as e:
-                print("Failed to download historical data CSV:", e)
-
-            # Scrape the historical data table (original MongoDB storage)
-            rows = driver.find_elements(By.XPATH, "//table[@id='equityHistoricalTable']//tbody/tr")
-            
-            # Connect to MongoDB
-            db = client[company_name]
-            historical_collection = db["historical_data"]
-
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
-                if len(cols) >= 14:
-                    entry = {
-                        "_id": cols[0].text.strip(),
-                        "Date": cols[0].text.strip(),
-                        "Series": cols[1].text.strip(),
-                        "OPEN": clean_numeric_value(cols[2].text.strip()),
-                        "HIGH": clean_numeric_value(cols[3].text.strip()),
-                        "LOW": clean_numeric_value(cols[4].text.strip()),
-                        "PREV_CLOSE": clean_numeric_value(cols[5].text.strip()),
-                        "LTP": clean_numeric_value(cols[6].text.strip()),
-                        "CLOSE": clean_numeric_value(cols[7].text.strip()),
-                        "VWAP": clean_numeric_value(cols[8].text.strip()),
-                        "52W_H": clean_numeric_value(cols[9].text.strip()),
-                        "52W_L": clean_numeric_value(cols[10].text.strip()),
-                        "VOLUME": clean_numeric_value(cols[11].text.strip()),
-                        "VALUE": clean_numeric_value(cols[12].text.strip()),
-                        "No_of_Trades": clean_numeric_value(cols[13].text.strip())
-                    }
-                    
-                    historical_collection.update_one({"_id": entry["_id"]}, {"$set": entry}, upsert=True)
-            print(f"Scraped and stored historical data for {company_name} in MongoDB.")
-
-            # Click on "Trade Information" tab
-            try:
-                trade_info_tab = wait.until(EC.element_to_be_clickable((By.ID, "infoTrade")))
-                trade_info_tab.click()
-                time.sleep(7)
-
-                # Scrape the Trade Information table
-                try:
-                    scraped_at = datetime.datetime.now()
-                    trade_info_data = {
-                        "_id": format_date_for_id(scraped_at),
-                        "Traded Volume (Lakhs)": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeVol").text.strip()),
-                        "Traded Value (₹ Cr)": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeVal").text.strip()),
-                        "Total Market Cap (₹ Cr)": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeTMC").text.strip()),
-                        "Free Float Market Cap (₹ Cr)": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeFFMC").text.strip()),
-                        "Impact Cost": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeIC").text.strip()),
-                        "% of Deliverable / Traded Quantity": clean_numeric_value(driver.find_element(By.ID, "orderBookDeliveryTradedQty").text.strip()),
-                        "Applicable Margin Rate": clean_numeric_value(driver.find_element(By.ID, "orderBookAppMarRate").text.strip()),
-                        "Face Value": clean_numeric_value(driver.find_element(By.ID, "mainFaceValue").text.strip()),
-                        "Scraped_At": scraped_at
-                    }
-
-                    trade_info_collection = db["trade_information"]
-                    trade_info_collection.update_one(
-                        {"_id": trade_info_data["_id"]},
-                        {"$set": trade_info_data},
-                        upsert=True
-                    )
-
-                    print(f"Scraped and stored trade information for {company_name} in MongoDB.")
-                except Exception as e:
-                    print("Failed to scrape Trade Information table:", e)
-
-                # Scrape the Price Information table
-                try:
-                    time.sleep(3)
-                    scraped_at = datetime.datetime.now()
-                    price_info_data = {
-                        "_id": format_date_for_id(scraped_at),
-                        "52 Week High": clean_numeric_value(driver.find_element(By.ID, "week52highVal").text.strip()),
-                        "52 Week High Date": driver.find_element(By.ID, "week52HighDate").text.strip(),
-                        "52 Week Low": clean_numeric_value(driver.find_element(By.ID, "week52lowVal").text.strip()),
-                        "52 Week Low Date": driver.find_element(By.ID, "week52LowDate").text.strip(),
-                        "Upper Band": clean_numeric_value(driver.find_element(By.ID, "upperbandVal").text.strip()),
-                        "Lower Band": clean_numeric_value(driver.find_element(By.ID, "lowerbandVal").text.strip()),
-                        "Price Band (%)": clean_numeric_value(driver.find_element(By.ID, "pricebandVal").text.strip()),
-                        "Daily Volatility": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeDV").text.strip()),
-                        "Annualised Volatility": clean_numeric_value(driver.find_element(By.ID, "orderBookTradeAV").text.strip()),
-                        "Tick Size": clean_numeric_value(driver.find_element(By.ID, "tickSize").text.strip()),
-                        "Scraped_At": scraped_at
-                    }
-
-                    price_info_collection = db["price_information"]
-                    price_info_collection.update_one(
-                        {"_id": price_info_data["_id"]},
-                        {"$set": price_info_data},
-                        upsert=True
-                    )
-
-                    print(f"Scraped and stored price information for {company_name} in MongoDB.")
-                except Exception as e:
-                    print("Failed to scrape Price Information table:", e)
-
-                # Scrape the Securities Information table
-                try:
-                    time.sleep(3)
-                    scraped_at = datetime.datetime.now()
-                    securities_info_data = {
-                        "_id": format_date_for_id(scraped_at),
-                        "Status": driver.find_element(By.ID, "Listed").text.strip(),
-                        "Trading Status": driver.find_element(By.ID, "Active").text.strip(),
-                        "Date of Listing": driver.find_element(By.XPATH, "//td[@id='Date_of_Listing']/following-sibling::td").text.strip(),
-                        "Adjusted P/E": driver.find_element(By.XPATH, "//td[@id='SectoralIndxPE']/following-sibling::td").text.strip(),
-                        "Symbol P/E": driver.find_element(By.XPATH, "//td[@id='Symbol_PE']/following-sibling::td").text.strip(),
-                        "Index": driver.find_element(By.XPATH, "//td[@id='Sectoral_Index']/following-sibling::td").text.strip(),
-                        "Basic Industry": driver.find_element(By.XPATH, "//span[@id='BasicIndustry']/ancestor::td/following-sibling::td").text.strip(),
-                        "Scraped_At": scraped_at
-                    }
-
-                    securities_info_collection = db["securities_information"]
-                    securities_info_collection.update_one(
-                        {"_id": securities_info_data["_id"]},
-                        {"$set": securities_info_data},
-                        upsert=True
-                    )
-
-                    print(f"Scraped and stored securities information for {company_name} in MongoDB.")
-                except Exception as e:
-                    print("Failed to scrape Securities Information table:", e)
-            
-            except Exception as e:
-                print("Failed to click on 'Trade Information':", e)
-                driver.close()
-                driver.switch_to.window(main_tab)
-                continue
-
-            # Click on the arrow image (View All)
-            try:
-                view_all_arrow = wait.until(EC.presence_of_element_located((By.ID, "ann_quoteRedirect")))
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_all_arrow)
-                time.sleep(7)
-                view_all_arrow.click()
-                time.sleep(7)
-            except Exception as e:
-                print("Failed to click on 'View All' arrow after scrolling:", e)
-                driver.close()
-                driver.switch_to.window(main_tab)
-                continue
-            
-            # Click on "1Y" filter and View all button for announcements which opens a new tab
-            try:
-                announcements_one_year = wait.until(EC.element_to_be_clickable((By.XPATH, "//a[@data-val='1Y']")))
-                announcements_one_year.click()
-                time.sleep(5)
-                announcements_view_all = wait.until(EC.element_to_be_clickable((By.ID, "corp-annc-link")))
-                announcements_view_all.click()
-                time.sleep(5)
-            except Exception as e:
-                print("Failed to click on '1Y' filter in announcements:", e)
-                driver.close()
-                driver.switch_to.window(new_tab)
-                continue
-
-            # Switch to the new announcements tab
-            announcements_tab = [tab for tab in driver.window_handles if tab not in [main_tab, new_tab]][0]
-            driver.switch_to.window(announcements_tab)
-            time.sleep(5)
-            announcements_one_year = wait.until(EC.element_to_be_clickable((By.XPATH, "//a[@data-val='1Y']")))
-            announcements_one_year.click()
-            time.sleep(5)
-
-            # Click on Download (.csv) button for announcements
-            try:
-                download_button = wait.until(EC.element_to_be_clickable((By.ID, "CFanncEquity-download")))
-                download_button.click()
-                time.sleep(5)
-                
-                # Wait for download to complete and rename/move files
-                downloaded_files = wait_for_download_complete(DOWNLOAD_DIR)
-                moved_files = rename_and_move_files(company_dir, company_name)
-                
-                if moved_files:
-                    print(f"Successfully downloaded and organized files for {company_name}:")
-                    for f in moved_files:
-                        print(f" - {os.path.basename(f)}")
-                else:
-                    print(f"Failed to verify download for {company_name}")
-            except Exception as e:
-                print("Failed to download announcements CSV:", e)
-
-            # Click all "Read More" buttons
-            try:
-                read_more_buttons = driver.find_elements(By.CLASS_NAME, "readMore")
-                for btn in read_more_buttons:
-                    try:
-                        driver.execute_script("arguments[0].click();", btn)
-                        time.sleep(0.1)
-                    except:
-                        continue
-            except Exception as e:
-                print("Failed to expand all Read More texts:", e)
-
-            # Scrape the announcements table
-            announcements_data_list = []
-            try:
-                announcement_rows = driver.find_elements(By.XPATH, "//div[@id='CFanncEquityTable']//table//tbody/tr")
-                
-                for row in announcement_rows:
-                    cols = row.find_elements(By.TAG_NAME, "td")
-
-                    if len(cols) >= 4:
-                        subject = cols[0].text.strip()
-                        announcement_text = driver.execute_script("return arguments[0].textContent;", cols[1]).strip()
-                        broadcast_time = cols[3].text.strip()
-
-                        # Skip empty or duplicate-like rows
-                        if not subject and not announcement_text:
-                            continue
-                        if "..." in announcement_text and not cols[1].find_elements(By.CLASS_NAME, "readMore"):
-                            continue
-
-                        # Clean up the announcement text
-                        announcement_text = clean_announcement_text(announcement_text)
-
-                        # Format the broadcast date as YYYY-MM-DD for _id
-                        try:
-                            broadcast_date = parser.parse(broadcast_time.split()[0], dayfirst=True)
-                            broadcast_id = broadcast_date.strftime('%Y-%m-%d')
-                        except:
-                            broadcast_id = broadcast_time  # Fallback to original if parsing fails
-
-                        announcements_data_list.append({
-                            "_id": broadcast_id,
-                            "Subject": subject,
-                            "Announcement": announcement_text,
-                            "Broadcast Date/Time": broadcast_time
-                        })
-            except Exception as e:
-                print(f"Failed to scrape announcements table for {company_name}:", e)
-
-            # Store announcements data in MongoDB
-            announcements_collection = db["announcements"]
-            if announcements_data_list:
-                # Using bulk_write with update_one operations for upsert functionality
-                operations = [
-                    UpdateOne(
-                        {"_id": doc["_id"]},
-                        {"$set": doc},
-                        upsert=True
-                    )
-                    for doc in announcements_data_list
-                ]
-                if operations:
-                    announcements_collection.bulk_write(operations)
-                print(f"Scraped and stored announcements data for {company_name} in MongoDB.")
-            else:
-                print(f"No announcements data found for {company_name}.")
-
-            # Close the announcements tab and switch back to company tab
-            driver.close()
-            driver.switch_to.window(new_tab)
-            
-            # Close the company tab and switch back to main tab
-            driver.close()
-            driver.switch_to.window(main_tab)
-            time.sleep(3)
-
+            if scrape_company(driver, symbol, main_tab):
+                mark_done("scrape_nse_historical_data", symbol)
         except Exception as e:
-            print(f"Error processing company {i-1}:", str(e))
+            print(f"Error processing company {symbol}:", str(e))
             # Make sure we're back on the main tab for next iteration
             if main_tab in driver.window_handles:
                 driver.switch_to.window(main_tab)
             continue
 
-    # Close the browser when done with all companies
-    driver.quit()
-    print("\nCompleted scraping for all 5 companies.")
+    finish_run("scrape_nse_historical_data")
 
 if __name__ == "__main__":
     scrape_nse_historical_data()
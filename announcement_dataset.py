@@ -0,0 +1,172 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import quote
+import pandas as pd
+
+from announcement_labels import trading_day_labels
+from columnar_cache import CACHE_DIR as COLUMNAR_CACHE_DIR, pa, cached_symbols, read_frame, symbol_files
+
+# One pickled labelled frame per company, plus _index.json recording the columnar cache files each one was built from
+DATASET_CACHE_DIR = os.environ.get("NSE_DATASET_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".nse_scraper", "datasets"))
+
+INDEX_NAME = "_index.json"
+
+# Bump when the labelling changes so every cached company is rebuilt once
+LABELS_VERSION = 3
+
+DATASET_COLUMNS = ["symbol", "text", "percentage_change", "next_date"]
+
+# Share of announcements held out of training for evaluation
+HOLDOUT_PERCENT = 20
+
+# Worker processes for companies that have to be rebuilt (None: one per CPU)
+MAX_WORKERS = int(os.environ["NSE_DATASET_WORKERS"]) if os.environ.get("NSE_DATASET_WORKERS") else None
+
+def company_sources(symbol):
+    """The columnar cache files one company is labelled from, or None if it has no bars or no announcements"""
+    bars = symbol_files("historical_data", symbol)
+    announcements = symbol_files("announcements", symbol)
+    if not bars or not announcements:
+        return None
+    return bars + announcements
+
+def source_key(paths):
+    """What a cached frame was built from: the labelling version and each file's path, size and mtime"""
+    key = {"version": LABELS_VERSION, "files": []}
+    for path in paths:
+        stat = os.stat(path)
+        key["files"].append([os.path.relpath(path, COLUMNAR_CACHE_DIR), stat.st_size, stat.st_mtime_ns])
+    return key
+
+def cache_path(company, cache_dir=DATASET_CACHE_DIR):
+    return os.path.join(cache_dir, quote(company, safe='') + ".pkl")
+
+def label_company(company, cache_file=None):
+    """Label one company's announcements from its typed bars and announcements in the columnar cache; the frame
+    is also pickled to cache_file if given"""
+    announcements = read_frame("announcements", [company], columns=["Subject", "Announcement", "Broadcast Date/Time"])
+    bars = read_frame("historical_data", [company], columns=["Date", "CLOSE"])
+
+    # Label each announcement with the move from the previous trading session's close to the next one's
+    # (an as-of join on sorted dates, so announcements next to weekends and holidays are kept). next_date (the
+    # session the label closes on) is when the label became known; incremental training uses it to find new rows
+    labelled = trading_day_labels(announcements, bars)[["text", "percentage_change", "next_date"]]
+    labelled.insert(0, "symbol", company)
+    if cache_file is not None:
+        labelled.to_pickle(cache_file + ".tmp")
+        os.replace(cache_file + ".tmp", cache_file)
+    return labelled
+
+def _load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _rebuild_company(company, cache_file):
+    # Runs in a worker process; only the row count comes back, the frame stays in the cache file
+    return len(label_company(company, cache_file))
+
+def update_cache(symbols=None, cache_dir=DATASET_CACHE_DIR, max_workers=MAX_WORKERS, use_cache=True):
+    """Relabel the companies (default: every one in the columnar cache) whose columnar files changed since they
+    were labelled; returns the labelled companies in order.
+
+    Changes are detected by each file's size and mtime. Stale companies are labelled in a process pool. A full update
+    (symbols None) also drops companies whose columnar files are gone; other companies' entries are never touched.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read the columnar cache (pip install pyarrow)")
+    started = time.time()
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _load_index(cache_dir)
+    full_update = symbols is None
+    if full_update:
+        symbols = cached_symbols("historical_data")
+        if not symbols:
+            print(f"No bars in the columnar cache ({COLUMNAR_CACHE_DIR}); fill it with csv_ingest.py or "
+                  "'columnar_cache.py sync'")
+
+    companies, stale = [], {}
+    for company in sorted(symbols):
+        sources = company_sources(company)
+        if sources is None:
+            print(f"Skipping {company}: no cached bars or announcements")
+            continue
+        companies.append(company)
+        key = source_key(sources)
+        if not use_cache or index.get(company) != key or not os.path.exists(cache_path(company, cache_dir)):
+            stale[company] = (sources, key)
+
+    failed = []
+    if len(stale) == 1 or max_workers == 1:
+        # Not worth starting worker processes
+        for company, (sources, key) in stale.items():
+            try:
+                _rebuild_company(company, cache_path(company, cache_dir))
+                index[company] = key
+            except Exception as e:
+                failed.append(company)
+                print(f"Failed to label {company}:", e)
+    elif stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_rebuild_company, company, cache_path(company, cache_dir)): company
+                for company, (sources, key) in stale.items()
+            }
+            for future in as_completed(futures):
+                company = futures[future]
+                try:
+                    future.result()
+                    index[company] = stale[company][1]
+                except Exception as e:
+                    failed.append(company)
+                    print(f"Failed to label {company}:", e)
+
+    if full_update:
+        for company in [c for c in index if c not in companies and company_sources(c) is None]:
+            index.pop(company)
+            if os.path.exists(cache_path(company, cache_dir)):
+                os.remove(cache_path(company, cache_dir))
+    _save_index(cache_dir, index)
+
+    cached = [c for c in companies if c in index and os.path.exists(cache_path(c, cache_dir))]
+    print(f"Dataset cache: {len(cached)} companies ({len(stale) - len(failed)} rebuilt, {len(failed)} failed) "
+          f"in {time.time() - started:.2f}s")
+    return cached
+
+def iter_companies(companies, cache_dir=DATASET_CACHE_DIR):
+    """(company, labelled frame) from the cache, one company in memory at a time"""
+    for company in companies:
+        yield company, pd.read_pickle(cache_path(company, cache_dir))
+
+def holdout_mask(frame):
+    """True for held-out rows; hashed from the row so the full and incremental models are scored on the same ones"""
+    hashes = pd.util.hash_pandas_object(frame[["symbol", "text", "next_date"]], index=False).values
+    return hashes % 100 < HOLDOUT_PERCENT
+
+def build_dataset(symbols=None, cache_dir=DATASET_CACHE_DIR, max_workers=MAX_WORKERS, use_cache=True):
+    """Labelled announcements of the given companies (default: all cached) as one frame
+    (symbol, text, percentage_change, next_date), relabelling only the companies whose data changed"""
+    companies = update_cache(symbols, cache_dir, max_workers, use_cache)
+    frames = [frame for _, frame in iter_companies(companies, cache_dir)]
+    if not frames:
+        return pd.DataFrame(columns=DATASET_COLUMNS)
+    dataset = pd.concat(frames, ignore_index=True)
+    print(f"Dataset: {len(dataset):,} announcements from {len(frames)} companies")
+    return dataset
+
+if __name__ == "__main__":
+    # python announcement_dataset.py [SYMBOL...] [--rebuild]
+    names = [arg for arg in sys.argv[1:] if arg != "--rebuild"]
+    build_dataset(names or None, use_cache="--rebuild" not in sys.argv[1:])
@@ -0,0 +1,87 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Benchmark universe: this many symbols with this many business days of bars each
+BENCHMARK_SYMBOLS = 500
+BENCHMARK_DAYS = 1250
+
+# Announcement rows labelled per benchmark run
+BENCHMARK_SIZES = [10_000, 100_000, 1_000_000, 3_000_000]
+
+def trading_day_labels(announcements, bars, by=None):
+    """Label every announcement with the closes of the trading sessions before and after its broadcast day.
+
+    announcements needs "Broadcast Date/Time", "Subject" and "Announcement"; bars needs "Date" and "CLOSE" (the
+    typed field names). Sessions are whatever dates bars has, so weekends and holidays are stepped over. Pass
+    by="symbol" (a column of both frames) to label many companies in one pass. Returns one row per announcement
+    that has a usable close on both sides, in the announcements' original order.
+    """
+    by_columns = [by] if by else []
+    left = pd.DataFrame({
+        "row": np.arange(len(announcements)),
+        "text": announcements["Subject"].astype(str).values + ". " + announcements["Announcement"].astype(str).values,
+        "day": pd.to_datetime(announcements["Broadcast Date/Time"], errors="coerce").dt.normalize().values,
+        **{column: announcements[column].values for column in by_columns},
+    })
+    sessions = pd.DataFrame({
+        "Date": pd.to_datetime(bars["Date"], errors="coerce").dt.normalize().values,
+        "CLOSE": pd.to_numeric(bars["CLOSE"], errors="coerce").values,
+        **{column: bars[column].values for column in by_columns},
+    })
+    left = left.dropna(subset=["day"]).sort_values("day", kind="stable")
+    sessions = sessions.dropna(subset=["Date"]).sort_values("Date", kind="stable")
+
+    # allow_exact_matches=False: the session on the broadcast day itself is neither "before" nor "after"
+    labelled = pd.merge_asof(
+        left, sessions.rename(columns={"Date": "prev_date", "CLOSE": "prev_close"}),
+        left_on="day", right_on="prev_date", by=by, direction="backward", allow_exact_matches=False,
+    )
+    labelled = pd.merge_asof(
+        labelled, sessions.rename(columns={"Date": "next_date", "CLOSE": "next_close"}),
+        left_on="day", right_on="next_date", by=by, direction="forward", allow_exact_matches=False,
+    )
+
+    usable = labelled["prev_close"].notna() & labelled["next_close"].notna() & (labelled["prev_close"] != 0)
+    labelled = labelled[usable].sort_values("row")
+    labelled["percentage_change"] = ((labelled["next_close"] - labelled["prev_close"]) / labelled["prev_close"] * 100).round(2)
+    return labelled.drop(columns=["row", "day"]).reset_index(drop=True)
+
+# --- Benchmark ----------------------------------------------------------------
+
+def _synthetic_universe(n_announcements, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2020-01-01", periods=BENCHMARK_DAYS)
+    # A few weekday holidays that every symbol skips
+    days = days.delete(rng.choice(len(days), size=BENCHMARK_DAYS // 50, replace=False))
+    symbols = np.array([f"SYM{i:03d}" for i in range(BENCHMARK_SYMBOLS)])
+    bars = pd.DataFrame({
+        "symbol": np.repeat(symbols, len(days)),
+        "Date": np.tile(days.values, len(symbols)),
+        "CLOSE": rng.uniform(10, 1000, len(symbols) * len(days)),
+    })
+    seconds = rng.integers(0, int((days[-1] - days[0]).total_seconds()), n_announcements)
+    announcements = pd.DataFrame({
+        "symbol": symbols[rng.integers(0, len(symbols), n_announcements)],
+        "Broadcast Date/Time": days[0] + pd.to_timedelta(seconds, unit="s"),
+        "Subject": "Board Meeting",
+        "Announcement": "Outcome of board meeting",
+    })
+    return announcements, bars
+
+def benchmark(sizes=BENCHMARK_SIZES):
+    """Time trading_day_labels over the whole synthetic universe at each announcement count"""
+    results = []
+    for size in sizes:
+        announcements, bars = _synthetic_universe(size)
+        started = time.time()
+        labelled = trading_day_labels(announcements, bars, by="symbol")
+        elapsed = time.time() - started
+        results.append({"announcements": size, "labelled": len(labelled), "seconds": round(elapsed, 3)})
+        print(f"{size:>10,} announcements x {len(bars):,} bars: {len(labelled):,} labelled in {elapsed:.2f}s "
+              f"({size / elapsed:,.0f} rows/sec)")
+    return results
+
+if __name__ == "__main__":
+    benchmark([int(arg) for arg in sys.argv[1:]] or BENCHMARK_SIZES)
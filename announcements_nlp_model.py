@@ -1,133 +1,117 @@
 import os
-import pandas as pd
-from datetime import datetime, timedelta
-from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
 from sklearn.metrics import mean_squared_error, r2_score
-import joblib
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Path to your folder
-BASE_DIR = r"D:\Downloads\NSE_Data"
-
-def parse_announcement_date(date_str):
-    # Replace multiple spaces with a single space and strip leading/trailing whitespace
-    date_str = ' '.join(date_str.strip().split())
-    return datetime.strptime(date_str, "%d-%b-%Y %H:%M:%S").date()
-
-def parse_historical_date(date_str):
-    date_str = ' '.join(date_str.strip().split())  # Normalize spacing
-    return datetime.strptime(date_str, "%d-%b-%Y").date()
-
-def calculate_percentage_change(prev_close, next_close):
-    return round(((next_close - prev_close) / prev_close) * 100, 2)
-
-def extract_features_and_labels(announcements_df, historical_df):
-    announcements_df['BROADCAST_DATE'] = announcements_df['BROADCAST DATE/TIME'].apply(parse_announcement_date)
-    historical_df['DATE'] = historical_df['Date'].apply(parse_historical_date)
-    # Convert 'close' to numeric
-    historical_df['close'] = pd.to_numeric(historical_df['close'], errors='coerce')
-
-    label_data = []
-
-    for _, row in announcements_df.iterrows():
-        ann_date = row['BROADCAST_DATE']
-        next_day = ann_date + timedelta(days=1)
-        prev_day = ann_date - timedelta(days=1)
-
-        prev_day_row = historical_df[historical_df['DATE'] == prev_day]
-        next_day_row = historical_df[historical_df['DATE'] == next_day]
-
-        if not prev_day_row.empty and not next_day_row.empty:
-            prev_close = prev_day_row['close'].values[0]
-            next_close = next_day_row['close'].values[0]
-            if pd.notna(prev_close) and pd.notna(next_close) and prev_close != 0:
-                percent_change = calculate_percentage_change(prev_close, next_close)
-                label_data.append({
-                    "text": f"{row['SUBJECT']}. {row['DETAILS']}",
-                    "percentage_change": percent_change
-                })
-
-    return pd.DataFrame(label_data)
-
-# Step 1: Merge data from all companies
-all_data = []
-
-for company_folder in os.listdir(BASE_DIR):
-    company_path = os.path.join(BASE_DIR, company_folder)
-    if os.path.isdir(company_path):
-        files = os.listdir(company_path)
-        announcements_file = [f for f in files if 'announcements' in f.lower()][0]
-        historical_file = [f for f in files if 'historical' in f.lower()][0]
-
-        announcements_path = os.path.join(company_path, announcements_file)
-        historical_path = os.path.join(company_path, historical_file)
-
-        announcements_df = pd.read_csv(announcements_path)
-        announcements_df.columns = announcements_df.columns.str.strip()
-        historical_df = pd.read_csv(historical_path)
-        historical_df.columns = historical_df.columns.str.strip()  # Remove trailing spaces
-
-        features_labels = extract_features_and_labels(announcements_df, historical_df)
-        all_data.append(features_labels)
-
-# Combine all into one DataFrame
-dataset = pd.concat(all_data, ignore_index=True)
-
-# Step 2: Text Vectorization
-vectorizer = TfidfVectorizer(max_features=500)
-X = vectorizer.fit_transform(dataset['text']).toarray()
-y = dataset['percentage_change'].values
-
-# Step 3: Train/Test split and Model Training
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
-
-# Step 4: Evaluation
-y_pred = model.predict(X_test)
-print("R2 Score:", r2_score(y_test, y_pred))
-print("RMSE:", mean_squared_error(y_test, y_pred, squared=False))
-
-# Calculate errors
-errors = y_test - y_pred
-
-# 1. Histogram of Prediction Errors
-plt.figure(figsize=(8, 5))
-plt.hist(errors, bins=30, color='skyblue', edgecolor='black')
-plt.title("Histogram of Prediction Errors")
-plt.xlabel("Prediction Error (Actual - Predicted)")
-plt.ylabel("Frequency")
-plt.grid(True)
-plt.show()
-
-# 2. Actual vs. Predicted Scatter Plot
-plt.figure(figsize=(8, 5))
-plt.scatter(y_test, y_pred, alpha=0.7, color='mediumseagreen')
-plt.plot([min(y_test), max(y_test)], [min(y_test), max(y_test)], 'r--')  # reference line
-plt.title("Actual vs. Predicted Percentage Change")
-plt.xlabel("Actual Percentage Change")
-plt.ylabel("Predicted Percentage Change")
-plt.grid(True)
-plt.show()
-
-# Step 5: Save model and vectorizer
-joblib.dump(model, "stock_price_change_model.pkl")
-joblib.dump(vectorizer, "announcement_vectorizer.pkl")
+from announcement_dataset import build_dataset, holdout_mask
+from model_registry import ANNOUNCEMENT_MODEL, publish, get_model
+
+# "random_forest" (the original model) or "ridge" (a linear model that fits sparse input directly and stays fast
+# with large vocabularies)
+ESTIMATOR = os.environ.get("NSE_MODEL_ESTIMATOR", "random_forest")
+
+# TF-IDF vocabulary size per estimator. Features stay in float32 CSR form end to end, so memory grows with the
+# number of non-zero entries rather than rows x features, but forest fit time grows with the features tried at
+# every split, so the forest keeps the original 500
+DEFAULT_MAX_FEATURES = {"random_forest": 500, "ridge": 50000}
+
+# NSE_MODEL_MAX_FEATURES overrides the per-estimator default
+MAX_FEATURES = int(os.environ["NSE_MODEL_MAX_FEATURES"]) if os.environ.get("NSE_MODEL_MAX_FEATURES") else None
+
+def max_features_for(estimator):
+    return MAX_FEATURES or DEFAULT_MAX_FEATURES.get(estimator, DEFAULT_MAX_FEATURES["random_forest"])
+
+def make_estimator(name=ESTIMATOR):
+    if name == "ridge":
+        return Ridge(alpha=1.0, solver="sparse_cg")
+    return RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+
+def sparse_memory_report(X):
+    """Print how much the CSR features take compared with the dense float64 matrix the model used to build"""
+    sparse_bytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    dense_bytes = X.shape[0] * X.shape[1] * 8
+    density = X.nnz / max(X.shape[0] * X.shape[1], 1)
+    print(f"Features: {X.shape[0]:,} x {X.shape[1]:,}, {X.nnz:,} non-zero ({density:.4%}), "
+          f"{sparse_bytes / 2**20:.1f} MiB as {X.dtype} CSR vs {dense_bytes / 2**20:.1f} MiB dense float64")
+    return {"rows": X.shape[0], "features": X.shape[1], "nnz": X.nnz, "sparse_bytes": sparse_bytes, "dense_bytes": dense_bytes}
+
+def train_model(dataset, estimator=ESTIMATOR):
+    """Fit the TF-IDF vectorizer and the model on a build_dataset frame; returns them with the held-out split"""
+    # Step 2: Text Vectorization
+    vectorizer = TfidfVectorizer(max_features=max_features_for(estimator), dtype=np.float32)
+    X = vectorizer.fit_transform(dataset['text'])
+    y = dataset['percentage_change'].values
+    sparse_memory_report(X)
+
+    # Step 3: Train/Test split (the same held-out rows every run) and Model Training
+    test = holdout_mask(dataset)
+    X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+
+    model = make_estimator(estimator)
+    model.fit(X_train, y_train)
+    return vectorizer, model, X_test, y_test
+
+def regression_metrics(y_true, y_pred):
+    return {"r2": float(r2_score(y_true, y_pred)), "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred)))}
+
+def evaluate_model(model, X_test, y_test, plot=True):
+    # Step 4: Evaluation
+    y_pred = model.predict(X_test)
+    metrics = regression_metrics(y_test, y_pred)
+    print("R2 Score:", metrics["r2"])
+    print("RMSE:", metrics["rmse"])
+    if not plot:
+        return metrics
+
+    # Calculate errors
+    errors = y_test - y_pred
+
+    # 1. Histogram of Prediction Errors
+    plt.figure(figsize=(8, 5))
+    plt.hist(errors, bins=30, color='skyblue', edgecolor='black')
+    plt.title("Histogram of Prediction Errors")
+    plt.xlabel("Prediction Error (Actual - Predicted)")
+    plt.ylabel("Frequency")
+    plt.grid(True)
+    plt.show()
+
+    # 2. Actual vs. Predicted Scatter Plot
+    plt.figure(figsize=(8, 5))
+    plt.scatter(y_test, y_pred, alpha=0.7, color='mediumseagreen')
+    plt.plot([min(y_test), max(y_test)], [min(y_test), max(y_test)], 'r--')  # reference line
+    plt.title("Actual vs. Predicted Percentage Change")
+    plt.xlabel("Actual Percentage Change")
+    plt.ylabel("Predicted Percentage Change")
+    plt.grid(True)
+    plt.show()
+    return metrics
+
+def save_model(model, vectorizer, **metadata):
+    # Step 5: Publish model and vectorizer together as a new registry version (servers pick it up without a restart)
+    return publish(ANNOUNCEMENT_MODEL, {"model": model, "vectorizer": vectorizer}, **metadata)
 
 # Step 6: Prediction Function
 def predict_announcement_effect(announcement_text):
-    vectorizer = joblib.load("announcement_vectorizer.pkl")
-    model = joblib.load("stock_price_change_model.pkl")
-    vect_text = vectorizer.transform([announcement_text]).toarray()
+    # Loaded once per process and kept in memory, so this is only the transform and predict
+    bundle = get_model(ANNOUNCEMENT_MODEL)
+    vectorizer, model = bundle["vectorizer"], bundle["model"]
+    vect_text = vectorizer.transform([announcement_text])
     predicted_change = model.predict(vect_text)[0]
     direction = "increase" if predicted_change > 0 else "decrease"
     return direction, round(abs(predicted_change), 2)
 
-# Example usage
-example_announcement = "Board Meeting Intimation for Quarterly Results"
-direction, percentage = predict_announcement_effect(example_announcement)
-print(f"The stock is likely to {direction} by {percentage}%")
+if __name__ == "__main__":
+    # Step 1: Merge data from all companies in the columnar cache (only companies whose data changed are relabelled)
+    dataset = build_dataset()
+
+    vectorizer, model, X_test, y_test = train_model(dataset)
+    metrics = evaluate_model(model, X_test, y_test)
+    save_model(model, vectorizer, mode="full_refit", estimator=ESTIMATOR, rows=len(dataset), **metrics)
+
+    # Example usage
+    example_announcement = "Board Meeting Intimation for Quarterly Results"
+    direction, percentage = predict_announcement_effect(example_announcement)
+    print(f"The stock is likely to {direction} by {percentage}%")
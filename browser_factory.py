@@ -0,0 +1,169 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+import undetected_chromedriver as uc
+from selenium.common.exceptions import WebDriverException
+
+# Run Chrome without a window unless NSE_HEADLESS=0
+HEADLESS = os.environ.get("NSE_HEADLESS", "1") != "0"
+
+# Cookies (and NSE's bot-check state) persist between runs in per-name profiles under here
+PROFILE_ROOT = os.environ.get("NSE_PROFILE_ROOT", os.path.join(os.path.expanduser("~"), ".nse_scraper", "profiles"))
+
+# Requests for these never leave the browser: images, fonts, media and ad/analytics scripts
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagmanager.com*", "*google-analytics.com*",
+    "*facebook.net*", "*adservice.google.*",
+]
+
+# Resource timing entries kept per page (Chrome's default of 250 undercounts bytes on heavy pages)
+RESOURCE_TIMING_BUFFER = 5000
+
+# Every browser start appends {"profile", "seconds"} and every record_page() call appends {"page", "bytes"}
+browser_stats = {"startups": [], "pages": []}
+_stats_lock = threading.Lock()
+
+# undetected_chromedriver patches the chromedriver binary on startup, which is not safe to do concurrently
+_start_lock = threading.Lock()
+
+def profile_path(name):
+    """Persistent profile directory for one kind of browser (e.g. "scraper", "worker_3", "finassist")"""
+    path = os.path.join(PROFILE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def create_browser(download_dir=None, profile_dir=None, headless=HEADLESS, block_resources=True):
+    """Start a lean Chrome: headless, heavy resources blocked, cookies kept in profile_dir"""
+    options = uc.ChromeOptions()
+    prefs = {
+        "profile.managed_default_content_settings.images": 2,
+        "safebrowsing.enabled": True,
+    }
+    if download_dir:
+        prefs.update({
+            "download.default_directory": download_dir,
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+        })
+    options.add_experimental_option("prefs", prefs)
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+
+    started = time.time()
+    with _start_lock:
+        driver = uc.Chrome(options=options, user_data_dir=profile_dir, headless=headless)
+    elapsed = time.time() - started
+
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": f"performance.setResourceTimingBufferSize({RESOURCE_TIMING_BUFFER});"
+    })
+
+    with _stats_lock:
+        browser_stats["startups"].append({"profile": os.path.basename(profile_dir or ""), "seconds": round(elapsed, 3)})
+    return driver
+
+def quit_browser(driver):
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+# --- Keep-warm reuse ----------------------------------------------------------
+
+_warm_drivers = {}
+_warm_locks = {}
+_warm_guard = threading.Lock()
+
+def _is_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+@contextmanager
+def warm_browser(name="default", **options):
+    """Yield a long-lived browser for name, starting it on first use and replacing it if it has died.
+
+    Callers sharing a name take turns; a WebDriverException discards the browser so the next caller gets a fresh one.
+    """
+    with _warm_guard:
+        lock = _warm_locks.setdefault(name, threading.Lock())
+    with lock:
+        driver = _warm_drivers.get(name)
+        if driver is None or not _is_alive(driver):
+            quit_browser(driver)
+            options.setdefault("profile_dir", profile_path(name))
+            driver = _warm_drivers[name] = create_browser(**options)
+        try:
+            yield driver
+        except WebDriverException:
+            quit_browser(driver)
+            _warm_drivers.pop(name, None)
+            raise
+
+@atexit.register
+def release_warm_browsers():
+    for name in list(_warm_drivers):
+        quit_browser(_warm_drivers.pop(name, None))
+
+# --- Measurements -------------------------------------------------------------
+
+# Bytes transferred by the current document and everything it loaded (0 for cross-origin entries without
+# Timing-Allow-Origin, so this is a lower bound)
+_PAGE_BYTES_SCRIPT = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+var total = 0;
+for (var i = 0; i < entries.length; i++) {
+    total += entries[i].transferSize || 0;
+}
+return total;
+"""
+
+def record_page(driver, page):
+    """Record the bytes the current tab has downloaded so far under page"""
+    try:
+        transferred = driver.execute_script(_PAGE_BYTES_SCRIPT) or 0
+    except Exception:
+        return None
+    with _stats_lock:
+        browser_stats["pages"].append({"page": page, "bytes": transferred})
+    return transferred
+
+def reset_browser_stats():
+    with _stats_lock:
+        del browser_stats["startups"][:]
+        del browser_stats["pages"][:]
+
+def summarize_browser_stats():
+    with _stats_lock:
+        startups = list(browser_stats["startups"])
+        pages = list(browser_stats["pages"])
+    return {
+        "startups": len(startups),
+        "startup_seconds_avg": sum(s["seconds"] for s in startups) / len(startups) if startups else 0.0,
+        "startup_seconds_max": max((s["seconds"] for s in startups), default=0.0),
+        "pages": len(pages),
+        "page_bytes_avg": sum(p["bytes"] for p in pages) / len(pages) if pages else 0.0,
+        "page_bytes_total": sum(p["bytes"] for p in pages),
+    }
+
+def print_browser_stats():
+    s = summarize_browser_stats()
+    if not s["startups"] and not s["pages"]:
+        return
+    print(f"Browsers: {s['startups']} started, avg startup {s['startup_seconds_avg']:.2f}s "
+          f"(max {s['startup_seconds_max']:.2f}s); {s['pages']} pages, "
+          f"avg {s['page_bytes_avg'] / 1024:.0f} KiB/page, {s['page_bytes_total'] / 1024:.0f} KiB total")
@@ -0,0 +1,202 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote, unquote
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    from pyarrow import fs
+except ImportError:  # pyarrow not installed: the cache is disabled and readers fall back to MongoDB or the CSVs
+    pa = None
+
+from market_store import market_db, load_symbol, ISO_DATE
+from mongo_writer import DATE_FIELDS
+from typed_schema import SCHEMAS, content_id, to_datetime
+
+# <CACHE_DIR>/<collection>/symbol=<symbol>/year=<year>/part.arrow, one uncompressed Arrow IPC file per symbol-year so
+# readers can memory-map just the files and columns they need
+CACHE_DIR = os.environ.get("NSE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".nse_scraper", "columnar"))
+
+# Set NSE_COLUMNAR_CACHE=0 to stop the CSV ingest from writing to the cache
+CACHE_ENABLED = pa is not None and os.environ.get("NSE_COLUMNAR_CACHE", "1") != "0"
+
+# Collections kept in the cache and the column that identifies a row within one symbol
+CACHED_COLLECTIONS = {"historical_data": "Date", "announcements": "_id"}
+
+# {collection: {symbol: newest cached time}}, so a sync from MongoDB only asks for newer documents
+MANIFEST_NAME = "_manifest.json"
+
+_write_lock = threading.Lock()
+
+def _schema(collection_name):
+    schema = SCHEMAS[collection_name]
+    fields = []
+    if collection_name == "announcements":
+        fields += [("_id", pa.string()), ("Subject", pa.string()), ("Announcement", pa.string())]
+    if collection_name == "historical_data":
+        fields.append(("Series", pa.string()))
+    fields += [(name, pa.timestamp("ms")) for name in schema.get("datetime", {})]
+    fields += [(name, pa.float64()) for name in schema.get("float", [])]
+    fields += [(name, pa.int64()) for name in schema.get("int", [])]
+    return pa.schema(fields)
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("symbol", pa.string()), ("year", pa.int32())]), flavor="hive")
+
+def _conform(frame, collection_name):
+    """frame with exactly the cached columns, in schema order (missing ones all null)"""
+    schema = _schema(collection_name)
+    frame = frame.copy()
+    for name in schema.names:
+        if name not in frame.columns:
+            frame[name] = None
+    return pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+
+def _with_content_ids(frame, symbol):
+    """Announcements with _id set to their content hash, as typed_frame / typed_document compute it.
+
+    Documents synced from MongoDB come without _id (load_symbol projects it away), so it is recomputed rather than
+    trusted; rows from the CSVs, the DOM and the API then share one id per announcement.
+    """
+    columns = [frame[field] if field in frame.columns else [None] * len(frame)
+               for field in SCHEMAS["announcements"]["hash"]]
+    return frame.assign(_id=[content_id(symbol, *parts) for parts in zip(*columns)])
+
+def symbol_dir(collection_name, symbol):
+    return os.path.join(CACHE_DIR, collection_name, f"symbol={quote(symbol, safe='')}")
+
+def cached_symbols(collection_name):
+    """Symbols with cached files for collection_name"""
+    root = os.path.join(CACHE_DIR, collection_name)
+    if not os.path.isdir(root):
+        return []
+    return sorted(unquote(name[len("symbol="):]) for name in os.listdir(root) if name.startswith("symbol="))
+
+def symbol_files(collection_name, symbol):
+    """The symbol's cached part files, one per year"""
+    directory = symbol_dir(collection_name, symbol)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, year, "part.arrow") for year in os.listdir(directory)
+                  if os.path.exists(os.path.join(directory, year, "part.arrow")))
+
+# --- Writing ------------------------------------------------------------------
+
+def _load_manifest():
+    path = os.path.join(CACHE_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_manifest(manifest):
+    path = os.path.join(CACHE_DIR, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def update_symbol(collection_name, symbol, frame):
+    """Merge typed rows (as made by typed_frame / load_symbol) into the symbol's cached years; returns rows merged"""
+    if pa is None or frame.empty:
+        return 0
+    time_field = DATE_FIELDS[collection_name]
+    key = CACHED_COLLECTIONS[collection_name]
+    times = pd.to_datetime(frame[time_field], errors="coerce")
+    # Rows without a parseable time cannot be placed in a year partition
+    frame = frame[times.notna()]
+    times = times[times.notna()]
+
+    with _write_lock:
+        for year, rows in frame.groupby(times.dt.year):
+            directory = os.path.join(symbol_dir(collection_name, symbol), f"year={year}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "part.arrow")
+            merged = _conform(rows, collection_name).to_pandas()
+            if os.path.exists(path):
+                stored = feather.read_table(path, memory_map=True).to_pandas()
+                merged = pd.concat([stored, merged], ignore_index=True)
+            if collection_name == "announcements":
+                merged = _with_content_ids(merged, symbol)
+            merged = merged.drop_duplicates(subset=[key], keep="last").sort_values(time_field, kind="stable")
+            feather.write_feather(_conform(merged, collection_name), path + ".tmp", compression="uncompressed")
+            os.replace(path + ".tmp", path)
+
+        manifest = _load_manifest()
+        newest = times.max().isoformat()
+        marks = manifest.setdefault(collection_name, {})
+        marks[symbol] = max(marks.get(symbol, newest), newest)
+        _save_manifest(manifest)
+    return len(frame)
+
+def sync_symbol(symbol, collection_names=tuple(CACHED_COLLECTIONS)):
+    """Bring the symbol's cache up to date with MongoDB (only documents at or after the newest cached time)"""
+    manifest = _load_manifest()
+    counts = {}
+    for collection_name in collection_names:
+        since = manifest.get(collection_name, {}).get(symbol)
+        since = datetime.datetime.fromisoformat(since) if since else None
+        frame = load_symbol(symbol, collection_name, start=since)
+        counts[collection_name] = update_symbol(collection_name, symbol, frame.drop(columns=["symbol"], errors="ignore"))
+    return counts
+
+def sync_from_mongo(symbols=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    symbols = symbols or sorted(market_db["historical_data"].distinct("symbol"))
+    for symbol in symbols:
+        counts = sync_symbol(symbol)
+        print(f"{symbol}: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
+
+# --- Reading ------------------------------------------------------------------
+
+def read_table(collection_name="historical_data", symbols=None, columns=None, start=None, end=None):
+    """Cached rows as an Arrow table with a symbol column; only the matching files, years and columns are read"""
+    root = os.path.join(CACHE_DIR, collection_name)
+    if not os.path.isdir(root):
+        return _schema(collection_name).append(pa.field("symbol", pa.string())).empty_table()
+    dataset = ds.dataset(root, format="ipc", partitioning=_partitioning(), filesystem=fs.LocalFileSystem(use_mmap=True))
+    time_field = DATE_FIELDS[collection_name]
+    condition = None
+
+    def _and(expression):
+        return expression if condition is None else condition & expression
+
+    if symbols is not None:
+        condition = _and(ds.field("symbol").isin(list(symbols)))
+    if start is not None:
+        start = to_datetime(start, ISO_DATE)
+        condition = _and((ds.field("year") >= start.year) & (ds.field(time_field) >= pa.scalar(start, pa.timestamp("ms"))))
+    if end is not None:
+        end = to_datetime(end, ISO_DATE)
+        condition = _and((ds.field("year") <= end.year) & (ds.field(time_field) <= pa.scalar(end, pa.timestamp("ms"))))
+    if columns is not None:
+        columns = ["symbol"] + [c for c in columns if c != "symbol"]
+    return dataset.to_table(columns=columns, filter=condition)
+
+def read_frame(collection_name="historical_data", symbols=None, columns=None, start=None, end=None):
+    """read_table as a DataFrame sorted by symbol and time"""
+    table = read_table(collection_name, symbols, columns, start, end)
+    time_field = DATE_FIELDS[collection_name]
+    # The year partition is only there to skip files
+    table = table.select([name for name in table.column_names if name != "year"])
+    if time_field in table.column_names:
+        table = table.sort_by([("symbol", "ascending"), (time_field, "ascending")])
+    return table.to_pandas()
+
+if __name__ == "__main__":
+    if pa is None:
+        raise SystemExit("pyarrow is required for the columnar cache (pip install pyarrow)")
+    command, names = (sys.argv[1] if len(sys.argv) > 1 else "sync"), sys.argv[2:]
+    if command == "sync":
+        sync_from_mongo(names or None)
+    elif command == "load":
+        started = time.time()
+        loaded = read_table("historical_data", names or None)
+        print(f"Loaded {loaded.num_rows} rows of {len(pc.unique(loaded['symbol']))} symbols "
+              f"in {time.time() - started:.2f}s")
@@ -1,260 +1,294 @@
-import time
-import undetected_chromedriver as uc
+import datetime
+import os
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from pymongo import MongoClient
+from page_readiness import (
+    wait_for, document_ready, clickable, new_window_opened, element_has_text, rows_present, rows_stable,
+    table_signature, table_refreshed, print_step_timings,
+    LIVE_EQUITY_ROWS, HISTORICAL_ROWS, QUOTE_ANNOUNCEMENT_ROWS,
+)
+from dom_extract import extract_table, expand_announcement_rows, extract_fields, load_all_rows
+from mongo_writer import BulkWriter, MARKET_DB, symbol_document
+from browser_factory import create_browser, profile_path, record_page, print_browser_stats
+from typed_schema import typed_document
+from run_metrics import begin_run_metrics, begin_company, track_stage, stage_rows, stage_error, end_company, write_run_report
 
 # MongoDB Setup
 client = MongoClient("mongodb://localhost:27017/")
 
-def scrape_nse_historical_data():
-    options = uc.ChromeOptions()
-    driver = uc.Chrome(options=options)
-    driver.get("https://www.nseindia.com/market-data/live-equity-market")
+# Point this at a local stand-in server (see nse_replay.py) to scrape recorded pages offline
+NSE_BASE_URL = os.environ.get("NSE_BASE_URL", "https://www.nseindia.com")
+
+# Load announcements back to this many days ago (matches the "6M" filter), however many rows that takes
+ANNOUNCEMENT_DAYS = 182
+
+def scrape_first_company():
+    """Scrape the first company on the live equity page; returns its name, or None if a page step failed"""
+    driver = create_browser(profile_dir=profile_path("one_company"))
+    driver.get(NSE_BASE_URL + "/market-data/live-equity-market")
 
-    wait = WebDriverWait(driver, 20)
-    time.sleep(10)  # Let the main table load
+    wait_for(driver, rows_present(LIVE_EQUITY_ROWS, min_rows=2), "live_equity_table")  # Let the main table load
 
     # Click on the first company name (Opens in a new tab)
-    first_company = wait.until(EC.element_to_be_clickable((By.XPATH, "//table[@id='equityStockTable']//tbody/tr[2]/td[1]/a")))
+    first_company = wait_for(driver, clickable((By.XPATH, "//table[@id='equityStockTable']//tbody/tr[2]/td[1]/a")), "company_link")
     company_name = first_company.text.strip()
+    begin_company(company_name)
+    track_stage("navigation")
+    known_tabs = driver.window_handles
     first_company.click()
-    time.sleep(5)
 
     # Switch to the new tab
-    driver.switch_to.window(driver.window_handles[-1])  
-    time.sleep(5)
+    driver.switch_to.window(wait_for(driver, new_window_opened(known_tabs), "company_tab_opened"))
+    wait_for(driver, document_ready(), "company_page_ready", required=False)
 
     # Click on "Historical Data"
     try:
-        historical_data_tab = wait.until(EC.element_to_be_clickable((By.ID, "loadHistoricalData")))
+        historical_data_tab = wait_for(driver, clickable((By.ID, "loadHistoricalData")), "historical_tab")
         driver.execute_script("arguments[0].click();", historical_data_tab)
-        time.sleep(5)
+        wait_for(driver, rows_present(HISTORICAL_ROWS), "historical_table")
     except Exception as e:
         print("Failed to click on 'Historical Data':", e)
+        stage_error()
         driver.quit()
         return
     
     # Click on "6M" filter
     try:
-        six_months_filter = wait.until(EC.element_to_be_clickable((By.ID, "sixM")))
+        six_months_filter = wait_for(driver, clickable((By.ID, "sixM")), "six_months_filter")
         six_months_filter.click()
-        time.sleep(3)
 
         # Click on "Filter" button after selecting 6M
-        filter_button = wait.until(EC.element_to_be_clickable((By.ID, "tradeDataFilter")))
+        filter_button = wait_for(driver, clickable((By.ID, "tradeDataFilter")), "filter_button")
+        before = table_signature(driver, HISTORICAL_ROWS)
         filter_button.click()
-        time.sleep(5)
+        wait_for(driver, table_refreshed(HISTORICAL_ROWS, before), "historical_filtered")
     except Exception as e:
         print("Failed to click on '6M' filter or 'Filter' button:", e)
+        stage_error()
         driver.quit()
         return
 
     
     # Scrape the historical data table
-    rows = driver.find_elements(By.XPATH, "//table[@id='equityHistoricalTable']//tbody/tr")
+    track_stage("historical_dom")
+    rows = extract_table(driver, HISTORICAL_ROWS)
     
     # Connect to MongoDB
-    db = client[company_name]
-    historical_collection = db["historical_data"]
+    db = client[MARKET_DB]
+    writer = BulkWriter(client, background=False)
 
-    for row in rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
+    for cols in rows:
         if len(cols) >= 14:
             entry = {
-                "_id": cols[0].text.strip(),
-                "Date": cols[0].text.strip(),
-                "Series": cols[1].text.strip(),
-                "OPEN": cols[2].text.strip(),
-                "HIGH": cols[3].text.strip(),
-                "LOW": cols[4].text.strip(),
-                "PREV_CLOSE": cols[5].text.strip(),
-                "LTP": cols[6].text.strip(),
-                "CLOSE": cols[7].text.strip(),
-                "VWAP": cols[8].text.strip(),
-                "52W_H": cols[9].text.strip(),
-                "52W_L": cols[10].text.strip(),
-                "VOLUME": cols[11].text.strip(),
-                "VALUE": cols[12].text.strip(),
-                "No_of_Trades": cols[13].text.strip()
+                "_id": cols[0],
+                "Date": cols[0],
+                "Series": cols[1],
+                "OPEN": cols[2],
+                "HIGH": cols[3],
+                "LOW": cols[4],
+                "PREV_CLOSE": cols[5],
+                "LTP": cols[6],
+                "CLOSE": cols[7],
+                "VWAP": cols[8],
+                "52W_H": cols[9],
+                "52W_L": cols[10],
+                "VOLUME": cols[11],
+                "VALUE": cols[12],
+                "No_of_Trades": cols[13]
             }
             
             # Insert or update if entry exists
-            historical_collection.update_one({"_id": entry["_id"]}, {"$set": entry}, upsert=True)
+            writer.upsert(company_name, "historical_data", typed_document("historical_data", entry))
+            stage_rows(1)
+    writer.close()
 
     print(f"Scraped and stored historical data for {company_name} in MongoDB.")
 
     # Click on "Trade Information" tab
+    track_stage("trade_information")
     try:
-        trade_info_tab = wait.until(EC.element_to_be_clickable((By.ID, "infoTrade")))
+        trade_info_tab = wait_for(driver, clickable((By.ID, "infoTrade")), "trade_info_tab")
         trade_info_tab.click()
-        time.sleep(7)
+        wait_for(driver, element_has_text("orderBookTradeVol"), "trade_information", required=False)
 
         # Scrape the Trade Information table
         try:
-            trade_info_data = {
-                "Traded Volume (Lakhs)": driver.find_element(By.ID, "orderBookTradeVol").text.strip(),
-                "Traded Value (₹ Cr.)": driver.find_element(By.ID, "orderBookTradeVal").text.strip(),
-                "Total Market Cap (₹ Cr.)": driver.find_element(By.ID, "orderBookTradeTMC").text.strip(),
-                "Free Float Market Cap (₹ Cr.)": driver.find_element(By.ID, "orderBookTradeFFMC").text.strip(),
-                "Impact Cost": driver.find_element(By.ID, "orderBookTradeIC").text.strip(),
-                "% of Deliverable / Traded Quantity": driver.find_element(By.ID, "orderBookDeliveryTradedQty").text.strip(),
-                "Applicable Margin Rate": driver.find_element(By.ID, "orderBookAppMarRate").text.strip(),
-                "Face Value": driver.find_element(By.ID, "mainFaceValue").text.strip()
-            }
+            trade_info_data = extract_fields(driver, {
+                "Traded Volume (Lakhs)": ("id", "orderBookTradeVol"),
+                "Traded Value (₹ Cr.)": ("id", "orderBookTradeVal"),
+                "Total Market Cap (₹ Cr.)": ("id", "orderBookTradeTMC"),
+                "Free Float Market Cap (₹ Cr.)": ("id", "orderBookTradeFFMC"),
+                "Impact Cost": ("id", "orderBookTradeIC"),
+                "% of Deliverable / Traded Quantity": ("id", "orderBookDeliveryTradedQty"),
+                "Applicable Margin Rate": ("id", "orderBookAppMarRate"),
+                "Face Value": ("id", "mainFaceValue")
+            })
 
             # Add a timestamp of scrape time
-            import datetime
             trade_info_data["Scraped_At"] = datetime.datetime.now()
 
             trade_info_collection = db["trade_information"]
-            trade_info_collection.insert_one(trade_info_data)
+            trade_info_collection.insert_one(symbol_document(company_name, typed_document("trade_information", trade_info_data)))
 
+            stage_rows(1)
             print(f"Scraped and stored trade information for {company_name} in MongoDB.")
         except Exception as e:
             print("Failed to scrape Trade Information table:", e)
+            stage_error()
 
         # Scrape the Price Information table
+        track_stage("price_information")
         try:
-            time.sleep(3)
-            price_info_data = {
-                "52 Week High": driver.find_element(By.ID, "week52highVal").text.strip(),
-                "52 Week High Date": driver.find_element(By.ID, "week52HighDate").text.strip(),
-                "52 Week Low": driver.find_element(By.ID, "week52lowVal").text.strip(),
-                "52 Week Low Date": driver.find_element(By.ID, "week52LowDate").text.strip(),
-                "Upper Band": driver.find_element(By.ID, "upperbandVal").text.strip(),
-                "Lower Band": driver.find_element(By.ID, "lowerbandVal").text.strip(),
-                "Price Band (%)": driver.find_element(By.ID, "pricebandVal").text.strip(),
-                "Daily Volatility": driver.find_element(By.ID, "orderBookTradeDV").text.strip(),
-                "Annualised Volatility": driver.find_element(By.ID, "orderBookTradeAV").text.strip(),
-                "Tick Size": driver.find_element(By.ID, "tickSize").text.strip(),
-                "Scraped_At": datetime.datetime.now()
-            }
+            wait_for(driver, element_has_text("week52highVal"), "price_information", required=False)
+            price_info_data = extract_fields(driver, {
+                "52 Week High": ("id", "week52highVal"),
+                "52 Week High Date": ("id", "week52HighDate"),
+                "52 Week Low": ("id", "week52lowVal"),
+                "52 Week Low Date": ("id", "week52LowDate"),
+                "Upper Band": ("id", "upperbandVal"),
+                "Lower Band": ("id", "lowerbandVal"),
+                "Price Band (%)": ("id", "pricebandVal"),
+                "Daily Volatility": ("id", "orderBookTradeDV"),
+                "Annualised Volatility": ("id", "orderBookTradeAV"),
+                "Tick Size": ("id", "tickSize")
+            })
+            price_info_data["Scraped_At"] = datetime.datetime.now()
 
             # Insert into 'price_information' collection
             price_info_collection = db["price_information"]
-            price_info_collection.insert_one(price_info_data)
+            price_info_collection.insert_one(symbol_document(company_name, typed_document("price_information", price_info_data)))
 
+            stage_rows(1)
             print(f"Scraped and stored price information for {company_name} in MongoDB.")
         except Exception as e:
             print("Failed to scrape Price Information table:", e)
+            stage_error()
 
         # Scrape the Securities Information table
+        track_stage("securities_information")
         try:
-            time.sleep(3)
-            securities_info_data = {
-                "Status": driver.find_element(By.ID, "Listed").text.strip(),
-                "Trading Status": driver.find_element(By.ID, "Active").text.strip(),
-                "Date of Listing": driver.find_element(By.XPATH, "//td[@id='Date_of_Listing']/following-sibling::td").text.strip(),
-                "Adjusted P/E": driver.find_element(By.XPATH, "//td[@id='SectoralIndxPE']/following-sibling::td").text.strip(),
-                "Symbol P/E": driver.find_element(By.XPATH, "//td[@id='Symbol_PE']/following-sibling::td").text.strip(),
-                "Index": driver.find_element(By.XPATH, "//td[@id='Sectoral_Index']/following-sibling::td").text.strip(),
-                "Basic Industry": driver.find_element(By.XPATH, "//span[@id='BasicIndustry']/ancestor::td/following-sibling::td").text.strip(),
-                "Scraped_At": datetime.datetime.now()
-            }
+            wait_for(driver, element_has_text("Listed"), "securities_information", required=False)
+            securities_info_data = extract_fields(driver, {
+                "Status": ("id", "Listed"),
+                "Trading Status": ("id", "Active"),
+                "Date of Listing": ("xpath", "//td[@id='Date_of_Listing']/following-sibling::td"),
+                "Adjusted P/E": ("xpath", "//td[@id='SectoralIndxPE']/following-sibling::td"),
+                "Symbol P/E": ("xpath", "//td[@id='Symbol_PE']/following-sibling::td"),
+                "Index": ("xpath", "//td[@id='Sectoral_Index']/following-sibling::td"),
+                "Basic Industry": ("xpath", "//span[@id='BasicIndustry']/ancestor::td/following-sibling::td")
+            })
+            securities_info_data["Scraped_At"] = datetime.datetime.now()
 
             securities_info_collection = db["securities_information"]
-            securities_info_collection.insert_one(securities_info_data)
+            securities_info_collection.insert_one(symbol_document(company_name, typed_document("securities_information", securities_info_data)))
 
+            stage_rows(1)
             print(f"Scraped and stored securities information for {company_name} in MongoDB.")
         except Exception as e:
             print("Failed to scrape Securities Information table:", e)
+            stage_error()
     
         
     except Exception as e:
         print("Failed to click on 'Trade Information':", e)
+        stage_error()
         driver.quit()
         return
 
     # Click on the arrow image (View All)
+    track_stage("announcements_navigation")
     try:
-        view_all_arrow = wait.until(EC.presence_of_element_located((By.ID, "ann_quoteRedirect")))
+        view_all_arrow = wait_for(driver, EC.presence_of_element_located((By.ID, "ann_quoteRedirect")), "view_all_arrow")
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", view_all_arrow)
-        time.sleep(7)
+        view_all_arrow = wait_for(driver, clickable((By.ID, "ann_quoteRedirect")), "view_all_arrow_clickable")
         view_all_arrow.click()
-        time.sleep(7)
     except Exception as e:
         print("Failed to click on 'View All' arrow after scrolling:", e)
+        stage_error()
         driver.quit()
         return
     
     # Click on "6M" filter in announcements
     try:
-        announcements_six_months = wait.until(EC.element_to_be_clickable((By.XPATH, "//a[@data-val='6M']")))
+        announcements_six_months = wait_for(driver, clickable((By.XPATH, "//a[@data-val='6M']")), "announcements_filter")
         announcements_six_months.click()
-        time.sleep(5)
+        wait_for(driver, rows_stable(QUOTE_ANNOUNCEMENT_ROWS), "announcements_table", required=False)
     except Exception as e:
         print("Failed to click on '6M' filter in announcements:", e)
+        stage_error()
         driver.quit()
         return
 
+    # Scroll again as soon as each page of rows arrives, until the site has no more or they predate the cap
+    since = datetime.datetime.now() - datetime.timedelta(days=ANNOUNCEMENT_DAYS)
+    track_stage("announcements_load")
     try:
-        scroll_container = driver.find_element(By.ID, "corpAnnouncementTable")
-        max_attempts = 15  # Safety cap to avoid infinite scroll
-        prev_row_count = 0
-
-        for attempt in range(max_attempts):
-            driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scroll_container)
-            time.sleep(2)
-
-            rows_loaded = driver.find_elements(By.XPATH, "//div[@id='corpAnnouncementTable']//table//tbody/tr")
-            current_row_count = len(rows_loaded)
-            print(f"Scroll attempt {attempt+1}: {current_row_count} rows loaded")
-
-            if current_row_count >= 82:
-                break  # Desired row count reached
-            if current_row_count == prev_row_count:
-                break  # No new rows loaded, stop scrolling
-            prev_row_count = current_row_count
+        loaded = load_all_rows(driver, "#corpAnnouncementTable", QUOTE_ANNOUNCEMENT_ROWS, since=since)
+        stage_rows(loaded["rows"])
+        print(f"Loaded {loaded['rows']} announcement rows in {loaded['batches']} batches ({loaded['reason']})")
     except Exception as e:
-        print("Error during scrolling:", e)    
+        print("Error while loading announcement rows:", e)
+        stage_error()
 
-    # Click all "Read More" buttons
-    try:
-        read_more_buttons = driver.find_elements(By.CLASS_NAME, "readMore")
-        for btn in read_more_buttons:
-            try:
-                driver.execute_script("arguments[0].click();", btn)
-                time.sleep(0.1)
-            except:
-                continue
-    except Exception as e:
-        print("Failed to expand all Read More texts:", e)
-
-    # Scrape the announcements table
+    # Expand every "Read More" and read the whole table in one browser call
+    track_stage("announcements_dom")
     announcements_data_list = []
-    announcement_rows = driver.find_elements(By.XPATH, "//div[@id='corpAnnouncementTable']//table//tbody/tr")
+    announcement_rows = expand_announcement_rows(driver, QUOTE_ANNOUNCEMENT_ROWS)
 
     for row in announcement_rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
+        cols = row["cells"]
 
         if len(cols) >= 4:
-            subject = cols[0].text.strip()
-            announcement_text = driver.execute_script("return arguments[0].textContent;", cols[1]).strip()
-            broadcast_time = cols[3].text.strip()
+            subject = row["subject"]
+            announcement_text = row["details"]
+            broadcast_time = row["broadcast_time"]
 
             # Skip empty or duplicate-like rows
             if not subject and not announcement_text:
                 continue
-            if "..." in announcement_text and not cols[1].find_elements(By.CLASS_NAME, "readMore"):
+            if "..." in announcement_text and not row["has_read_more"]:
                 continue
 
-            announcements_data_list.append({
+            announcement = typed_document("announcements", {
                 "Subject": subject,
                 "Announcement": announcement_text,
                 "Broadcast Date/Time": broadcast_time
-            })
+            }, company_name)
+
+            # The last page loaded can reach past the date cap
+            broadcast_at = announcement["Broadcast Date/Time"]
+            if isinstance(broadcast_at, datetime.datetime) and broadcast_at < since:
+                continue
+            announcements_data_list.append(announcement)
 
     # Store announcements data in MongoDB
-    announcements_collection = db["announcements"]
+    track_stage("mongo_flush")
+    stage_rows(len(announcements_data_list))
     if announcements_data_list:
-        announcements_collection.insert_many(announcements_data_list)
+        with BulkWriter(client, background=False) as announcements_writer:
+            announcements_writer.upsert_many(company_name, "announcements", announcements_data_list)
         print(f"Scraped and stored announcements data for {company_name} in MongoDB.")
     else:
         print(f"No announcements data found for {company_name}.")
 
+    record_page(driver, company_name)
     driver.quit()
+    print_step_timings()
+    print_browser_stats()
+    return company_name
+
+def scrape_nse_historical_data():
+    begin_run_metrics("scrape_one_company")
+    ok = False
+    try:
+        ok = scrape_first_company() is not None
+    except Exception:
+        stage_error()
+        raise
+    finally:
+        end_company(ok)
+        write_run_report()
 
 if __name__ == "__main__":
     scrape_nse_historical_data()
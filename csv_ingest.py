@@ -0,0 +1,145 @@
+import os
+import sys
+import pandas as pd
+from pymongo import MongoClient
+
+from mongo_writer import BulkWriter
+from scrape_checkpoints import get_checkpoint, update_checkpoint
+from typed_schema import typed_frame, frame_records
+from columnar_cache import CACHE_ENABLED, update_symbol
+
+# Rows read per chunk; memory use is bounded by this, not by file size
+CHUNK_ROWS = 5000
+
+# Normalized CSV header -> field name used by the DOM scraper
+HISTORICAL_COLUMNS = {
+    "date": "Date",
+    "series": "Series",
+    "open": "OPEN",
+    "high": "HIGH",
+    "low": "LOW",
+    "prev_close": "PREV_CLOSE",
+    "ltp": "LTP",
+    "close": "CLOSE",
+    "vwap": "VWAP",
+    "52w_h": "52W_H",
+    "52w_l": "52W_L",
+    "volume": "VOLUME",
+    "value": "VALUE",
+    "no_of_trades": "No_of_Trades",
+}
+
+ANNOUNCEMENT_COLUMNS = {
+    "subject": "Subject",
+    "details": "Announcement",
+    "broadcast_date_time": "Broadcast Date/Time",
+}
+
+def normalize_column(name):
+    """'PREV. CLOSE ' -> 'prev_close', 'BROADCAST DATE/TIME' -> 'broadcast_date_time' (same rule as the notebook)"""
+    return name.strip().lstrip("\ufeff").lower().replace(" ", "_").replace(".", "").replace("/", "_")
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Stream a CSV as string-typed chunks with normalized column names"""
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, encoding="utf-8-sig", keep_default_na=False):
+        chunk.columns = [normalize_column(c) for c in chunk.columns]
+        yield chunk
+
+def clean_announcement_column(series):
+    """Vectorized clean_announcement_text"""
+    series = series.str.strip()
+    series = series.str.replace(r"\s*Read Less$", "", regex=True)
+    needs_period = (series != "") & ~series.str[-1:].isin([".", "!", "?"])
+    return series.where(~needs_period, series + ".")
+
+def historical_frame(chunk):
+    frame = chunk[[c for c in HISTORICAL_COLUMNS if c in chunk.columns]].rename(columns=HISTORICAL_COLUMNS)
+    frame = frame.apply(lambda col: col.str.strip())
+    frame.insert(0, "_id", frame["Date"])
+    return typed_frame("historical_data", frame)
+
+def announcements_frame(chunk, symbol):
+    frame = chunk[[c for c in ANNOUNCEMENT_COLUMNS if c in chunk.columns]].rename(columns=ANNOUNCEMENT_COLUMNS)
+    frame["Subject"] = frame["Subject"].str.strip()
+    frame["Announcement"] = clean_announcement_column(frame["Announcement"])
+    frame["Broadcast Date/Time"] = frame["Broadcast Date/Time"].str.split().str.join(" ")
+    frame = frame[(frame["Subject"] != "") | (frame["Announcement"] != "")]
+
+    # Same content-hash _id as the DOM scraper and the API, so a re-ingest skips what is already stored
+    return typed_frame("announcements", frame, symbol)
+
+def ingest_historical_csv(path, symbol, writer, chunk_rows=CHUNK_ROWS):
+    """Stream a downloaded historical CSV into <symbol>.historical_data; returns the number of rows queued"""
+    last_trade_date = get_checkpoint(symbol).get("last_trade_date")
+    newest, count = None, 0
+    for chunk in read_chunks(path, chunk_rows):
+        frame = historical_frame(chunk)
+        trade_dates = frame["Date"]
+        if last_trade_date is not None:
+            keep = trade_dates.isna() | (trade_dates >= last_trade_date)
+            frame, trade_dates = frame[keep], trade_dates[keep]
+        if frame.empty:
+            continue
+        writer.upsert_many(symbol, "historical_data", frame_records(frame, "historical_data"))
+        count += len(frame)
+        if CACHE_ENABLED:
+            update_symbol("historical_data", symbol, frame)
+        if trade_dates.notna().any():
+            newest = max(newest, trade_dates.max()) if newest is not None else trade_dates.max()
+
+    writer.flush()
+    failed = writer.take_failures(symbol, "historical_data")
+    if failed:
+        # Leave the checkpoint where it was so the next run reads these rows again
+        print(f"{symbol}: {failed} historical rows failed to write; not advancing the checkpoint")
+    elif newest is not None:
+        update_checkpoint(symbol, last_trade_date=newest.to_pydatetime())
+    return count
+
+def ingest_announcements_csv(path, symbol, writer, chunk_rows=CHUNK_ROWS):
+    """Stream a downloaded announcements CSV into <symbol>.announcements; returns the number of rows queued"""
+    last_broadcast_time = get_checkpoint(symbol).get("last_broadcast_time")
+    newest, count = None, 0
+    for chunk in read_chunks(path, chunk_rows):
+        frame = announcements_frame(chunk, symbol)
+        broadcast_times = frame["Broadcast Date/Time"]
+        if last_broadcast_time is not None:
+            keep = broadcast_times.isna() | (broadcast_times > last_broadcast_time)
+            frame, broadcast_times = frame[keep], broadcast_times[keep]
+        if frame.empty:
+            continue
+        writer.upsert_many(symbol, "announcements", frame_records(frame, "announcements"))
+        count += len(frame)
+        if CACHE_ENABLED:
+            update_symbol("announcements", symbol, frame)
+        if broadcast_times.notna().any():
+            newest = max(newest, broadcast_times.max()) if newest is not None else broadcast_times.max()
+
+    writer.flush()
+    failed = writer.take_failures(symbol, "announcements")
+    if failed:
+        # Leave the checkpoint where it was so the next run reads these rows again
+        print(f"{symbol}: {failed} announcements failed to write; not advancing the checkpoint")
+    elif newest is not None:
+        update_checkpoint(symbol, last_broadcast_time=newest.to_pydatetime())
+    return count
+
+def ingest_directory(base_dir, writer):
+    """Ingest every <company>/<company>_{historical,announcements}_data.csv under base_dir"""
+    for company_name in sorted(os.listdir(base_dir)):
+        company_dir = os.path.join(base_dir, company_name)
+        if not os.path.isdir(company_dir) or company_name.startswith("_"):
+            continue
+        historical_path = os.path.join(company_dir, f"{company_name}_historical_data.csv")
+        announcements_path = os.path.join(company_dir, f"{company_name}_announcements_data.csv")
+        if os.path.exists(historical_path):
+            print(f"{company_name}: {ingest_historical_csv(historical_path, company_name, writer)} historical rows")
+        if os.path.exists(announcements_path):
+            print(f"{company_name}: {ingest_announcements_csv(announcements_path, company_name, writer)} announcements")
+
+if __name__ == "__main__":
+    from CompleteDataScraping_withPreprocessing import DOWNLOAD_DIR
+
+    with BulkWriter(MongoClient("mongodb://localhost:27017/")) as csv_writer:
+        ingest_directory(sys.argv[1] if len(sys.argv) > 1 else DOWNLOAD_DIR, csv_writer)
+    csv_writer.report()
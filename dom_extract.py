@@ -0,0 +1,211 @@
+import datetime
+import time
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from page_readiness import record_step
+
+# How long the announcements table must stay unchanged after "Read More" clicks before it counts as settled
+EXPAND_SETTLE_SECONDS = 0.3
+
+# Upper bound on the whole expand-and-read call
+EXPAND_TIMEOUT = 10
+
+# A lazily loaded table counts as complete once no new rows have arrived this long after scrolling to its end
+LOAD_IDLE_SECONDS = 1.5
+
+# Upper bound on loading every page of a lazily loaded table
+LOAD_TIMEOUT = 120
+
+# Serialize every row of a table to a list of trimmed cell texts
+_TABLE_SCRIPT = """
+var rows = document.querySelectorAll(arguments[0]);
+var out = [];
+for (var i = 0; i < rows.length; i++) {
+    var cells = rows[i].querySelectorAll('td');
+    var row = [];
+    for (var j = 0; j < cells.length; j++) {
+        row.push(cells[j].innerText.trim());
+    }
+    out.push(row);
+}
+return out;
+"""
+
+# Click every "Read More" in the table at once, wait until a MutationObserver has seen no change for settleMs
+# (or maxMs has passed), then serialize all rows: cell texts, the details cell's full textContent, whether it
+# still has a "Read More" link, and the subject and broadcast time
+_EXPAND_ANNOUNCEMENTS_SCRIPT = """
+var rowsCss = arguments[0], settleMs = arguments[1], maxMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var rows = document.querySelectorAll(rowsCss);
+var expanded = 0;
+for (var i = 0; i < rows.length; i++) {
+    var links = rows[i].querySelectorAll('.readMore');
+    for (var j = 0; j < links.length; j++) {
+        try { links[j].click(); expanded++; } catch (e) {}
+    }
+}
+
+function serialize() {
+    var rows = document.querySelectorAll(rowsCss);
+    var out = [];
+    for (var i = 0; i < rows.length; i++) {
+        var cells = rows[i].querySelectorAll('td');
+        var row = {cells: [], details: '', has_read_more: false, subject: '', broadcast_time: ''};
+        for (var j = 0; j < cells.length; j++) {
+            row.cells.push(cells[j].innerText.trim());
+        }
+        if (cells.length > 1) {
+            row.details = cells[1].textContent.trim();
+            row.has_read_more = cells[1].querySelector('.readMore') !== null;
+        }
+        row.subject = row.cells.length > 0 ? row.cells[0] : '';
+        row.broadcast_time = row.cells.length > 3 ? row.cells[3] : '';
+        out.push(row);
+    }
+    return {rows: out, expanded: expanded};
+}
+
+var table = rows.length ? rows[0].closest('table') : null;
+if (!table || !expanded) {
+    done(serialize());
+    return;
+}
+var finished = false, timer = null, observer = null;
+function finish() {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done(serialize());
+}
+observer = new MutationObserver(function () {
+    clearTimeout(timer);
+    timer = setTimeout(finish, settleMs);
+});
+observer.observe(table, {childList: true, subtree: true, characterData: true, attributes: true});
+timer = setTimeout(finish, settleMs);
+setTimeout(finish, maxMs);
+"""
+
+# Scroll a lazily loaded table to its end again as soon as a MutationObserver sees new rows, until no rows arrive
+# for idleMs, the oldest row's date (dd-Mon-yyyy in column dateColumn) is before sinceMs, or maxMs has passed
+_LOAD_ALL_ROWS_SCRIPT = """
+var container = document.querySelector(arguments[0]), rowsCss = arguments[1], sinceMs = arguments[2];
+var dateColumn = arguments[3], idleMs = arguments[4], maxMs = arguments[5];
+var done = arguments[arguments.length - 1];
+var MONTHS = {jan: 0, feb: 1, mar: 2, apr: 3, may: 4, jun: 5, jul: 6, aug: 7, sep: 8, oct: 9, nov: 10, dec: 11};
+
+function rowTime(row) {
+    var cell = row.querySelectorAll('td')[dateColumn];
+    var m = cell ? /(\\d{1,2})-([A-Za-z]{3})-(\\d{4})/.exec(cell.innerText) : null;
+    if (!m || !(m[2].toLowerCase() in MONTHS)) return null;
+    return new Date(+m[3], MONTHS[m[2].toLowerCase()], +m[1]).getTime();
+}
+
+function state() {
+    var rows = document.querySelectorAll(rowsCss);
+    return {rows: rows.length, oldest: rows.length ? rowTime(rows[rows.length - 1]) : null};
+}
+
+if (!container) {
+    var s = state();
+    s.reason = 'no_container';
+    done(s);
+    return;
+}
+
+var finished = false, idleTimer = null, batches = 0, lastCount = -1, observer = null;
+function finish(reason) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearTimeout(idleTimer);
+    var s = state();
+    s.reason = reason;
+    s.batches = batches;
+    done(s);
+}
+function step() {
+    var s = state();
+    if (sinceMs !== null && s.oldest !== null && s.oldest < sinceMs) {
+        finish('date_cap');
+        return;
+    }
+    if (s.rows === lastCount) return;
+    lastCount = s.rows;
+    batches++;
+    container.scrollTop = container.scrollHeight;
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(function () { finish('end'); }, idleMs);
+}
+observer = new MutationObserver(function () { if (!finished) step(); });
+observer.observe(container, {childList: true, subtree: true});
+setTimeout(function () { finish('timeout'); }, maxMs);
+step();
+"""
+
+# Look up a set of named elements by id or XPath and return their trimmed texts (null when missing)
+_FIELDS_SCRIPT = """
+var fields = arguments[0];
+var out = {};
+for (var name in fields) {
+    var kind = fields[name][0], selector = fields[name][1], el = null;
+    if (kind === 'id') {
+        el = document.getElementById(selector);
+    } else {
+        el = document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    out[name] = el ? el.innerText.trim() : null;
+}
+return out;
+"""
+
+def extract_table(driver, rows_css):
+    """Return every row matching rows_css as a list of cell texts, in one browser call"""
+    return driver.execute_script(_TABLE_SCRIPT, rows_css) or []
+
+def expand_announcement_rows(driver, rows_css, settle=EXPAND_SETTLE_SECONDS, timeout=EXPAND_TIMEOUT):
+    """Expand every truncated announcement and return all rows (cells, subject, details, broadcast_time,
+    has_read_more) in one browser call, instead of one click and one textContent call per row"""
+    driver.set_script_timeout(timeout + 5)
+    started = time.time()
+    try:
+        result = driver.execute_async_script(_EXPAND_ANNOUNCEMENTS_SCRIPT, rows_css, int(settle * 1000), int(timeout * 1000))
+    except TimeoutException:
+        record_step("announcements_expanded", time.time() - started, timeout, False)
+        raise
+    record_step("announcements_expanded", time.time() - started, timeout, True)
+    return (result or {}).get("rows", [])
+
+def load_all_rows(driver, container_css, rows_css, since=None, date_column=3, idle=LOAD_IDLE_SECONDS, timeout=LOAD_TIMEOUT):
+    """Load every page of a scroll-to-load table, as fast as the site delivers them.
+
+    Stops when no new rows arrive for `idle` seconds or, if since is given, once the oldest loaded row is dated
+    before it. Returns {"rows", "oldest", "reason", "batches"}.
+    """
+    since_ms = None
+    if since is not None:
+        since_ms = int(datetime.datetime(since.year, since.month, since.day).timestamp() * 1000)
+    driver.set_script_timeout(timeout + 5)
+    started = time.time()
+    try:
+        result = driver.execute_async_script(
+            _LOAD_ALL_ROWS_SCRIPT, container_css, rows_css, since_ms, date_column, int(idle * 1000), int(timeout * 1000)
+        )
+    except TimeoutException:
+        record_step("rows_loaded", time.time() - started, timeout, False)
+        raise
+    record_step("rows_loaded", time.time() - started, timeout, result.get("reason") != "timeout")
+    return result
+
+def extract_fields(driver, fields):
+    """Return {name: text} for fields given as {name: ("id" | "xpath", selector)}, in one browser call.
+
+    Raises NoSuchElementException if any field is missing, like driver.find_element would.
+    """
+    values = driver.execute_script(_FIELDS_SCRIPT, {name: list(locator) for name, locator in fields.items()})
+    missing = [name for name, value in values.items() if value is None]
+    if missing:
+        raise NoSuchElementException(f"Missing elements for: {', '.join(missing)}")
+    return values
@@ -0,0 +1,120 @@
+import datetime
+import os
+import shutil
+import threading
+import time
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # not Linux, or inotify_simple not installed: fall back to polling
+    INotify = None
+
+# Suffixes Chrome (and other browsers) use for downloads still in progress
+PARTIAL_SUFFIXES = (".crdownload", ".tmp", ".part")
+
+# Directory poll interval when inotify is unavailable
+POLL_INTERVAL = 0.2
+
+# Every completed download appends {"name", "file", "bytes", "latency"} here
+download_stats = []
+_stats_lock = threading.Lock()
+
+def job_download_dir(base_dir, company_name, kind):
+    """Create an empty directory that only this download will write into"""
+    stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    path = os.path.join(base_dir, "jobs", f"{company_name}_{kind}_{stamp}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def set_download_dir(driver, path):
+    """Point the browser's downloads at path (applies to downloads started after this call)"""
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": os.path.abspath(path)})
+
+class DownloadWatcher:
+    """Waits for the next file to finish downloading into a directory.
+
+    Uses inotify to wake up as soon as the browser renames the partial file to its final name, and falls back to
+    polling the directory where inotify is not available.
+    """
+
+    def __init__(self, directory, name=None):
+        self.directory = directory
+        self.name = name or os.path.basename(directory)
+        self._existing = set(os.listdir(directory))
+        self._started = time.time()
+        self._inotify = None
+        if INotify is not None:
+            self._inotify = INotify()
+            self._inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+
+    def _completed_file(self):
+        names = set(os.listdir(self.directory)) - self._existing
+        partial = {n for n in names if n.endswith(PARTIAL_SUFFIXES)}
+        for name in sorted(names - partial):
+            # Chrome keeps "<name>.crdownload" around until the download is complete
+            if not any(p.startswith(name) for p in partial):
+                return os.path.join(self.directory, name)
+        return None
+
+    def wait(self, timeout=60):
+        """Return the path of the completed download, or raise TimeoutError"""
+        deadline = self._started + timeout
+        while True:
+            path = self._completed_file()
+            if path:
+                self._record(path)
+                return path
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"No download completed in {self.directory} within {timeout}s")
+            if self._inotify is not None:
+                self._inotify.read(timeout=int(min(remaining, 1) * 1000))
+            else:
+                time.sleep(POLL_INTERVAL)
+
+    def _record(self, path):
+        with _stats_lock:
+            download_stats.append({
+                "name": self.name,
+                "file": os.path.basename(path),
+                "bytes": os.path.getsize(path),
+                "latency": round(time.time() - self._started, 3),
+            })
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def download_file(driver, click, base_dir, company_name, kind, dest_path, timeout=60):
+    """Route one download into its own directory, trigger it with click(), then move the finished file to dest_path"""
+    job_dir = job_download_dir(base_dir, company_name, kind)
+    set_download_dir(driver, job_dir)
+    try:
+        with DownloadWatcher(job_dir, f"{company_name}_{kind}") as watcher:
+            click()
+            path = watcher.wait(timeout)
+        shutil.move(path, dest_path)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+    return dest_path
+
+def reset_download_stats():
+    with _stats_lock:
+        del download_stats[:]
+
+def print_download_stats():
+    with _stats_lock:
+        stats = list(download_stats)
+    if not stats:
+        return
+    total_bytes = sum(s["bytes"] for s in stats)
+    total_latency = sum(s["latency"] for s in stats)
+    print(f"Downloads: {len(stats)} files, {total_bytes / 1024:.0f} KiB, "
+          f"avg latency {total_latency / len(stats):.2f}s, max {max(s['latency'] for s in stats):.2f}s")
@@ -1,21 +1,24 @@
 from flask import Flask, render_template, request
-import pickle
-import joblib
+import os
+import sys
 import numpy as np
-import tensorflow as tf
 from auto_fill_nse import get_latest_nse_data
 import requests
 from bs4 import BeautifulSoup
 
-app = Flask(__name__)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(APP_DIR))  # model_registry lives at the repository root
+import model_registry
 
-# Load announcement model (ready)
-model_bundle = joblib.load(r"D:\Downloads\finAssist_webpage\announcements_nlp_model.pkl")
-announcement_model = model_bundle["model"]
-vectorizer = model_bundle["vectorizer"]
+app = Flask(__name__)
 
-# Load the Keras model for price prediction
-price_model = tf.keras.models.load_model(r"D:\Downloads\finAssist_webpage\TATASTEEL_model (1).h5")
+# Models come from the shared registry: loaded once, kept in memory and swapped when a new version is published.
+# The files shipped next to the app are only used to seed an empty registry.
+model_registry.ensure_published(model_registry.ANNOUNCEMENT_MODEL, os.path.join(APP_DIR, "announcements_nlp_model.pkl"))
+model_registry.ensure_published(model_registry.PRICE_MODEL, os.path.join(APP_DIR, "TATASTEEL_model (1).h5"), file_format="keras")
+model_registry.get_model(model_registry.ANNOUNCEMENT_MODEL)
+model_registry.get_model(model_registry.PRICE_MODEL)
+model_registry.watch_registry()
 
 @app.route("/")
 def home():
@@ -34,8 +37,9 @@ def predict_news():
         announcement = request.form.get("announcement")
 
         if announcement:
-            X = vectorizer.transform([announcement])
-            percentage_change = announcement_model.predict(X)[0]
+            announcement_bundle = model_registry.get_model(model_registry.ANNOUNCEMENT_MODEL)
+            X = announcement_bundle["vectorizer"].transform([announcement])
+            percentage_change = announcement_bundle["model"].predict(X)[0]
             if percentage_change > 0:
                 prediction = f"The stock is likely to increase by {percentage_change:.2f}%."
             else:
@@ -78,7 +82,7 @@ def predict_price():
                 float(request.form['no_of_trades']),
             ]
             input_array = np.array([features])
-            pred = price_model.predict(input_array)
+            pred = model_registry.get_model(model_registry.PRICE_MODEL)["model"].predict(input_array)
             closing_price = round(pred[0][0], 2)
         except Exception as e:
             closing_price = f"Error: {e}"
@@ -1,27 +1,42 @@
-import time
-import undetected_chromedriver as uc
+import os
+import sys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-def get_latest_nse_data(stock_name):
-    options = uc.ChromeOptions()
-    options.add_argument("--start-maximized")
-    driver = uc.Chrome(options=options)
+# Shared scraper helpers live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_readiness import wait_for, document_ready, clickable, rows_present, HISTORICAL_ROWS
+from dom_extract import extract_table
+from browser_factory import create_browser, quit_browser, warm_browser, profile_path, record_page
 
-    wait = WebDriverWait(driver, 20)
+def _equity_suggestion_listed(driver):
+    """The autocomplete list has finished loading an "in equity" suggestion"""
+    return any("in equity" in s.text for s in driver.find_elements(By.CSS_SELECTOR, ".autocompleteList"))
+
+def get_latest_nse_data(stock_name, keep_warm=True):
+    """Latest historical row for stock_name; with keep_warm the same browser is reused across calls"""
+    if keep_warm:
+        with warm_browser("finassist") as driver:
+            return _latest_nse_data(driver, stock_name)
+    driver = create_browser(profile_dir=profile_path("finassist_cold"))
+    try:
+        return _latest_nse_data(driver, stock_name)
+    finally:
+        quit_browser(driver)
+
+def _latest_nse_data(driver, stock_name):
     driver.get("https://www.nseindia.com/")
-    time.sleep(5)
+    wait_for(driver, document_ready(), "home_page_ready", required=False)
 
     # Wait for and type into the search input
-    search_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'input[placeholder="Search by Company name, Symbol or keyword... "]')))
+    search_input = wait_for(driver, EC.presence_of_element_located((By.CSS_SELECTOR, 'input[placeholder="Search by Company name, Symbol or keyword... "]')), "search_input")
     search_input.clear()
     search_input.send_keys(stock_name)
-    time.sleep(7)
 
     # Click the autocomplete suggestion with "in equity"
-    suggestions = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".autocompleteList")))
+    wait_for(driver, _equity_suggestion_listed, "search_suggestions", required=False)
+    suggestions = wait_for(driver, EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".autocompleteList")), "search_suggestions")
     for suggestion in suggestions:
         try:
             if "in equity" in suggestion.text:
@@ -29,34 +44,29 @@ def get_latest_nse_data(stock_name):
                 break
         except Exception as e:
             continue
-    time.sleep(5)
 
     # Click the 'Historical Data' tab
-    historical_tab = wait.until(EC.element_to_be_clickable((By.ID, "loadHistoricalData")))
+    historical_tab = wait_for(driver, clickable((By.ID, "loadHistoricalData")), "historical_tab")
     historical_tab.click()
-    time.sleep(5)
 
     # Wait for the historical data table to load
-    table = wait.until(EC.presence_of_element_located((By.ID, "equityHistoricalTable")))
+    wait_for(driver, rows_present(HISTORICAL_ROWS), "historical_table", required=False)
 
     # Extract the latest row (first row in tbody)
-    rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
+    rows = extract_table(driver, HISTORICAL_ROWS)
+    record_page(driver, f"finassist:{stock_name}")
     if not rows:
         print("❌ No data rows found in historical table.")
-        driver.quit()
         return None
 
-    latest_row = rows[0]
-    cols = latest_row.find_elements(By.TAG_NAME, "td")
+    cols = rows[0]
     
     # Columns 3 to 14 (index 2 to 13)
     if len(cols) < 14:
         print("❌ Not enough columns found.")
-        driver.quit()
         return None
 
-    extracted_data = [float(cols[i].text.replace(",", "")) for i in range(2, 14)]
-    driver.quit()
+    extracted_data = [float(cols[i].replace(",", "")) for i in range(2, 14)]
 
     # Return values as a dictionary matching your form inputs
     field_names = [
@@ -4,6 +4,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from pymongo import MongoClient
+from typed_schema import typed_document
+from mongo_writer import MARKET_DB, symbol_document
 
 # MongoDB Setup
 client = MongoClient("mongodb://localhost:27017/")
@@ -50,7 +52,7 @@ def scrape_nse_historical_data():
     rows = driver.find_elements(By.XPATH, "//table[@id='equityHistoricalTable']//tbody/tr")
     
     # Connect to MongoDB
-    db = client[company_name]
+    db = client[MARKET_DB]
     historical_collection = db["historical_data"]
 
     for row in rows:
@@ -75,6 +77,7 @@ def scrape_nse_historical_data():
             }
             
             # Insert or update if entry exists
+            entry = symbol_document(company_name, typed_document("historical_data", entry))
             historical_collection.update_one({"_id": entry["_id"]}, {"$set": entry}, upsert=True)
 
     print(f"Scraped and stored historical data for {company_name} in MongoDB.")
@@ -155,16 +158,19 @@ def scrape_nse_historical_data():
             if "..." in announcement_text and not cols[1].find_elements(By.CLASS_NAME, "readMore"):
                 continue
 
-            announcements_data_list.append({
+            announcements_data_list.append(typed_document("announcements", {
                 "Subject": subject,
                 "Announcement": announcement_text,
                 "Broadcast Date/Time": broadcast_time
-            })
+            }, company_name))
 
     # Store announcements data in MongoDB
     announcements_collection = db["announcements"]
     if announcements_data_list:
-        announcements_collection.insert_many(announcements_data_list)
+        # Content-hash _ids: announcements that are already stored are left untouched
+        for announcement in announcements_data_list:
+            announcement = symbol_document(company_name, announcement)
+            announcements_collection.update_one({"_id": announcement["_id"]}, {"$setOnInsert": announcement}, upsert=True)
         print(f"Scraped and stored announcements data for {company_name} in MongoDB.")
     else:
         print(f"No announcements data found for {company_name}.")
@@ -0,0 +1,150 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDRegressor
+
+from announcement_dataset import DATASET_CACHE_DIR, build_dataset, cache_path, holdout_mask, iter_companies, update_cache
+from announcements_nlp_model import evaluate_model, save_model, train_model
+from model_registry import (
+    ANNOUNCEMENT_MODEL, ANNOUNCEMENT_ONLINE_MODEL, current_version, list_versions, load_version, publish,
+    version_manifest,
+)
+
+# Hashed text features: the vectorizer is stateless, so new words never force a refit
+HASH_FEATURES = int(os.environ.get("NSE_ONLINE_HASH_FEATURES", str(2 ** 20)))
+
+# Labelled announcements per partial_fit call
+BATCH_SIZE = int(os.environ.get("NSE_ONLINE_BATCH_SIZE", "10000"))
+
+def make_online_bundle():
+    return {
+        "vectorizer": HashingVectorizer(n_features=HASH_FEATURES, alternate_sign=False, dtype=np.float32),
+        "model": SGDRegressor(penalty="l2", alpha=1e-5, random_state=42),
+    }
+
+def load_online_state():
+    """(bundle, metadata) of the current incremental model, or a fresh bundle and empty metadata"""
+    version = current_version(ANNOUNCEMENT_ONLINE_MODEL)
+    if version is None:
+        return make_online_bundle(), {}
+    metadata = version_manifest(ANNOUNCEMENT_ONLINE_MODEL, version)["metadata"]
+    # A private copy: memory-mapped coefficients are read-only and partial_fit updates them in place
+    return load_version(ANNOUNCEMENT_ONLINE_MODEL, version, mmap=False), metadata
+
+def last_full_refit_metrics():
+    """Holdout metrics recorded by the newest full refit of the served model, or None"""
+    for version in reversed(list_versions(ANNOUNCEMENT_MODEL)):
+        metadata = version_manifest(ANNOUNCEMENT_MODEL, version).get("metadata", {})
+        if metadata.get("mode") == "full_refit" and "r2" in metadata:
+            return {"r2": metadata["r2"], "rmse": metadata["rmse"], "version": version}
+    return None
+
+def _mini_batches(frames, size):
+    pending, count = [], 0
+    for frame in frames:
+        pending.append(frame)
+        count += len(frame)
+        while count >= size:
+            rows = pd.concat(pending, ignore_index=True)
+            yield rows.iloc[:size]
+            pending, count = [rows.iloc[size:]], len(rows) - size
+    if count:
+        yield pd.concat(pending, ignore_index=True)
+
+def holdout_sums(bundle, frame):
+    """[rows, sum of y, sum of y squared, sum of squared errors] of a bundle on one company's held-out rows"""
+    test = frame[holdout_mask(frame)]
+    if test.empty:
+        return [0, 0.0, 0.0, 0.0]
+    y_true = test["percentage_change"].values.astype(float)
+    y_pred = bundle["model"].predict(bundle["vectorizer"].transform(test["text"]))
+    return [len(test), float(y_true.sum()), float((y_true ** 2).sum()), float(((y_true - y_pred) ** 2).sum())]
+
+def evaluate_holdout(bundle, companies, rescore, stored=None, cache_dir=DATASET_CACHE_DIR):
+    """Holdout metrics over companies from per-company sums: the companies in rescore (and any without stored sums)
+    are predicted again, the rest keep the sums stored when they last changed. Returns (metrics, sums by company)"""
+    stored = stored or {}
+    sums = {c: stored[c] for c in companies if c in stored and c not in rescore}
+    for company, frame in iter_companies([c for c in companies if c not in sums], cache_dir):
+        sums[company] = holdout_sums(bundle, frame)
+    n, sum_y, sum_y2, sse = (float(sum(column)) for column in zip(*sums.values())) if sums else (0.0,) * 4
+    if not n:
+        raise ValueError("No held-out announcements to score")
+    sst = sum_y2 - sum_y ** 2 / n
+    return {"r2": 1 - sse / sst if sst else 0.0, "rmse": float(np.sqrt(sse / n))}, sums
+
+def train_incremental(symbols=None, cache_dir=DATASET_CACHE_DIR, batch_size=BATCH_SIZE, refit=False, promote=False):
+    """Update the incremental model with the announcements labelled since its last run and publish it.
+
+    Only companies whose cached frame changed are read, and only their rows with a label closing after the
+    company's watermark (the newest next_date already trained on) are fitted. Only their held-out rows are scored
+    too; the other companies count with the holdout sums stored in the last run (a refit rescores every company).
+    Returns the holdout report, or None if there was nothing new.
+    """
+    started = time.time()
+    companies = update_cache(symbols, cache_dir)
+    bundle, metadata = load_online_state()
+    trained_through = metadata.get("trained_through", {})
+    cache_mtimes = metadata.get("cache_mtimes", {})
+    watermarks, mtimes = dict(trained_through), dict(cache_mtimes)
+
+    changed = [c for c in companies if os.stat(cache_path(c, cache_dir)).st_mtime_ns != cache_mtimes.get(c)]
+
+    def _new_rows():
+        for company, frame in iter_companies(changed, cache_dir):
+            mtimes[company] = os.stat(cache_path(company, cache_dir)).st_mtime_ns
+            since = trained_through.get(company)
+            fresh = frame if since is None else frame[frame["next_date"] > pd.Timestamp(since)]
+            if fresh.empty:
+                continue
+            watermarks[company] = fresh["next_date"].max().isoformat()
+            yield fresh[~holdout_mask(fresh)]
+
+    trained = 0
+    for batch in _mini_batches(_new_rows(), batch_size):
+        bundle["model"].partial_fit(bundle["vectorizer"].transform(batch["text"]), batch["percentage_change"].values)
+        trained += len(batch)
+    print(f"Incremental fit: {trained:,} new announcements from {len(changed)} changed companies "
+          f"in {time.time() - started:.2f}s")
+    if not trained:
+        print("Nothing new to train on; the published model is unchanged.")
+        return None
+
+    online, holdout = evaluate_holdout(bundle, companies, companies if refit else changed,
+                                       metadata.get("holdout"), cache_dir)
+    report = {"incremental": online}
+    if refit:
+        dataset = build_dataset(symbols, cache_dir)
+        vectorizer, model, X_test, y_test = train_model(dataset)
+        report["full_refit"] = evaluate_model(model, X_test, y_test, plot=False)
+        save_model(model, vectorizer, mode="full_refit", rows=len(dataset), **report["full_refit"])
+    else:
+        report["full_refit"] = last_full_refit_metrics()
+
+    full = report["full_refit"]
+    if full is None:
+        print(f"Holdout R2 {online['r2']:.4f}, RMSE {online['rmse']:.4f} (no full refit to compare with; run with --refit)")
+    else:
+        report["delta"] = {"r2": online["r2"] - full["r2"], "rmse": online["rmse"] - full["rmse"]}
+        print(f"Holdout R2 {online['r2']:.4f} vs full refit {full['r2']:.4f} ({report['delta']['r2']:+.4f}), "
+              f"RMSE {online['rmse']:.4f} vs {full['rmse']:.4f} ({report['delta']['rmse']:+.4f})")
+
+    rows = metadata.get("rows", 0) + trained
+    publish(ANNOUNCEMENT_ONLINE_MODEL, bundle, mode="incremental", rows=rows, trained_through=watermarks,
+            cache_mtimes=mtimes, holdout=holdout, **online)
+    if promote:
+        # Serve the incremental model in place of the full refit
+        publish(ANNOUNCEMENT_MODEL, bundle, mode="incremental", rows=rows, **online)
+    return report
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Train the announcement model on newly labelled announcements only")
+    arg_parser.add_argument("symbols", nargs="*", help="companies to train on (default: every one in the columnar cache)")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    arg_parser.add_argument("--refit", action="store_true", help="also run (and publish) a full refit to compare with")
+    arg_parser.add_argument("--promote", action="store_true", help="serve the incremental model from now on")
+    args = arg_parser.parse_args()
+    train_incremental(args.symbols or None, batch_size=args.batch_size, refit=args.refit, promote=args.promote)
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import datetime
+import io
+import os
+import socket
+import threading
+import time
+import requests
+from pymongo import MongoClient, ReturnDocument
+
+from CompleteDataScraping_withPreprocessing import create_driver, scrape_symbol, writer, NSE_BASE_URL
+from page_readiness import wait_for, document_ready, print_step_timings
+from scraper_pool import worker_directories
+from download_manager import print_download_stats
+from browser_factory import print_browser_stats
+from run_metrics import begin_run_metrics, write_run_report
+from scrape_checkpoints import STATE_DB
+
+# MongoDB Setup
+client = MongoClient("mongodb://localhost:27017/")
+
+# One document per symbol: {_id: symbol, status, attempts, lease_owner, lease_expires, available_at, last_error, ...}
+# status is "pending", "leased", "done" or "dead" (gave up after MAX_ATTEMPTS)
+jobs = client[STATE_DB]["jobs"]
+
+# Every listed equity, one symbol per row
+EQUITY_LIST_URL = "https://archives.nseindia.com/content/equities/EQUITY_L.csv"
+
+HOME_URL = NSE_BASE_URL + "/"
+
+# A lease not renewed for this long is considered abandoned and the job is handed to another worker
+LEASE_SECONDS = 300
+
+# Workers renew their lease this often while a job is running
+HEARTBEAT_SECONDS = 60
+
+# Failed jobs are retried with exponential backoff and moved to "dead" after this many attempts
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 120
+
+# How long an idle worker waits before polling an empty queue again (with --forever)
+IDLE_POLL_SECONDS = 30
+
+def ensure_indexes():
+    jobs.create_index([("status", 1), ("available_at", 1)])
+    jobs.create_index([("status", 1), ("lease_expires", 1)])
+
+# --- Producer -----------------------------------------------------------------
+
+def list_all_symbols():
+    """Symbols of every listed equity, from NSE's equity master list"""
+    response = requests.get(EQUITY_LIST_URL, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+    response.raise_for_status()
+    reader = csv.DictReader(io.StringIO(response.text))
+    return [row["SYMBOL"].strip() for row in reader if row.get("SYMBOL")]
+
+def enqueue(symbols, reset=False):
+    """Add a pending job per symbol. Existing jobs are left alone unless reset is True (e.g. for the next daily run)."""
+    now = datetime.datetime.now()
+    added = 0
+    for symbol in symbols:
+        if reset:
+            result = jobs.update_one(
+                {"_id": symbol, "status": {"$ne": "leased"}},
+                {"$set": {"status": "pending", "attempts": 0, "available_at": now, "last_error": None, "updated_at": now},
+                 "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+        else:
+            result = jobs.update_one(
+                {"_id": symbol},
+                {"$setOnInsert": {"status": "pending", "attempts": 0, "available_at": now, "created_at": now, "updated_at": now}},
+                upsert=True
+            )
+        added += 1 if (result.upserted_id is not None or result.modified_count) else 0
+    print(f"Queued {added} of {len(symbols)} symbols.")
+    return added
+
+def produce(reset=False):
+    ensure_indexes()
+    return enqueue(list_all_symbols(), reset=reset)
+
+# --- Leasing ------------------------------------------------------------------
+
+def lease_job(owner):
+    """Atomically claim the next available job (or one whose lease has expired) for owner"""
+    now = datetime.datetime.now()
+    return jobs.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "leased", "lease_expires": {"$lt": now}},
+        ]},
+        {"$set": {"status": "leased", "lease_owner": owner, "leased_at": now,
+                  "lease_expires": now + datetime.timedelta(seconds=LEASE_SECONDS), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def heartbeat(job_id, owner):
+    """Extend the lease; returns False if another worker has taken the job over"""
+    now = datetime.datetime.now()
+    result = jobs.update_one(
+        {"_id": job_id, "status": "leased", "lease_owner": owner},
+        {"$set": {"lease_expires": now + datetime.timedelta(seconds=LEASE_SECONDS), "updated_at": now}}
+    )
+    return result.matched_count == 1
+
+def complete_job(job_id, owner):
+    now = datetime.datetime.now()
+    jobs.update_one(
+        {"_id": job_id, "lease_owner": owner},
+        {"$set": {"status": "done", "finished_at": now, "updated_at": now, "last_error": None},
+         "$unset": {"lease_expires": ""}}
+    )
+
+def fail_job(job, owner, error):
+    """Put the job back with backoff, or dead-letter it once it has used up its attempts"""
+    now = datetime.datetime.now()
+    if job.get("attempts", 0) >= MAX_ATTEMPTS:
+        update = {"status": "dead", "dead_at": now}
+    else:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** (job.get("attempts", 1) - 1)
+        update = {"status": "pending", "available_at": now + datetime.timedelta(seconds=delay)}
+    update.update({"last_error": str(error)[:1000], "updated_at": now})
+    jobs.update_one({"_id": job["_id"], "lease_owner": owner}, {"$set": update, "$unset": {"lease_expires": ""}})
+
+def requeue_dead():
+    """Give dead-lettered jobs another full set of attempts"""
+    now = datetime.datetime.now()
+    result = jobs.update_many({"status": "dead"}, {"$set": {"status": "pending", "attempts": 0, "available_at": now, "updated_at": now}})
+    print(f"Requeued {result.modified_count} dead jobs.")
+
+def queue_status():
+    counts = {row["_id"]: row["count"] for row in jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+    for status in ["pending", "leased", "done", "dead"]:
+        print(f"{status:<8} {counts.get(status, 0)}")
+    return counts
+
+# --- Worker -------------------------------------------------------------------
+
+class _Heartbeat:
+    """Renews a job's lease in the background while the scrape runs"""
+
+    def __init__(self, job_id, owner):
+        self.job_id = job_id
+        self.owner = owner
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            if not heartbeat(self.job_id, self.owner):
+                self.lost = True
+                print(f"[{self.owner}] Lost lease on {self.job_id}")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+def _start_driver(download_dir, profile_dir):
+    driver = create_driver(download_dir, profile_dir)
+    driver.get(HOME_URL)
+    wait_for(driver, document_ready(), "home_page_ready", required=False)
+    return driver
+
+def run_worker(worker_id=0, forever=False, max_jobs=None):
+    """Lease and scrape jobs until the queue is empty (or indefinitely with forever=True)"""
+    owner = f"{socket.gethostname()}:{os.getpid()}:{worker_id}"
+    download_dir, profile_dir = worker_directories(f"{socket.gethostname()}_{worker_id}")
+    driver = None
+    processed = 0
+    begin_run_metrics(f"job_queue_worker_{worker_id}")
+
+    while max_jobs is None or processed < max_jobs:
+        job = lease_job(owner)
+        if job is None:
+            if not forever:
+                break
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        symbol = job["_id"]
+        processed += 1
+
+        # Workers that died mid-job never call fail_job, so expired leases count against the attempts too
+        if job["attempts"] > MAX_ATTEMPTS:
+            fail_job(job, owner, job.get("last_error") or "lease expired too many times")
+            continue
+        try:
+            if driver is None:
+                driver = _start_driver(download_dir, profile_dir)
+            main_tab = driver.current_window_handle
+
+            with _Heartbeat(symbol, owner) as beat:
+                company_name = scrape_symbol(driver, symbol, main_tab, download_dir)
+
+            if beat.lost:
+                continue
+            if company_name:
+                complete_job(symbol, owner)
+            else:
+                fail_job(job, owner, "scrape_symbol did not complete")
+        except Exception as e:
+            print(f"[{owner}] Error processing {symbol}:", str(e))
+            fail_job(job, owner, e)
+            # A crashed browser would fail every following job, so start a fresh one
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            driver = None
+
+    if driver is not None:
+        driver.quit()
+    writer.flush()
+    print(f"[{owner}] Processed {processed} jobs.")
+    writer.report()
+    print_step_timings()
+    print_download_stats()
+    print_browser_stats()
+    write_run_report(writer)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Mongo-backed job queue for full-universe NSE scraping")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    produce_cmd = commands.add_parser("produce", help="queue every listed equity")
+    produce_cmd.add_argument("--reset", action="store_true", help="re-queue symbols that are already done")
+    worker_cmd = commands.add_parser("worker", help="lease and scrape jobs")
+    worker_cmd.add_argument("--id", type=int, default=0)
+    worker_cmd.add_argument("--forever", action="store_true", help="keep polling when the queue is empty")
+    worker_cmd.add_argument("--max-jobs", type=int, default=None)
+    commands.add_parser("status", help="count jobs by status")
+    commands.add_parser("requeue-dead", help="retry dead-lettered jobs")
+    args = arg_parser.parse_args()
+
+    if args.command == "produce":
+        produce(reset=args.reset)
+    elif args.command == "worker":
+        run_worker(args.id, forever=args.forever, max_jobs=args.max_jobs)
+    elif args.command == "status":
+        queue_status()
+    elif args.command == "requeue-dead":
+        requeue_dead()
@@ -0,0 +1,170 @@
+import datetime
+import sys
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+
+try:
+    from pymongoarrow.api import Schema, find_numpy_all
+except ImportError:  # pymongoarrow not installed: columns are built from the cursor instead
+    find_numpy_all = None
+
+from mongo_writer import (
+    MARKET_DB, DATE_FIELDS, INSERT_ONLY_COLLECTIONS, HISTORICAL_BACKEND, BARS_COLLECTION, BulkWriter,
+    ensure_indexes, symbol_document,
+)
+from typed_schema import SCHEMAS, SYSTEM_DATABASES, typed_document, to_datetime
+
+# MongoDB Setup
+client = MongoClient("mongodb://localhost:27017/")
+market_db = client[MARKET_DB]
+
+MIGRATION_BATCH_SIZE = 1000
+
+# Dates given as strings are tried as "2026-10-01" first, then as NSE prints them
+ISO_DATE = "%Y-%m-%d"
+
+# Numeric columns of a historical bar
+BAR_FLOAT_FIELDS = SCHEMAS["historical_data"]["float"]
+BAR_INT_FIELDS = SCHEMAS["historical_data"]["int"]
+
+# Documents pulled per round trip by the column reader
+READ_BATCH_SIZE = 10000
+
+# --- Reading ------------------------------------------------------------------
+
+def _stored_collection(collection_name, db=None):
+    """The collection that actually holds collection_name under the configured historical backend"""
+    db = db if db is not None else market_db
+    if collection_name == "historical_data" and HISTORICAL_BACKEND == "timeseries":
+        return db[BARS_COLLECTION]
+    return db[collection_name]
+
+def _date_range(field, start, end):
+    query = {}
+    if start is not None:
+        query["$gte"] = to_datetime(start, ISO_DATE)
+    if end is not None:
+        query["$lte"] = to_datetime(end, ISO_DATE)
+    return {field: query} if query else {}
+
+def _frame(cursor, collection_name):
+    frame = pd.DataFrame(list(cursor))
+    for field in SCHEMAS.get(collection_name, {}).get("int", []):
+        if field in frame.columns:
+            frame[field] = frame[field].astype("Int64")
+    return frame
+
+def load_symbol(symbol, collection_name="historical_data", start=None, end=None, db=None):
+    """One company's documents between start and end (inclusive) as a DataFrame in time order"""
+    field = DATE_FIELDS[collection_name]
+    query = {"symbol": symbol, **_date_range(field, start, end)}
+    collection = _stored_collection(collection_name, db)
+    return _frame(collection.find(query, {"_id": 0}).sort(field, 1), collection_name)
+
+def load_historical(symbol, start=None, end=None, db=None):
+    """Typed historical rows for symbol as a DataFrame sorted by Date (no string cleaning needed)"""
+    return load_symbol(symbol, "historical_data", start, end, db)
+
+def cross_section(day, collection_name="historical_data", symbols=None, db=None):
+    """Every company's documents on one calendar day, in a single query on the (time, symbol) index"""
+    field = DATE_FIELDS[collection_name]
+    start = to_datetime(day, ISO_DATE).replace(hour=0, minute=0, second=0, microsecond=0)
+    query = {field: {"$gte": start, "$lt": start + datetime.timedelta(days=1)}}
+    if symbols is not None:
+        query["symbol"] = {"$in": list(symbols)}
+    collection = _stored_collection(collection_name, db)
+    return _frame(collection.find(query, {"_id": 0}).sort([(field, 1), ("symbol", 1)]), collection_name)
+
+def read_bars(symbol, start=None, end=None, fields=None, db=None):
+    """One symbol's bars between start and end as {"Date": datetime64[ms] array, field: array, ...} in date order.
+
+    Floats are float64 with NaN for missing values; int fields are int64, or float64 if any value is missing.
+    """
+    fields = list(fields) if fields is not None else BAR_FLOAT_FIELDS + BAR_INT_FIELDS
+    collection = _stored_collection("historical_data", db)
+    query = {"symbol": symbol, **_date_range("Date", start, end)}
+    projection = {"_id": 0, "Date": 1, **{field: 1 for field in fields}}
+
+    if find_numpy_all is not None:
+        schema = Schema({"Date": datetime.datetime, **{f: (int if f in BAR_INT_FIELDS else float) for f in fields}})
+        return find_numpy_all(collection, query, schema=schema, projection=projection, sort=[("Date", 1)])
+
+    names = ["Date"] + fields
+    values = {name: [] for name in names}
+    for doc in collection.find(query, projection).sort("Date", 1).batch_size(READ_BATCH_SIZE):
+        for name in names:
+            values[name].append(doc.get(name))
+
+    columns = {"Date": np.array(values["Date"], dtype="datetime64[ms]")}
+    for field in fields:
+        column = values[field]
+        if field in BAR_INT_FIELDS and None not in column:
+            columns[field] = np.array(column, dtype=np.int64)
+        else:
+            columns[field] = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+    return columns
+
+def read_bars_frame(symbol, start=None, end=None, fields=None, db=None):
+    """read_bars as a DataFrame indexed by Date"""
+    return pd.DataFrame(read_bars(symbol, start, end, fields, db)).set_index("Date")
+
+# --- One-shot migration from one database per company -------------------------
+
+def consolidate_symbol(symbol, drop=False):
+    """Copy (and type) every collection of the old <symbol> database into MARKET_DB; returns documents copied"""
+    source = client[symbol]
+    scraped_collections = set(source.list_collection_names()) & set(DATE_FIELDS)
+    copied = 0
+    for collection_name in scraped_collections:
+        target = market_db[collection_name]
+        update = "$setOnInsert" if collection_name in INSERT_ONLY_COLLECTIONS else "$set"
+        ops = []
+        for doc in source[collection_name].find():
+            doc = symbol_document(symbol, typed_document(collection_name, doc, symbol))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {update: doc}, upsert=True))
+            if len(ops) >= MIGRATION_BATCH_SIZE:
+                target.bulk_write(ops, ordered=False)
+                copied += len(ops)
+                ops = []
+        if ops:
+            target.bulk_write(ops, ordered=False)
+            copied += len(ops)
+
+    if drop:
+        # Only drop a scraper database, and only once every document is present in the new layout
+        other_collections = set(source.list_collection_names()) - scraped_collections
+        if not scraped_collections or other_collections:
+            print(f"Not dropping {symbol}: it is not a scraped company database "
+                  f"(collections: {sorted(source.list_collection_names())})")
+            return copied
+        for collection_name in scraped_collections:
+            if market_db[collection_name].count_documents({"symbol": symbol}) < source[collection_name].estimated_document_count():
+                print(f"Not dropping {symbol}: {collection_name} was not fully copied")
+                return copied
+        client.drop_database(symbol)
+    return copied
+
+def copy_to_bars(symbols=None, db=None):
+    """Copy historical_data (all symbols, or just the given ones) into the time-series BARS_COLLECTION"""
+    db = db if db is not None else market_db
+    query = {"symbol": {"$in": list(symbols)}} if symbols else {}
+    with BulkWriter(db.client, background=False, db_name=db.name, historical_backend="timeseries") as writer:
+        for doc in db["historical_data"].find(query).batch_size(READ_BATCH_SIZE):
+            writer.upsert(doc["symbol"], "historical_data", dict(doc, _id=doc["_id"]["key"]))
+    writer.report()
+
+def consolidate_all(symbols=None, drop=False):
+    """Move every per-company database (or just the given symbols) into MARKET_DB"""
+    ensure_indexes(market_db)
+    symbols = symbols or [name for name in client.list_database_names() if name not in SYSTEM_DATABASES]
+    for symbol in symbols:
+        print(f"{symbol}: {consolidate_symbol(symbol, drop)} documents moved to {MARKET_DB}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--bars" in args:
+        copy_to_bars([a for a in args if a != "--bars"] or None)
+    else:
+        drop_old = "--drop" in args
+        consolidate_all([a for a in args if a != "--drop"] or None, drop=drop_old)
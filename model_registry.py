@@ -0,0 +1,178 @@
+import datetime
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import joblib
+
+# <REGISTRY_DIR>/<name>/<version>/ holds one file per artifact plus manifest.json; <name>/CURRENT names the version
+# that is served. Publishing writes a new version directory and then swaps CURRENT, so readers never see half a model
+REGISTRY_DIR = os.environ.get("NSE_MODEL_REGISTRY", os.path.join(os.path.expanduser("~"), ".nse_scraper", "models"))
+
+# Registered models
+ANNOUNCEMENT_MODEL = "announcement_effect"                # {"model": regressor, "vectorizer": text vectorizer}
+ANNOUNCEMENT_ONLINE_MODEL = "announcement_effect_online"  # the same, trained incrementally (incremental_training)
+PRICE_MODEL = "tatasteel_price"                           # {"model": Keras model}
+
+# How often watch_registry looks for newly published versions
+RELOAD_SECONDS = int(os.environ.get("NSE_MODEL_RELOAD_SECONDS", "30"))
+
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+
+# name -> {"version", "artifacts"}; swapped whole on reload so a prediction always sees one consistent version
+_loaded = {}
+_load_lock = threading.Lock()
+_watcher = {"thread": None}
+
+def _model_dir(name):
+    return os.path.join(REGISTRY_DIR, name)
+
+def current_version(name):
+    """The published version of name, or None if nothing has been published"""
+    path = os.path.join(_model_dir(name), CURRENT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+def list_versions(name):
+    directory = _model_dir(name)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(v for v in os.listdir(directory) if os.path.exists(os.path.join(directory, v, MANIFEST_NAME)))
+
+def set_current(name, version):
+    """Serve version of name from now on (also how to roll back)"""
+    if version not in list_versions(name):
+        raise ValueError(f"{name} has no version {version}")
+    path = os.path.join(_model_dir(name), CURRENT_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(path + ".tmp", path)
+
+# --- Publishing ---------------------------------------------------------------
+
+def _new_version():
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+def _publish_dir(name, write, manifest, version=None):
+    version = version or _new_version()
+    staging = os.path.join(_model_dir(name), f".{version}.tmp")
+    os.makedirs(staging, exist_ok=True)
+    manifest["artifacts"] = write(staging)
+    manifest["published_at"] = datetime.datetime.now().isoformat()
+    with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(staging, os.path.join(_model_dir(name), version))
+    set_current(name, version)
+    print(f"Published {name} version {version}")
+    return version
+
+def publish(name, artifacts, version=None, **metadata):
+    """Store a dict of picklable artifacts as a new version of name and make it current; returns the version.
+
+    Artifacts are written uncompressed so their numpy arrays can be memory-mapped when loaded.
+    """
+    def _write(directory):
+        files = {}
+        for artifact, obj in artifacts.items():
+            files[artifact] = {"file": f"{artifact}.joblib", "format": "joblib"}
+            joblib.dump(obj, os.path.join(directory, files[artifact]["file"]))
+        return files
+    return _publish_dir(name, _write, {"metadata": metadata}, version)
+
+def publish_file(name, path, artifact="model", file_format="joblib", version=None, **metadata):
+    """Publish an existing model file: a joblib/pickle file (a dict of artifacts is split up) or a Keras .h5"""
+    if file_format == "joblib":
+        obj = joblib.load(path)
+        return publish(name, obj if isinstance(obj, dict) else {artifact: obj}, version, source=path, **metadata)
+
+    def _write(directory):
+        filename = artifact + os.path.splitext(path)[1]
+        shutil.copy2(path, os.path.join(directory, filename))
+        return {artifact: {"file": filename, "format": file_format}}
+    return _publish_dir(name, _write, {"metadata": dict(metadata, source=path)}, version)
+
+def ensure_published(name, path, artifact="model", file_format="joblib"):
+    """Publish path as the first version of name if nothing is published yet"""
+    if current_version(name) is None and os.path.exists(path):
+        publish_file(name, path, artifact, file_format)
+
+# --- Loading ------------------------------------------------------------------
+
+def version_manifest(name, version):
+    with open(os.path.join(_model_dir(name), version, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+def _load_artifact(path, file_format, mmap):
+    if file_format == "keras":
+        import tensorflow as tf  # only the price model needs it
+        return tf.keras.models.load_model(path)
+    # Large numpy arrays (tree nodes, coefficients) stay on disk and are paged in, shared between processes
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+def load_version(name, version, mmap=True):
+    """A version's artifacts; pass mmap=False for a copy that can be trained further (mapped arrays are read-only)"""
+    directory = os.path.join(_model_dir(name), version)
+    return {
+        artifact: _load_artifact(os.path.join(directory, entry["file"]), entry["format"], mmap)
+        for artifact, entry in version_manifest(name, version)["artifacts"].items()
+    }
+
+def get_model(name):
+    """The artifacts of name's current version, loaded on first use and kept in memory"""
+    loaded = _loaded.get(name)
+    if loaded is not None:
+        return loaded["artifacts"]
+    with _load_lock:
+        if name not in _loaded:
+            version = current_version(name)
+            if version is None:
+                raise LookupError(f"No version of {name} has been published to {REGISTRY_DIR}")
+            _loaded[name] = {"version": version, "artifacts": load_version(name, version)}
+    return _loaded[name]["artifacts"]
+
+def reload_if_published(name):
+    """Load name's current version if it is newer than the one in memory; returns True if it was swapped in"""
+    version = current_version(name)
+    loaded = _loaded.get(name)
+    if version is None or (loaded is not None and loaded["version"] == version):
+        return False
+    artifacts = load_version(name, version)
+    with _load_lock:
+        _loaded[name] = {"version": version, "artifacts": artifacts}
+    print(f"Loaded {name} version {version}")
+    return True
+
+def watch_registry(interval=RELOAD_SECONDS):
+    """Start a background thread that swaps in newly published versions of every loaded model"""
+    def _watch():
+        while True:
+            time.sleep(interval)
+            for name in list(_loaded):
+                try:
+                    reload_if_published(name)
+                except Exception as e:
+                    print(f"Failed to reload {name} (still serving {_loaded[name]['version']}):", e)
+    if _watcher["thread"] is None:
+        _watcher["thread"] = threading.Thread(target=_watch, daemon=True)
+        _watcher["thread"].start()
+    return _watcher["thread"]
+
+if __name__ == "__main__":
+    command, args = (sys.argv[1] if len(sys.argv) > 1 else "list"), sys.argv[2:]
+    if command == "list":
+        for model_name in args or sorted(os.listdir(REGISTRY_DIR) if os.path.isdir(REGISTRY_DIR) else []):
+            current = current_version(model_name)
+            for v in list_versions(model_name):
+                print(f"{model_name} {v}{' (current)' if v == current else ''}")
+    elif command == "publish":
+        # publish NAME PATH [joblib|keras]
+        publish_file(args[0], args[1], file_format=args[2] if len(args) > 2 else "joblib")
+    elif command == "use":
+        set_current(args[0], args[1])
+    else:
+        raise SystemExit("usage: python model_registry.py list [NAME...] | publish NAME PATH [joblib|keras] | use NAME VERSION")
@@ -0,0 +1,315 @@
+import datetime
+import os
+import threading
+import time
+from collections import defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+# Flush once this many upserts are buffered
+BATCH_SIZE = 1000
+
+# Flush anything that has been buffered for longer than this many seconds
+FLUSH_INTERVAL = 2.0
+
+# Recorded and replayed scrapes (nse_replay, which sets NSE_REPLAY=1) write to this database instead
+SCRATCH_MARKET_DB = "nse_replay"
+
+# Every symbol's documents live in this one database, one collection per kind, tagged with a "symbol" field
+MARKET_DB = SCRATCH_MARKET_DB if os.environ.get("NSE_REPLAY") == "1" else os.environ.get("NSE_MARKET_DB", "nse")
+
+# Field each collection is ordered by in time
+DATE_FIELDS = {
+    "historical_data": "Date",
+    "announcements": "Broadcast Date/Time",
+    "trade_information": "Scraped_At",
+    "price_information": "Scraped_At",
+    "securities_information": "Scraped_At",
+}
+
+# Where historical_data goes: "collection" (a regular collection keyed by symbol and Date) or "timeseries" (typed
+# bars in the BARS_COLLECTION time-series collection, timeField Date and metaField symbol, which MongoDB stores
+# column-compressed per symbol)
+HISTORICAL_BACKEND = os.environ.get("NSE_HISTORICAL_BACKEND", "collection")
+BARS_COLLECTION = "historical_bars"
+
+# Collections whose _id is a hash of the document's content: an _id that is already stored means the document is
+# unchanged, so it is skipped instead of rewritten
+INSERT_ONLY_COLLECTIONS = ("announcements",)
+
+def stored_id(symbol, key):
+    """_id in the consolidated layout: the document's per-company _id scoped by its symbol"""
+    return {"symbol": symbol, "key": key}
+
+def symbol_document(symbol, doc):
+    """Copy of doc as stored in MARKET_DB: with a symbol field and (if it has one) a symbol-scoped _id"""
+    doc = dict(doc, symbol=symbol)
+    if "_id" in doc:
+        doc["_id"] = stored_id(symbol, doc["_id"])
+    return doc
+
+def ensure_indexes(db, historical_backend=HISTORICAL_BACKEND):
+    """(symbol, time) for one company's history and (time, symbol) for all companies at one time.
+
+    With the timeseries backend historical_data is not written, so it gets none (see ensure_bars_collection).
+    """
+    for collection_name, field in DATE_FIELDS.items():
+        if collection_name == "historical_data" and historical_backend == "timeseries":
+            continue
+        db[collection_name].create_index([("symbol", 1), (field, -1)])
+        db[collection_name].create_index([(field, -1), ("symbol", 1)])
+
+def ensure_bars_collection(db):
+    if BARS_COLLECTION not in db.list_collection_names():
+        # Daily bars: "hours" granularity buckets up to 30 days of one symbol together
+        db.create_collection(BARS_COLLECTION, timeseries={"timeField": "Date", "metaField": "symbol", "granularity": "hours"})
+    db[BARS_COLLECTION].create_index([("symbol", 1), ("Date", 1)])
+
+def _same_bar(stored, bar):
+    """True if a re-sent bar holds the same values as the stored one (missing values compare equal)"""
+    def _value(doc, field):
+        value = doc.get(field)
+        return None if isinstance(value, float) and value != value else value
+    return all(_value(stored, field) == _value(bar, field) for field in set(stored) | set(bar))
+
+class BulkWriter:
+    """Write-behind buffer that collects upserts for any symbol/collection and flushes them as unordered bulk_writes.
+
+    Everything goes to one database (MARKET_DB) with symbol-scoped _ids, see symbol_document().
+    With historical_backend="timeseries", historical_data is written as bars into BARS_COLLECTION instead.
+    Upserts for the same symbol and _id that are still buffered are merged (last value wins), so a batch never contains two
+    operations for one document. Documents for insert_only collections whose _id is already stored are skipped.
+    Documents that fail to write are counted per symbol and collection until collected with take_failures().
+    Safe to share between threads.
+    """
+
+    def __init__(self, client, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, background=True,
+                 insert_only=INSERT_ONLY_COLLECTIONS, db_name=MARKET_DB, historical_backend=HISTORICAL_BACKEND):
+        self.client = client
+        self.db_name = db_name
+        self.historical_backend = historical_backend
+        self._indexed = False
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.insert_only = set(insert_only)
+        self._pending = {}  # collection_name -> {(symbol, per-company _id): $set document}
+        self._pending_count = 0
+        self._oldest_pending = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"ops": 0, "batches": 0, "upserted": 0, "modified": 0, "skipped": 0, "errors": 0, "write_seconds": 0.0}
+        self._failures = defaultdict(int)  # (symbol, collection_name) -> documents that failed to write
+
+        self._stop = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._flush_loop, name="bulk-writer", daemon=True)
+            self._thread.start()
+
+    def upsert(self, symbol, collection_name, doc):
+        """Queue {"$set": doc} upserted on symbol and doc["_id"]"""
+        key = (symbol, doc["_id"])
+        with self._lock:
+            docs = self._pending.setdefault(collection_name, {})
+            if key in docs:
+                docs[key].update(symbol_document(symbol, doc))
+            else:
+                docs[key] = symbol_document(symbol, doc)
+                self._pending_count += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            full = self._pending_count >= self.batch_size
+
+        if full:
+            self.flush()
+
+    def upsert_many(self, symbol, collection_name, docs):
+        for doc in docs:
+            self.upsert(symbol, collection_name, doc)
+
+    def flush(self):
+        """Write everything buffered so far; returns {(symbol, collection_name): failed documents} not yet taken"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._pending_count = 0
+            self._oldest_pending = None
+
+        with self._flush_lock:
+            if pending and not self._indexed:
+                try:
+                    ensure_indexes(self.client[self.db_name], self.historical_backend)
+                    if self.historical_backend == "timeseries":
+                        ensure_bars_collection(self.client[self.db_name])
+                    self._indexed = True
+                except PyMongoError as e:
+                    print(f"Could not create indexes in {self.db_name}:", e)
+            for collection_name, docs in pending.items():
+                if collection_name == "historical_data" and self.historical_backend == "timeseries":
+                    self._write_bars(self.client[self.db_name][BARS_COLLECTION], docs)
+                    continue
+                collection = self.client[self.db_name][collection_name]
+                if collection_name in self.insert_only:
+                    docs = self._unstored(collection, docs)
+                    update = "$setOnInsert"
+                else:
+                    update = "$set"
+                docs = list(docs.values())
+                for start in range(0, len(docs), self.batch_size):
+                    batch = docs[start:start + self.batch_size]
+                    operations = [UpdateOne({"_id": doc["_id"]}, {update: doc}, upsert=True) for doc in batch]
+                    self._write_batch(collection, operations, [doc["symbol"] for doc in batch])
+
+        with self._lock:
+            return {key: count for key, count in self._failures.items() if count}
+
+    def forget_indexes(self):
+        """Create the indexes (and the bars collection) again on the next flush, e.g. after the database was dropped"""
+        with self._flush_lock:
+            self._indexed = False
+
+    def take_failures(self, symbol, collection_name):
+        """Documents of symbol in collection_name that failed to write since the last call (and reset the count)"""
+        with self._lock:
+            return self._failures.pop((symbol, collection_name), 0)
+
+    def _record_failures(self, collection_name, symbols):
+        with self._lock:
+            for symbol in symbols:
+                self._failures[(symbol, collection_name)] += 1
+
+    def _unstored(self, collection, docs):
+        """The documents whose _id is not stored yet (written with $setOnInsert, so a race never overwrites)"""
+        ids = [doc["_id"] for doc in docs.values()]
+        stored = set()
+        try:
+            for start in range(0, len(ids), self.batch_size):
+                chunk = ids[start:start + self.batch_size]
+                stored.update((d["_id"]["symbol"], d["_id"]["key"]) for d in collection.find({"_id": {"$in": chunk}}, {"_id": 1}))
+        except PyMongoError as e:
+            print(f"Could not check stored ids in {collection.full_name}:", e)
+        self.stats["skipped"] += len(stored)
+        return {key: doc for key, doc in docs.items() if key not in stored}
+
+    def _write_bars(self, collection, docs):
+        """Replace the buffered days of each symbol in the time-series collection (which has no upserts)"""
+        by_symbol = defaultdict(list)
+        for doc in docs.values():
+            if not isinstance(doc.get("Date"), datetime.datetime):
+                # The timeField is required, so a row without a parseable date cannot be stored as a bar
+                self.stats["errors"] += 1
+                self._record_failures("historical_data", [doc["symbol"]])
+                continue
+            bar = dict(doc)
+            del bar["_id"]
+            by_symbol[bar["symbol"]].append(bar)
+
+        for symbol, bars in by_symbol.items():
+            dates = [bar["Date"] for bar in bars]
+            try:
+                collection.delete_many({"symbol": symbol, "Date": {"$in": dates}})
+            except OperationFailure:
+                # Before MongoDB 7.0 deletes may only filter on the metaField, so stored days cannot be replaced
+                bars = self._unstored_bars(collection, symbol, bars)
+            for start in range(0, len(bars), self.batch_size):
+                self._insert_batch(collection, bars[start:start + self.batch_size])
+
+    def _unstored_bars(self, collection, symbol, bars):
+        """The bars of days not stored yet, for servers that cannot delete single days. Days re-sent unchanged (the
+        last stored day always is) are skipped; changed ones cannot be replaced and are counted as failed"""
+        try:
+            query = {"symbol": symbol, "Date": {"$in": [bar["Date"] for bar in bars]}}
+            stored = {d["Date"]: d for d in collection.find(query, {"_id": 0})}
+        except PyMongoError as e:
+            self.stats["errors"] += len(bars)
+            self._record_failures("historical_data", [symbol] * len(bars))
+            print(f"Could not read stored bars of {symbol} in {collection.full_name}:", e)
+            return []
+        unstored = [bar for bar in bars if bar["Date"] not in stored]
+        changed = sum(1 for bar in bars if bar["Date"] in stored and not _same_bar(stored[bar["Date"]], bar))
+        self.stats["skipped"] += len(bars) - len(unstored) - changed
+        if changed:
+            self.stats["errors"] += changed
+            self._record_failures("historical_data", [symbol] * changed)
+            print(f"{symbol}: {changed} stored bars changed, but {collection.full_name} cannot replace them before "
+                  "MongoDB 7.0; upgrade, or use NSE_HISTORICAL_BACKEND=collection")
+        return unstored
+
+    def _insert_batch(self, collection, documents):
+        started = time.time()
+        try:
+            inserted, errors = len(collection.insert_many(documents, ordered=False).inserted_ids), 0
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            errors = len(write_errors)
+            inserted = e.details.get("nInserted", 0)
+            self._record_failures("historical_data", [documents[error["index"]]["symbol"] for error in write_errors])
+            print(f"Insert into {collection.full_name} had {errors} failed documents:", write_errors[:1])
+        except PyMongoError as e:
+            inserted, errors = 0, len(documents)
+            self._record_failures("historical_data", [doc["symbol"] for doc in documents])
+            print(f"Insert into {collection.full_name} failed:", e)
+
+        self.stats["write_seconds"] += time.time() - started
+        self.stats["ops"] += len(documents)
+        self.stats["batches"] += 1
+        self.stats["upserted"] += inserted
+        self.stats["errors"] += errors
+
+    def _write_batch(self, collection, operations, symbols):
+        """bulk_write operations; symbols[i] is the symbol of operations[i], for counting failures"""
+        started = time.time()
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            upserted, modified, errors = result.upserted_count, result.modified_count, 0
+        except BulkWriteError as e:
+            # Unordered: everything except the failed operations was still applied
+            details = e.details
+            write_errors = details.get("writeErrors", [])
+            upserted, modified = details.get("nUpserted", 0), details.get("nModified", 0)
+            errors = len(write_errors)
+            self._record_failures(collection.name, [symbols[error["index"]] for error in write_errors])
+            print(f"Bulk write to {collection.full_name} had {errors} failed operations:", write_errors[:1])
+        except PyMongoError as e:
+            upserted, modified, errors = 0, 0, len(operations)
+            self._record_failures(collection.name, symbols)
+            print(f"Bulk write to {collection.full_name} failed:", e)
+
+        self.stats["write_seconds"] += time.time() - started
+        self.stats["ops"] += len(operations)
+        self.stats["batches"] += 1
+        self.stats["upserted"] += upserted
+        self.stats["modified"] += modified
+        self.stats["errors"] += errors
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval / 2):
+            with self._lock:
+                due = self._oldest_pending is not None and time.time() - self._oldest_pending >= self.flush_interval
+            if due:
+                self.flush()
+
+    def ops_per_second(self):
+        """Operations written per second spent inside bulk_write"""
+        if not self.stats["write_seconds"]:
+            return 0.0
+        return self.stats["ops"] / self.stats["write_seconds"]
+
+    def report(self):
+        s = self.stats
+        print(f"Mongo writes: {s['ops']} ops in {s['batches']} batches, {s['upserted']} upserted, "
+              f"{s['modified']} modified, {s['skipped']} unchanged skipped, {s['errors']} errors, "
+              f"{self.ops_per_second():.0f} ops/sec")
+
+    def close(self):
+        """Stop the background flusher and write anything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,338 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from CompleteDataScraping_withPreprocessing import (
+    clean_announcement_text,
+    clean_numeric_value,
+    format_date_for_id,
+    writer,
+    NSE_BASE_URL,
+)
+from typed_schema import typed_document
+from browser_factory import create_browser, profile_path
+from page_readiness import document_ready, wait_for
+from scrape_checkpoints import since_date, new_announcements, advance_written_checkpoint, start_run, mark_done, finish_run
+
+RUN_NAME = "scrape_nse_api"
+
+# Concurrent HTTP fetches (and pooled keep-alive connections)
+MAX_WORKERS = 8
+
+# Upper bound on requests per second across all threads
+REQUESTS_PER_SECOND = 5
+
+# NSE rejects historical ranges much longer than this, so longer ranges are fetched in chunks
+HISTORICAL_CHUNK_DAYS = 90
+
+# CH_* fields of /api/historical/cm/equity -> (document key, decimals)
+HISTORICAL_FIELDS = [
+    ("CH_OPENING_PRICE", "OPEN", 2),
+    ("CH_TRADE_HIGH_PRICE", "HIGH", 2),
+    ("CH_TRADE_LOW_PRICE", "LOW", 2),
+    ("CH_PREVIOUS_CLS_PRICE", "PREV_CLOSE", 2),
+    ("CH_LAST_TRADED_PRICE", "LTP", 2),
+    ("CH_CLOSING_PRICE", "CLOSE", 2),
+    ("VWAP", "VWAP", 2),
+    ("CH_52WEEK_HIGH_PRICE", "52W_H", 2),
+    ("CH_52WEEK_LOW_PRICE", "52W_L", 2),
+    ("CH_TOT_TRADED_QTY", "VOLUME", 0),
+    ("CH_TOT_TRADED_VAL", "VALUE", 2),
+    ("CH_TOTAL_TRADES", "No_of_Trades", 0),
+]
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def bootstrap_cookies(base_url=NSE_BASE_URL):
+    """Open the site once in Chrome and return (cookies, user_agent) for plain HTTP requests"""
+    driver = create_browser(profile_dir=profile_path("api"))
+    try:
+        driver.get(base_url + "/market-data/live-equity-market")
+        # The anti-bot scripts have set their cookies once the page has finished loading
+        wait_for(driver, document_ready(), "api_cookies")
+        cookies = {c["name"]: c["value"] for c in driver.get_cookies()}
+        user_agent = driver.execute_script("return navigator.userAgent;")
+    finally:
+        driver.quit()
+    return cookies, user_agent
+
+def create_session(cookies=None, user_agent=None, pool_size=MAX_WORKERS, base_url=NSE_BASE_URL):
+    """requests.Session with keep-alive connection pooling and retries on throttling/server errors"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": user_agent or "Mozilla/5.0",
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": base_url + "/",
+    })
+    if cookies:
+        session.cookies.update(cookies)
+    return session
+
+class NseApiClient:
+    """Fetches NSE JSON endpoints over a pooled session, re-bootstrapping cookies once if they expire.
+
+    Threads that are rejected with the same cookies share one re-bootstrap.
+    """
+
+    def __init__(self, base_url=NSE_BASE_URL, cookies=None, user_agent=None, bootstrap=True,
+                 max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
+        self.base_url = base_url.rstrip("/")
+        self.bootstrap = bootstrap
+        if cookies is None and bootstrap:
+            cookies, user_agent = bootstrap_cookies(self.base_url)
+        self.session = create_session(cookies, user_agent, max_workers, self.base_url)
+        self.limiter = RateLimiter(requests_per_second)
+        self.max_workers = max_workers
+        self._bootstrap_lock = threading.Lock()
+        self._cookie_generation = 0  # bumped every time the cookies are re-bootstrapped
+
+    def get_json(self, path, params=None):
+        generation = self._cookie_generation
+        response = self._get(path, params)
+        if response.status_code in (401, 403) and self.bootstrap:
+            with self._bootstrap_lock:
+                # Another thread may have refreshed the cookies while this request was in flight
+                if self._cookie_generation == generation:
+                    cookies, _ = bootstrap_cookies(self.base_url)
+                    self.session.cookies.update(cookies)
+                    self._cookie_generation += 1
+            response = self._get(path, params)
+        response.raise_for_status()
+        return response.json()
+
+    def _get(self, path, params):
+        self.limiter.wait()
+        return self.session.get(self.base_url + path, params=params, timeout=20)
+
+    def equity_symbols(self, index="NIFTY 50"):
+        data = self.get_json("/api/equity-stockIndices", {"index": index})
+        # The first entry is the index itself
+        return [row["symbol"] for row in data.get("data", []) if row.get("symbol") != index]
+
+    def historical(self, symbol, from_date, to_date):
+        rows = []
+        start = from_date
+        while start <= to_date:
+            end = min(start + datetime.timedelta(days=HISTORICAL_CHUNK_DAYS - 1), to_date)
+            data = self.get_json("/api/historical/cm/equity", {
+                "symbol": symbol,
+                "series": '["EQ"]',
+                "from": start.strftime("%d-%m-%Y"),
+                "to": end.strftime("%d-%m-%Y"),
+            })
+            rows.extend(data.get("data", []))
+            start = end + datetime.timedelta(days=1)
+        return rows
+
+    def quote(self, symbol):
+        return self.get_json("/api/quote-equity", {"symbol": symbol})
+
+    def trade_info(self, symbol):
+        return self.get_json("/api/quote-equity", {"symbol": symbol, "section": "trade_info"})
+
+    def announcements(self, symbol, from_date, to_date):
+        return self.get_json("/api/corporate-announcements", {
+            "index": "equities",
+            "symbol": symbol,
+            "from_date": from_date.strftime("%d-%m-%Y"),
+            "to_date": to_date.strftime("%d-%m-%Y"),
+        })
+
+# --- Mapping API payloads to the documents the Selenium scraper stores ----------
+
+def _number(value, decimals):
+    """Round an API number to the precision the NSE page shows it with"""
+    value = clean_numeric_value(value)
+    return None if value is None else round(value, decimals)
+
+def historical_documents(rows):
+    documents = []
+    for row in rows:
+        date = row.get("mTIMESTAMP") or datetime.datetime.strptime(row["CH_TIMESTAMP"], "%Y-%m-%d").strftime("%d-%b-%Y")
+        entry = {"_id": date, "Date": date, "Series": row.get("CH_SERIES", "")}
+        for field, key, decimals in HISTORICAL_FIELDS:
+            entry[key] = _number(row.get(field), decimals)
+        documents.append(typed_document("historical_data", entry))
+    return documents
+
+def trade_information_document(trade_info, quote, scraped_at):
+    book = trade_info.get("marketDeptOrderBook", {})
+    trade = book.get("tradeInfo", {})
+    delivery = trade_info.get("securityWiseDP", {})
+    return typed_document("trade_information", {
+        "_id": format_date_for_id(scraped_at),
+        "Traded Volume (Lakhs)": _number(trade.get("totalTradedVolume"), 2),
+        "Traded Value (₹ Cr)": _number(trade.get("totalTradedValue"), 2),
+        "Total Market Cap (₹ Cr)": _number(trade.get("totalMarketCap"), 2),
+        "Free Float Market Cap (₹ Cr)": _number(trade.get("ffmc"), 2),
+        "Impact Cost": _number(trade.get("impactCost"), 2),
+        "% of Deliverable / Traded Quantity": _number(delivery.get("deliveryToTradedQuantity"), 2),
+        "Applicable Margin Rate": _number(book.get("valueAtRisk", {}).get("applicableMarginRate"), 2),
+        "Face Value": _number(quote.get("securityInfo", {}).get("faceValue"), 0),
+        "Scraped_At": scraped_at
+    })
+
+def price_information_document(trade_info, quote, scraped_at):
+    price = quote.get("priceInfo", {})
+    week = price.get("weekHighLow", {})
+    trade = trade_info.get("marketDeptOrderBook", {}).get("tradeInfo", {})
+    return typed_document("price_information", {
+        "_id": format_date_for_id(scraped_at),
+        "52 Week High": _number(week.get("max"), 2),
+        "52 Week High Date": week.get("maxDate", ""),
+        "52 Week Low": _number(week.get("min"), 2),
+        "52 Week Low Date": week.get("minDate", ""),
+        "Upper Band": _number(price.get("upperCP"), 2),
+        "Lower Band": _number(price.get("lowerCP"), 2),
+        "Price Band (%)": clean_numeric_value(price.get("pPriceBand")),
+        "Daily Volatility": _number(trade.get("cmDailyVolatility"), 2),
+        "Annualised Volatility": _number(trade.get("cmAnnualVolatility"), 2),
+        "Tick Size": _number(price.get("tickSize"), 2),
+        "Scraped_At": scraped_at
+    })
+
+def securities_information_document(quote, scraped_at):
+    info = quote.get("securityInfo", {})
+    metadata = quote.get("metadata", {})
+    return typed_document("securities_information", {
+        "_id": format_date_for_id(scraped_at),
+        "Status": metadata.get("status", ""),
+        "Trading Status": info.get("tradingStatus", ""),
+        "Date of Listing": metadata.get("listingDate", ""),
+        "Adjusted P/E": metadata.get("pdSectorPe"),
+        "Symbol P/E": metadata.get("pdSymbolPe"),
+        "Index": metadata.get("pdSectorInd", "").strip(),
+        "Basic Industry": quote.get("industryInfo", {}).get("basicIndustry", ""),
+        "Scraped_At": scraped_at
+    })
+
+def announcement_documents(symbol, announcements):
+    documents = []
+    for a in announcements:
+        subject = (a.get("desc") or "").strip()
+        announcement_text = (a.get("attchmntText") or "").strip()
+        broadcast_time = (a.get("an_dt") or "").strip()
+        if not subject and not announcement_text:
+            continue
+        documents.append(typed_document("announcements", {
+            "Subject": subject,
+            "Announcement": clean_announcement_text(announcement_text),
+            "Broadcast Date/Time": broadcast_time
+        }, symbol))
+    return documents
+
+# --- Fetch mode ---------------------------------------------------------------
+
+def fetch_company(api, symbol, days=365):
+    """Fetch everything the Selenium scraper collects for one symbol, as {collection: [documents]}.
+
+    Only the range since the symbol's checkpoints is requested; the first fetch covers the last `days` days.
+    """
+    to_date = datetime.date.today()
+    from_date = since_date(symbol, days)
+    # Announcements have their own mark: they may have failed in a run where the historical data was stored
+    announcements_from = since_date(symbol, days, mark="last_broadcast_time")
+    quote = api.quote(symbol)
+    trade_info = api.trade_info(symbol)
+    scraped_at = datetime.datetime.now()
+    return {
+        "historical_data": historical_documents(api.historical(symbol, from_date, to_date)),
+        "trade_information": [trade_information_document(trade_info, quote, scraped_at)],
+        "price_information": [price_information_document(trade_info, quote, scraped_at)],
+        "securities_information": [securities_information_document(quote, scraped_at)],
+        "announcements": new_announcements(symbol, announcement_documents(symbol, api.announcements(symbol, announcements_from, to_date))),
+    }
+
+def fetch_quote(api, symbol):
+    """Just the intraday collections (trade and price information) for one symbol"""
+    quote = api.quote(symbol)
+    trade_info = api.trade_info(symbol)
+    scraped_at = datetime.datetime.now()
+    return {
+        "trade_information": [trade_information_document(trade_info, quote, scraped_at)],
+        "price_information": [price_information_document(trade_info, quote, scraped_at)],
+    }
+
+def store_company(symbol, documents):
+    for collection_name, docs in documents.items():
+        writer.upsert_many(symbol, collection_name, docs)
+    if not advance_written_checkpoint(writer, symbol, documents["historical_data"], documents["announcements"]):
+        raise RuntimeError(f"some of {symbol}'s documents failed to write")
+
+def scrape_nse_api(symbols=None, api=None, max_workers=MAX_WORKERS):
+    """Fetch and store the given symbols (default: the NIFTY 50 constituents) concurrently over the JSON API"""
+    api = api or NseApiClient(max_workers=max_workers)
+    if symbols is None:
+        symbols = api.equity_symbols()
+
+    def _fetch_and_store(symbol):
+        try:
+            documents = fetch_company(api, symbol)
+            store_company(symbol, documents)
+            mark_done(RUN_NAME, symbol)
+            counts = ", ".join(f"{name}={len(docs)}" for name, docs in documents.items())
+            print(f"Fetched and stored {symbol}: {counts}")
+            return symbol, None
+        except Exception as e:
+            print(f"Failed to fetch {symbol}:", e)
+            return symbol, str(e)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_fetch_and_store, start_run(RUN_NAME, symbols)))
+    writer.flush()
+    finish_run(RUN_NAME)
+
+    failed = [symbol for symbol, error in results if error]
+    print(f"\nFetched {len(results) - len(failed)}/{len(results)} companies in {time.time() - started:.1f}s.")
+    writer.report()
+    return results
+
+def scrape_nse_quotes(symbols=None, api=None, max_workers=MAX_WORKERS):
+    """Refresh trade and price information for the given symbols (default: the NIFTY 50 constituents)"""
+    api = api or NseApiClient(max_workers=max_workers)
+    if symbols is None:
+        symbols = api.equity_symbols()
+
+    def _fetch_and_store(symbol):
+        try:
+            for collection_name, docs in fetch_quote(api, symbol).items():
+                writer.upsert_many(symbol, collection_name, docs)
+            return symbol, None
+        except Exception as e:
+            print(f"Failed to fetch quote for {symbol}:", e)
+            return symbol, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_fetch_and_store, symbols))
+    writer.flush()
+
+    failed = [symbol for symbol, error in results if error]
+    print(f"Refreshed quotes for {len(results) - len(failed)}/{len(results)} companies.")
+    return results
+
+if __name__ == "__main__":
+    scrape_nse_api()
@@ -0,0 +1,357 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+
+# Recordings are stored here by default, one directory per recording
+RECORDINGS_DIR = os.path.join(os.path.expanduser("~"), ".nse_scraper", "recordings")
+
+# Recorded and replayed scrapes write here instead of production: their own market and state databases (NSE_REPLAY=1
+# selects mongo_writer.SCRATCH_MARKET_DB and scrape_checkpoints.SCRATCH_STATE_DB), and their own downloads, caches,
+# reports and browser profiles under SCRATCH_DIR
+SCRATCH_DIR = os.path.join(os.path.expanduser("~"), ".nse_scraper", "replay")
+
+# Modules that read those settings from the environment when first imported
+_PRODUCTION_SETTING_MODULES = (
+    "CompleteDataScraping_withPreprocessing", "mongo_writer", "scrape_checkpoints", "columnar_cache", "run_metrics",
+    "browser_factory",
+)
+
+UPSTREAM_URL = "https://www.nseindia.com"
+
+# What record and benchmark drive: the Selenium scraper (pages and CSV downloads) or the JSON API client (nse_api)
+BACKENDS = ("selenium", "api")
+
+# Headers that describe one hop, or that the server recomputes for the body it actually sends
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "te", "trailer", "upgrade",
+                "content-length", "content-encoding", "host", "accept-encoding"}
+
+# Query values that change from day to day (from/to dates), ignored when no exact recording matches
+_DATE_VALUE = re.compile(r"^(\d{1,2}-\d{1,2}-\d{4}|\d{1,2}-[A-Za-z]{3}-\d{4}|\d{4}-\d{2}-\d{2})$")
+
+# Cookie attributes that would stop the browser from keeping an nseindia.com cookie on http://127.0.0.1
+_COOKIE_SCOPE = re.compile(r";\s*(domain=[^;]*|secure|samesite=none)(?=;|$)", re.IGNORECASE)
+
+# Text bodies have absolute links to the site rewritten to the local server
+_TEXT_TYPES = ("text/", "application/json", "application/javascript", "application/x-javascript")
+
+def request_key(method, path):
+    """'GET /api/x?b=2&a=1' -> 'GET /api/x?a=1&b=2'"""
+    parts = urlsplit(path)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return f"{method} {parts.path}?{urlencode(query)}"
+
+def loose_key(method, path):
+    """request_key with date-valued query parameters wildcarded"""
+    parts = urlsplit(path)
+    query = sorted((k, "*" if _DATE_VALUE.match(v) else v) for k, v in parse_qsl(parts.query, keep_blank_values=True))
+    return f"{method} {parts.path}?{urlencode(query)}"
+
+class Recording:
+    """Responses on disk: index.json maps request keys to {status, headers, body file}, bodies live in bodies/"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.body_dir = os.path.join(directory, "bodies")
+        os.makedirs(self.body_dir, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.json")
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.misses = []
+        self._lock = threading.Lock()
+        self._reindex()
+
+    def _reindex(self):
+        self._loose = {}
+        self._by_path = {}
+        for key, entry in self.entries.items():
+            method, path = key.split(" ", 1)
+            self._loose[loose_key(method, path)] = key
+            self._by_path[f"{method} {urlsplit(path).path}"] = key
+
+    def add(self, method, path, status, headers, body):
+        name = hashlib.sha1(body).hexdigest()
+        with open(os.path.join(self.body_dir, name), "wb") as f:
+            f.write(body)
+        key = request_key(method, path)
+        with self._lock:
+            self.entries[key] = {"status": status, "headers": headers, "body": name}
+            self._loose[loose_key(method, path)] = key
+            self._by_path[f"{method} {urlsplit(path).path}"] = key
+
+    def lookup(self, method, path):
+        """(status, headers, body) for the request: exact match, then ignoring dates, then the path alone"""
+        with self._lock:
+            key = request_key(method, path)
+            if key not in self.entries:
+                key = self._loose.get(loose_key(method, path)) or self._by_path.get(f"{method} {urlsplit(path).path}")
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses.append(f"{method} {path}")
+                return None
+        with open(os.path.join(self.body_dir, entry["body"]), "rb") as f:
+            return entry["status"], entry["headers"], f.read()
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self.entries, indent=1, sort_keys=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.index_path)
+
+# --- Local server -------------------------------------------------------------
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serves recorded responses, or (when upstream is set) forwards to the live site and records what comes back"""
+
+    protocol_version = "HTTP/1.1"
+    recording = None
+    upstream = None
+    session = None
+    local_url = None
+    latency = 0.0
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond()
+
+    def _respond(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            entry = self._forward(body) if self.upstream else self.recording.lookup(self.command, self.path)
+        except requests.RequestException as e:
+            print(f"Upstream request failed for {self.path}:", e)
+            entry = None
+        if self.latency:
+            time.sleep(self.latency)
+        if entry is None:
+            self.send_error(404 if not self.upstream else 502)
+            return
+        status, headers, content = entry
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    def _forward(self, body):
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in _HOP_HEADERS}
+        for name in ("Origin", "Referer"):
+            if name in headers:
+                headers[name] = headers[name].replace(self.local_url, self.upstream)
+        response = self.session.request(self.command, self.upstream + self.path, headers=headers, data=body or None,
+                                        timeout=30, allow_redirects=False)
+        content = response.content
+        if response.headers.get("Content-Type", "").startswith(_TEXT_TYPES):
+            content = content.replace(self.upstream.encode(), self.local_url.encode())
+
+        out_headers = []
+        for name, value in response.headers.items():
+            lower = name.lower()
+            if lower in _HOP_HEADERS or lower == "set-cookie":
+                continue
+            if lower == "location":
+                value = value.replace(self.upstream, self.local_url)
+            out_headers.append((name, value))
+        # requests folds repeated Set-Cookie headers into one, so read them from the raw response
+        for cookie in response.raw.headers.getlist("Set-Cookie"):
+            out_headers.append(("Set-Cookie", _COOKIE_SCOPE.sub("", cookie)))
+
+        self.recording.add(self.command, self.path, response.status_code, out_headers, content)
+        return response.status_code, out_headers, content
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(recording, upstream=None, port=0, latency=0.0):
+    """Start the server on a background thread and return (server, base_url); stop it with server.shutdown()"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = None
+    if upstream:
+        # The browser sends its own cookies through the proxy; the session must not add or keep any
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    server.RequestHandlerClass = type("BoundReplayHandler", (ReplayHandler,), {
+        "recording": recording,
+        "upstream": upstream.rstrip("/") if upstream else None,
+        "session": session,
+        "local_url": base_url,
+        "latency": latency,
+    })
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+def _isolate_from_production(base_url):
+    """Point the scraper at base_url and at scratch databases and folders, before any of it is imported"""
+    loaded = [name for name in _PRODUCTION_SETTING_MODULES if name in sys.modules]
+    if loaded:
+        raise RuntimeError(f"{', '.join(loaded)} already imported with production settings; "
+                           "run nse_replay in a process of its own")
+    os.environ.update({
+        "NSE_BASE_URL": base_url,
+        "NSE_REPLAY": "1",
+        "NSE_DOWNLOAD_DIR": os.path.join(SCRATCH_DIR, "downloads"),
+        "NSE_CACHE_DIR": os.path.join(SCRATCH_DIR, "columnar"),
+        "NSE_METRICS_DIR": os.path.join(SCRATCH_DIR, "metrics"),
+        "NSE_PROFILE_ROOT": os.path.join(SCRATCH_DIR, "profiles"),
+    })
+
+def reset_scratch_state():
+    """Drop the scratch databases and downloads so the next run requests the same full pages as the first"""
+    from mongo_writer import MARKET_DB, SCRATCH_MARKET_DB
+    from scrape_checkpoints import STATE_DB, SCRATCH_STATE_DB, client
+    from CompleteDataScraping_withPreprocessing import writer
+    # Refuse to drop anything _isolate_from_production did not redirect
+    if (MARKET_DB, STATE_DB) != (SCRATCH_MARKET_DB, SCRATCH_STATE_DB):
+        raise RuntimeError(f"scraper is using {MARKET_DB}/{STATE_DB}, not the replay scratch databases")
+    client.drop_database(SCRATCH_MARKET_DB)
+    client.drop_database(SCRATCH_STATE_DB)
+    # The shared writer created its indexes (and the time-series bars collection) in the dropped database
+    writer.forget_indexes()
+    shutil.rmtree(os.environ["NSE_DOWNLOAD_DIR"], ignore_errors=True)
+
+# --- Commands -----------------------------------------------------------------
+
+def record(recording_dir, upstream=UPSTREAM_URL, backend="selenium"):
+    """Run scrape_nse_historical_data (or, for the api backend, scrape_nse_api) against the live site through the
+    recording proxy"""
+    recording = Recording(recording_dir)
+    server, base_url = serve(recording, upstream=upstream)
+    _isolate_from_production(base_url)
+
+    try:
+        reset_scratch_state()
+        if backend == "api":
+            from nse_api import NseApiClient, scrape_nse_api
+            # The cookie bootstrap goes through the proxy too, so the recording has the page that sets them
+            scrape_nse_api(api=NseApiClient(base_url))
+        else:
+            from CompleteDataScraping_withPreprocessing import scrape_nse_historical_data
+            scrape_nse_historical_data()
+    finally:
+        server.shutdown()
+        recording.save()
+    print(f"Recorded {len(recording.entries)} responses to {recording_dir}")
+
+def benchmark_summary(report):
+    seconds = report["seconds"] or 1e-9
+    rows = sum(s["rows"] for s in report["stages"].values())
+    return {
+        "seconds": report["seconds"],
+        "companies": report["companies"]["ok"],
+        "failed": report["companies"]["failed"],
+        "companies_per_min": round(report["companies"]["ok"] / seconds * 60, 2),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1),
+        "stages": {name: {"count": s["count"], "avg_seconds": round(s["seconds"] / s["count"], 3),
+                          "max_seconds": s["max_seconds"]}
+                   for name, s in report["stages"].items()},
+        "browser_startups": report["browsers"]["startups"],
+    }
+
+def api_benchmark_summary(results, seconds, rows):
+    failed = sum(1 for _, error in results if error)
+    return {
+        "seconds": seconds,
+        "companies": len(results) - failed,
+        "failed": failed,
+        "companies_per_min": round((len(results) - failed) / (seconds or 1e-9) * 60, 2),
+        "rows": rows,
+        "rows_per_sec": round(rows / (seconds or 1e-9), 1),
+        "stages": {},
+        "browser_startups": 0,
+    }
+
+def _run_api(base_url):
+    from nse_api import NseApiClient, scrape_nse_api, writer
+    # The replay server does not check cookies, so no browser is started
+    api = NseApiClient(base_url, bootstrap=False)
+    ops, started = writer.stats["ops"], time.time()
+    results = scrape_nse_api(api=api)
+    return api_benchmark_summary(results, round(time.time() - started, 3), writer.stats["ops"] - ops)
+
+def print_benchmark(summary):
+    print(f"\n{summary['companies']} companies ({summary['failed']} failed) in {summary['seconds']:.1f}s: "
+          f"{summary['companies_per_min']} companies/min, {summary['rows']} rows, {summary['rows_per_sec']} rows/sec")
+    for name, s in summary["stages"].items():
+        print(f"  {name:<28} n={s['count']:<4} avg={s['avg_seconds']:.3f}s max={s['max_seconds']:.3f}s")
+
+def benchmark(recording_dir, runs_count=1, latency=0.0, backend="selenium"):
+    """Replay a recording runs_count times through scrape_nse_historical_data (or, for the api backend,
+    scrape_nse_api) and report throughput per run"""
+    recording = Recording(recording_dir)
+    if not recording.entries:
+        raise SystemExit(f"No recording in {recording_dir}; run 'python nse_replay.py record' first")
+    server, base_url = serve(recording, latency=latency)
+    _isolate_from_production(base_url)
+    from CompleteDataScraping_withPreprocessing import scrape_nse_historical_data
+
+    summaries = []
+    try:
+        for n in range(runs_count):
+            reset_scratch_state()
+            if backend == "api":
+                summary = _run_api(base_url)
+            else:
+                # Later runs reuse the warm browser, so the first run is the only one that pays for startup
+                summary = benchmark_summary(scrape_nse_historical_data(keep_warm=True))
+            summaries.append(summary)
+            print(f"\nRun {n + 1}/{runs_count}")
+            print_benchmark(summary)
+    finally:
+        server.shutdown()
+    if recording.misses:
+        print(f"\n{len(recording.misses)} requests were not in the recording, e.g. {recording.misses[:5]}")
+    return summaries
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Record NSE pages once and replay them for offline scraper benchmarks")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    for name, help_text in [("record", "scrape the live site through the recording proxy"),
+                            ("serve", "serve a recording until interrupted"),
+                            ("benchmark", "time scrape_nse_historical_data against a recording")]:
+        cmd = commands.add_parser(name, help=help_text)
+        cmd.add_argument("name", nargs="?", default="default", help="recording name under " + RECORDINGS_DIR)
+        if name != "record":
+            cmd.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+        if name != "serve":
+            cmd.add_argument("--backend", choices=BACKENDS, default="selenium",
+                             help="scrape with the Selenium scraper or the JSON API client")
+    commands.choices["serve"].add_argument("--port", type=int, default=8765)
+    commands.choices["benchmark"].add_argument("--runs", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    directory = os.path.join(RECORDINGS_DIR, args.name)
+    if args.command == "record":
+        record(directory, backend=args.backend)
+    elif args.command == "serve":
+        replay_server, url = serve(Recording(directory), port=args.port, latency=args.latency)
+        print(f"Replaying {directory} at {url} (set NSE_BASE_URL={url}, and NSE_REPLAY=1 and NSE_DOWNLOAD_DIR to "
+              "keep the scrape out of production)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            replay_server.shutdown()
+    elif args.command == "benchmark":
+        benchmark(directory, args.runs, args.latency, args.backend)
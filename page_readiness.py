@@ -0,0 +1,158 @@
+import threading
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# Timeout (seconds) used for any step not listed in STEP_TIMEOUTS
+DEFAULT_TIMEOUT = 20
+
+# Per-step timeouts, keyed by the step name passed to wait_for()
+STEP_TIMEOUTS = {
+    "live_equity_table": 30,
+    "company_tab_opened": 15,
+    "company_page_ready": 30,
+    "historical_table": 30,
+    "historical_filtered": 30,
+    "trade_information": 20,
+    "price_information": 20,
+    "securities_information": 20,
+    "announcements_tab_opened": 15,
+    "announcements_table": 30,
+    "search_suggestions": 20,
+    "company_link": 30,
+    "api_cookies": 30,
+}
+
+# How often conditions are re-evaluated
+POLL_INTERVAL = 0.1
+
+# Row selectors for the NSE tables the scrapers wait on
+LIVE_EQUITY_ROWS = "#equityStockTable tbody tr"
+HISTORICAL_ROWS = "#equityHistoricalTable tbody tr"
+ANNOUNCEMENT_ROWS = "#CFanncEquityTable table tbody tr"
+QUOTE_ANNOUNCEMENT_ROWS = "#corpAnnouncementTable table tbody tr"
+
+# Every wait_for() call appends {"step", "waited", "timeout", "ok"} here
+step_timings = []
+_timings_lock = threading.Lock()
+
+def record_step(step, waited, timeout, ok):
+    with _timings_lock:
+        step_timings.append({"step": step, "waited": round(waited, 3), "timeout": timeout, "ok": ok})
+
+def reset_step_timings():
+    with _timings_lock:
+        del step_timings[:]
+
+def summarize_step_timings():
+    """Total, max and count of waits per step, slowest total first"""
+    summary = {}
+    with _timings_lock:
+        timings = list(step_timings)
+    for t in timings:
+        s = summary.setdefault(t["step"], {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+        s["count"] += 1
+        s["total"] += t["waited"]
+        s["max"] = max(s["max"], t["waited"])
+        if not t["ok"]:
+            s["timeouts"] += 1
+    return dict(sorted(summary.items(), key=lambda item: item[1]["total"], reverse=True))
+
+def print_step_timings():
+    for step, s in summarize_step_timings().items():
+        print(f"{step:<28} count={s['count']:<4} total={s['total']:.2f}s max={s['max']:.2f}s timeouts={s['timeouts']}")
+
+def wait_for(driver, condition, step, timeout=None, required=True):
+    """Block until condition(driver) is truthy, recording how long the step waited.
+
+    Raises TimeoutException when the step times out, unless required is False, in which case False is returned.
+    """
+    if timeout is None:
+        timeout = STEP_TIMEOUTS.get(step, DEFAULT_TIMEOUT)
+    started = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        record_step(step, time.time() - started, timeout, False)
+        if required:
+            raise
+        return False
+    record_step(step, time.time() - started, timeout, True)
+    return result
+
+# --- Conditions ---------------------------------------------------------------
+# Each returns a callable taking the driver, usable with wait_for() or WebDriverWait.until()
+
+def document_ready():
+    return lambda driver: driver.execute_script("return document.readyState") == "complete"
+
+def clickable(locator):
+    return EC.element_to_be_clickable(locator)
+
+def new_window_opened(known_handles):
+    """Return the handle of a window that is not in known_handles once one appears"""
+    known_handles = set(known_handles)
+    def _condition(driver):
+        new_handles = [h for h in driver.window_handles if h not in known_handles]
+        return new_handles[0] if new_handles else False
+    return _condition
+
+def element_has_text(element_id):
+    """Element exists and has non-empty, non-placeholder text"""
+    def _condition(driver):
+        elements = driver.find_elements(By.ID, element_id)
+        if not elements:
+            return False
+        text = elements[0].text.strip()
+        return elements[0] if text and text != "-" else False
+    return _condition
+
+def _row_count(driver, rows_css):
+    return driver.execute_script("return document.querySelectorAll(arguments[0]).length;", rows_css)
+
+def rows_present(rows_css, min_rows=1):
+    """At least min_rows rows match rows_css"""
+    return lambda driver: _row_count(driver, rows_css) >= min_rows
+
+def rows_stable(rows_css, quiet_period=0.75, min_rows=1):
+    """Row count is at least min_rows and has not changed for quiet_period seconds"""
+    state = {"count": None, "since": None}
+    def _condition(driver):
+        count = _row_count(driver, rows_css)
+        now = time.time()
+        if count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return count >= min_rows and now - state["since"] >= quiet_period
+    return _condition
+
+def table_signature(driver, rows_css):
+    """Cheap fingerprint of a table: row count plus the text of the first and last row"""
+    return driver.execute_script(
+        "var rows = document.querySelectorAll(arguments[0]);"
+        "if (!rows.length) return [0, '', ''];"
+        "return [rows.length, rows[0].textContent, rows[rows.length - 1].textContent];",
+        rows_css,
+    )
+
+def table_refreshed(rows_css, before, quiet_period=0.75, change_grace=5):
+    """Table content differs from the `before` signature and has stopped changing.
+
+    If the content never changes (e.g. the filter matched what was already shown), the table is accepted once it
+    has been stable for change_grace seconds.
+    """
+    state = {"signature": None, "since": None, "started": time.time()}
+    def _condition(driver):
+        signature = table_signature(driver, rows_css)
+        now = time.time()
+        if signature != state["signature"]:
+            state["signature"], state["since"] = signature, now
+            return False
+        if not signature[0]:
+            return False
+        changed = signature != before
+        stable_for = now - state["since"]
+        return stable_for >= quiet_period and (changed or now - state["started"] >= change_grace)
+    return _condition
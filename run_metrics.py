@@ -0,0 +1,184 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+from page_readiness import summarize_step_timings, reset_step_timings
+from download_manager import download_stats, reset_download_stats
+from browser_factory import summarize_browser_stats, reset_browser_stats
+
+# JSON run reports and Prometheus text files (node_exporter textfile-collector format) are written here
+METRICS_DIR = os.environ.get("NSE_METRICS_DIR", os.path.join(os.path.expanduser("~"), ".nse_scraper", "metrics"))
+
+# Every finished stage appends {"company", "stage", "seconds", "rows", "errors"} here
+stage_records = []
+
+# Every finished company appends {"company", "ok", "seconds", "errors"} here
+company_records = []
+
+_run = {"name": None, "started": None}
+_records_lock = threading.Lock()
+
+# The company and stage being timed on this thread (pool and queue workers each scrape their own company)
+_current = threading.local()
+
+def begin_run_metrics(run_name):
+    """Forget earlier records (including waits, downloads and browser stats) and start timing a new run"""
+    with _records_lock:
+        del stage_records[:]
+        del company_records[:]
+        _run.update(name=run_name, started=time.time())
+    # A long-lived process (the scheduler, benchmark --runs N) reports each run on its own
+    reset_step_timings()
+    reset_download_stats()
+    reset_browser_stats()
+
+# --- Per-company stopwatch ----------------------------------------------------
+
+def _close_stage():
+    stage = getattr(_current, "stage", None)
+    if stage is None:
+        return
+    stage["seconds"] = round(time.time() - stage.pop("started"), 3)
+    with _records_lock:
+        stage_records.append(stage)
+    _current.stage = None
+
+def begin_company(company_name):
+    _close_stage()
+    _current.company = {"company": company_name, "started": time.time(), "errors": 0}
+    _current.stage = None
+
+def track_stage(stage_name):
+    """End the current stage (if any) and start timing stage_name for this thread's company"""
+    _close_stage()
+    company = getattr(_current, "company", None)
+    if company is None:
+        return
+    _current.stage = {"company": company["company"], "stage": stage_name, "started": time.time(), "rows": 0, "errors": 0}
+
+def stage_rows(count):
+    stage = getattr(_current, "stage", None)
+    if stage is not None and count:
+        stage["rows"] += count
+
+def stage_error():
+    stage = getattr(_current, "stage", None)
+    if stage is not None:
+        stage["errors"] += 1
+    company = getattr(_current, "company", None)
+    if company is not None:
+        company["errors"] += 1
+
+def end_company(ok):
+    _close_stage()
+    company = getattr(_current, "company", None)
+    if company is None:
+        return
+    company["ok"] = bool(ok)
+    company["seconds"] = round(time.time() - company.pop("started"), 3)
+    with _records_lock:
+        company_records.append(company)
+    _current.company = None
+
+# --- Reports ------------------------------------------------------------------
+
+def summarize_stages():
+    """Totals per stage, slowest total first"""
+    summary = {}
+    with _records_lock:
+        records = list(stage_records)
+    for r in records:
+        s = summary.setdefault(r["stage"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "errors": 0})
+        s["count"] += 1
+        s["seconds"] = round(s["seconds"] + r["seconds"], 3)
+        s["max_seconds"] = max(s["max_seconds"], r["seconds"])
+        s["rows"] += r["rows"]
+        s["errors"] += r["errors"]
+    return dict(sorted(summary.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+def build_report(writer=None):
+    with _records_lock:
+        stages = list(stage_records)
+        companies = list(company_records)
+    finished = time.time()
+    started = _run["started"] or finished
+    downloads = list(download_stats)
+    return {
+        "run": _run["name"],
+        "started_at": datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "finished_at": datetime.datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+        "seconds": round(finished - started, 3),
+        "companies": {
+            "ok": sum(1 for c in companies if c["ok"]),
+            "failed": sum(1 for c in companies if not c["ok"]),
+            "records": companies,
+        },
+        "stages": summarize_stages(),
+        "stage_records": stages,
+        "waits": summarize_step_timings(),
+        "downloads": {"files": len(downloads), "bytes": sum(d["bytes"] for d in downloads)},
+        "browsers": summarize_browser_stats(),
+        "mongo": dict(writer.stats) if writer is not None else None,
+    }
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def prometheus_text(report):
+    run = _label(report["run"])
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join([f'run="{run}"'] + [f'{k}="{_label(v)}"' for k, v in labels.items()])
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    stages = report["stages"].items()
+    metric("nse_scraper_stage_seconds", "gauge", "Seconds spent in each stage during the last run",
+           [({"stage": name}, s["seconds"]) for name, s in stages])
+    metric("nse_scraper_stage_runs", "gauge", "Times each stage ran during the last run",
+           [({"stage": name}, s["count"]) for name, s in stages])
+    metric("nse_scraper_stage_rows", "gauge", "Rows produced by each stage during the last run",
+           [({"stage": name}, s["rows"]) for name, s in stages])
+    metric("nse_scraper_stage_errors", "gauge", "Errors in each stage during the last run",
+           [({"stage": name}, s["errors"]) for name, s in stages])
+    metric("nse_scraper_companies", "gauge", "Companies scraped during the last run",
+           [({"status": "ok"}, report["companies"]["ok"]), ({"status": "failed"}, report["companies"]["failed"])])
+    metric("nse_scraper_run_seconds", "gauge", "Duration of the last run", [({}, report["seconds"])])
+    metric("nse_scraper_run_finished_timestamp_seconds", "gauge", "Unix time the last run finished",
+           [({}, round(time.time()))])
+    metric("nse_scraper_download_bytes", "gauge", "Bytes of CSV downloaded during the last run",
+           [({}, report["downloads"]["bytes"])])
+    if report["mongo"]:
+        metric("nse_scraper_mongo_ops", "gauge", "Bulk write operations sent during the last run",
+               [({}, report["mongo"]["ops"])])
+        metric("nse_scraper_mongo_write_seconds", "gauge", "Seconds spent in bulk_write during the last run",
+               [({}, round(report["mongo"]["write_seconds"], 3))])
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_run_report(writer=None, metrics_dir=METRICS_DIR):
+    """Write <run>_<timestamp>.json and <run>.prom to metrics_dir and return the report"""
+    report = build_report(writer)
+    os.makedirs(metrics_dir, exist_ok=True)
+    run = report["run"] or "run"
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = os.path.join(metrics_dir, f"{run}_{stamp}.json")
+    _write_atomic(json_path, json.dumps(report, indent=2, default=str))
+    _write_atomic(os.path.join(metrics_dir, f"{run}.prom"), prometheus_text(report))
+    print_stage_summary()
+    print(f"Run report written to {json_path}")
+    return report
+
+def print_stage_summary():
+    for stage, s in summarize_stages().items():
+        print(f"{stage:<28} count={s['count']:<4} total={s['seconds']:.2f}s max={s['max_seconds']:.2f}s "
+              f"rows={s['rows']} errors={s['errors']}")
@@ -0,0 +1,265 @@
+import argparse
+import datetime
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from CompleteDataScraping_withPreprocessing import scrape_nse_historical_data
+from nse_api import NseApiClient, scrape_nse_quotes
+from scrape_checkpoints import STATE_DB
+
+# MongoDB Setup
+client = MongoClient("mongodb://localhost:27017/")
+state_db = client[STATE_DB]
+
+# One document per job: {_id: job name, next_run, last_success, failures, last_error, updated_at} (times in IST)
+schedule = state_db["schedule"]
+
+# {_id: LOCK_NAME, owner, lease_expires}: a scrape only starts while its scheduler holds this
+locks = state_db["locks"]
+
+# One document per NSE trading holiday: {_id: "YYYY-MM-DD", description}; weekends are always closed
+holidays = state_db["holidays"]
+
+LOCK_NAME = "scrape"
+
+# Market hours; every schedule time is naive exchange time
+IST = ZoneInfo("Asia/Kolkata")
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+
+# historical_data once per trading day after the close, trade/price information every N minutes in the session
+HISTORICAL_RUN_AT = datetime.time.fromisoformat(os.environ.get("NSE_HISTORICAL_RUN_AT", "16:30"))
+INTRADAY_EVERY_MINUTES = int(os.environ.get("NSE_INTRADAY_EVERY_MINUTES", "30"))
+
+# Shared by every job: API requests per second, and the quiet gap between the end of one run and the next start
+REQUESTS_PER_SECOND = 2
+MIN_SECONDS_BETWEEN_RUNS = 60
+
+# A failed run is retried after BACKOFF_BASE_SECONDS * 2**(failures - 1), capped, times a random 0.5-1.5
+BACKOFF_BASE_SECONDS = 120
+BACKOFF_MAX_SECONDS = 3600
+
+# Scheduled starts drift by up to this much so runs do not hit the site on the same second every day
+START_JITTER_SECONDS = 90
+
+# The lock lease is renewed while a run is in progress, so a crashed scheduler frees it within LOCK_SECONDS
+LOCK_SECONDS = 600
+LOCK_HEARTBEAT_SECONDS = 60
+
+# How often the scheduler wakes up to look for due jobs
+TICK_SECONDS = 30
+
+HOLIDAY_API_PATH = "/api/holiday-master"
+
+def ist_now():
+    return datetime.datetime.now(IST).replace(tzinfo=None)
+
+# --- Trading calendar ---------------------------------------------------------
+
+def refresh_holidays(api):
+    """Store NSE's capital-market trading holidays for the current year; returns how many were stored"""
+    data = api.get_json(HOLIDAY_API_PATH, {"type": "trading"})
+    count = 0
+    for row in data.get("CM", []):
+        day = datetime.datetime.strptime(row["tradingDate"], "%d-%b-%Y").date()
+        holidays.update_one({"_id": day.isoformat()}, {"$set": {"description": row.get("description", "")}}, upsert=True)
+        count += 1
+    print(f"Stored {count} NSE trading holidays.")
+    return count
+
+def is_trading_day(day):
+    return day.weekday() < 5 and holidays.find_one({"_id": day.isoformat()}) is None
+
+def next_trading_day(day):
+    day += datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return day
+
+def in_session(moment):
+    return is_trading_day(moment.date()) and MARKET_OPEN <= moment.time() < MARKET_CLOSE
+
+def next_historical_run(after):
+    """HISTORICAL_RUN_AT on the first trading day whose run time is still after `after`"""
+    day = after.date()
+    if not (is_trading_day(day) and after.time() < HISTORICAL_RUN_AT):
+        day = next_trading_day(day)
+    return datetime.datetime.combine(day, HISTORICAL_RUN_AT)
+
+def next_intraday_run(after):
+    """INTRADAY_EVERY_MINUTES after `after` if the market is still open then, otherwise the next open"""
+    candidate = after + datetime.timedelta(minutes=INTRADAY_EVERY_MINUTES)
+    if in_session(candidate):
+        return candidate
+    day = candidate.date()
+    if not (is_trading_day(day) and candidate.time() < MARKET_OPEN):
+        day = next_trading_day(day)
+    return datetime.datetime.combine(day, MARKET_OPEN)
+
+# --- Jobs ---------------------------------------------------------------------
+
+def run_historical(api):
+    report = scrape_nse_historical_data(keep_warm=True)
+    companies = report["companies"]
+    if companies["failed"] and not companies["ok"]:
+        raise RuntimeError(f"all {companies['failed']} companies failed")
+
+def run_intraday(api):
+    # The quote endpoints return trade and price information together, so one job refreshes both collections
+    results = scrape_nse_quotes(api=api)
+    failed = [symbol for symbol, error in results if error]
+    if results and len(failed) == len(results):
+        raise RuntimeError(f"all {len(failed)} quotes failed")
+
+# name -> how to run it, when it is next due after a successful run, and whether it may only run in the session
+JOBS = {
+    "historical_data": {"run": run_historical, "next_run": next_historical_run, "session_only": False},
+    "trade_information": {"run": run_intraday, "next_run": next_intraday_run, "session_only": True},
+}
+
+def job_state(name):
+    schedule.update_one(
+        {"_id": name},
+        {"$setOnInsert": {"next_run": ist_now(), "failures": 0, "updated_at": datetime.datetime.now()}},
+        upsert=True
+    )
+    return schedule.find_one({"_id": name})
+
+def backoff_seconds(failures):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (failures - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+def _set_next_run(name, next_run, **fields):
+    fields.update({"next_run": next_run, "updated_at": datetime.datetime.now()})
+    schedule.update_one({"_id": name}, {"$set": fields})
+
+# --- Lock against overlapping runs --------------------------------------------
+
+def acquire_lock(owner, name=LOCK_NAME):
+    """Take the lock if it is free, expired or already ours; returns False if another scheduler holds it"""
+    now = datetime.datetime.now()
+    try:
+        lock = locks.find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"lease_expires": {"$lt": now}}]},
+            {"$set": {"owner": owner, "acquired_at": now, "lease_expires": now + datetime.timedelta(seconds=LOCK_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The lock document exists and belongs to someone else, so the upsert tried to insert a second one
+        return False
+    return lock is not None
+
+def release_lock(owner, name=LOCK_NAME):
+    locks.delete_one({"_id": name, "owner": owner})
+
+@contextmanager
+def scrape_lock(owner, name=LOCK_NAME):
+    """Yield True while holding the lock (renewing it in the background), or False if it is taken"""
+    if not acquire_lock(owner, name):
+        yield False
+        return
+    stop = threading.Event()
+    def _renew():
+        while not stop.wait(LOCK_HEARTBEAT_SECONDS):
+            acquire_lock(owner, name)
+    renewer = threading.Thread(target=_renew, daemon=True)
+    renewer.start()
+    try:
+        yield True
+    finally:
+        stop.set()
+        renewer.join()
+        release_lock(owner, name)
+
+# --- Scheduler loop -----------------------------------------------------------
+
+_last_run_finished = {"at": 0.0}
+
+def run_job(name, api, owner):
+    """Run one job under the lock and schedule its next run; returns True/False, or None if the lock was taken"""
+    job = JOBS[name]
+    with scrape_lock(owner) as held:
+        if not held:
+            print(f"Another scrape holds the lock; {name} will be retried.")
+            return None
+        started = ist_now()
+        print(f"[{started:%Y-%m-%d %H:%M}] Running {name}")
+        try:
+            job["run"](api)
+        except Exception as e:
+            failures = job_state(name).get("failures", 0) + 1
+            retry_at = ist_now() + datetime.timedelta(seconds=backoff_seconds(failures))
+            _set_next_run(name, retry_at, failures=failures, last_error=str(e)[:1000])
+            print(f"{name} failed ({failures} in a row), retrying at {retry_at:%Y-%m-%d %H:%M}:", e)
+            return False
+        finally:
+            _last_run_finished["at"] = time.time()
+
+    next_run = job["next_run"](started) + datetime.timedelta(seconds=random.uniform(0, START_JITTER_SECONDS))
+    _set_next_run(name, next_run, last_success=started, failures=0, last_error=None)
+    print(f"{name} done, next run at {next_run:%Y-%m-%d %H:%M}")
+    return True
+
+def run_due_jobs(api, owner):
+    for name, job in JOBS.items():
+        now = ist_now()
+        state = job_state(name)
+        if state["next_run"] > now:
+            continue
+        if job["session_only"] and not in_session(now):
+            _set_next_run(name, job["next_run"](now))
+            continue
+        # Global rate limit between runs; the job stays due and is picked up on a later tick
+        if time.time() - _last_run_finished["at"] < MIN_SECONDS_BETWEEN_RUNS:
+            return
+        run_job(name, api, owner)
+
+def run_scheduler(api=None):
+    """Run due jobs forever, refreshing the holiday calendar once a day"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    api = api or NseApiClient(requests_per_second=REQUESTS_PER_SECOND)
+    holidays_refreshed_on = None
+    while True:
+        if holidays_refreshed_on != ist_now().date():
+            try:
+                refresh_holidays(api)
+                holidays_refreshed_on = ist_now().date()
+            except Exception as e:
+                print("Failed to refresh NSE holidays (only weekends will be skipped until it works):", e)
+        run_due_jobs(api, owner)
+        time.sleep(TICK_SECONDS)
+
+def scheduler_status():
+    for name in JOBS:
+        state = job_state(name)
+        print(f"{name:<18} next={state['next_run']:%Y-%m-%d %H:%M} last_success={state.get('last_success')} "
+              f"failures={state.get('failures', 0)} last_error={state.get('last_error')}")
+    lock = locks.find_one({"_id": LOCK_NAME})
+    print(f"lock held by {lock['owner']} until {lock['lease_expires']}" if lock else "lock free")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run NSE scrapes on the trading calendar")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="run due jobs until interrupted")
+    once_cmd = commands.add_parser("once", help="run one job now (still under the lock)")
+    once_cmd.add_argument("job", choices=sorted(JOBS))
+    commands.add_parser("status", help="show when each job runs next")
+    commands.add_parser("holidays", help="refresh the trading holiday calendar")
+    args = arg_parser.parse_args()
+
+    if args.command == "run":
+        run_scheduler()
+    elif args.command == "once":
+        run_job(args.job, NseApiClient(requests_per_second=REQUESTS_PER_SECOND), f"{socket.gethostname()}:{os.getpid()}")
+    elif args.command == "status":
+        scheduler_status()
+    elif args.command == "holidays":
+        refresh_holidays(NseApiClient(requests_per_second=REQUESTS_PER_SECOND))
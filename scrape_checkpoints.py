@@ -0,0 +1,170 @@
+import datetime
+import os
+from dateutil import parser
+from pymongo import MongoClient
+
+# MongoDB Setup
+client = MongoClient("mongodb://localhost:27017/")
+
+# Recorded and replayed scrapes (nse_replay, which sets NSE_REPLAY=1) keep their state here instead
+SCRATCH_STATE_DB = "nse_replay_state"
+
+# Checkpoints, runs, the job queue and the scheduler's state all live in this database
+STATE_DB = SCRATCH_STATE_DB if os.environ.get("NSE_REPLAY") == "1" else os.environ.get("NSE_STATE_DB", "scraper_state")
+state_db = client[STATE_DB]
+
+# One document per symbol: {_id: symbol, last_trade_date, last_broadcast_time, updated_at}
+checkpoints = state_db["checkpoints"]
+
+# One document per named run and trading date: {_id: "<run_name>:<date>", run_name, date, done: [symbols...],
+# started_at, completed}. A run only resumes on the day it was interrupted; older days' documents are dropped
+runs = state_db["runs"]
+
+# run_name -> _id of the run opened by this process, so a run that crosses midnight keeps one document
+_open_runs = {}
+
+# Smallest NSE period filter covering a gap of N days: (max days, historical filter id, announcements data-val)
+PERIOD_FILTERS = [
+    (7, "oneW", "1W"),
+    (30, "oneM", "1M"),
+    (91, "threeM", "3M"),
+    (182, "sixM", "6M"),
+    (365, "oneY", "1Y"),
+]
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return parser.parse(value, dayfirst=True)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+# --- Per-symbol high-water marks ----------------------------------------------
+
+def get_checkpoint(symbol):
+    return checkpoints.find_one({"_id": symbol}) or {}
+
+def update_checkpoint(symbol, last_trade_date=None, last_broadcast_time=None):
+    """Move the symbol's high-water marks forward (never backwards)"""
+    marks = {}
+    if last_trade_date is not None:
+        marks["last_trade_date"] = last_trade_date
+    if last_broadcast_time is not None:
+        marks["last_broadcast_time"] = last_broadcast_time
+    if not marks:
+        return
+    checkpoints.update_one(
+        {"_id": symbol},
+        {"$max": marks, "$set": {"updated_at": datetime.datetime.now()}},
+        upsert=True
+    )
+
+def _smallest_period(mark, default):
+    """The PERIOD_FILTERS entry covering everything since mark (default when there is no mark)"""
+    if mark is None:
+        return default
+    gap = (datetime.datetime.now() - mark).days + 1
+    for period in PERIOD_FILTERS:
+        if gap <= period[0]:
+            return period
+    return default
+
+def period_filter(symbol, default=PERIOD_FILTERS[-1]):
+    """(historical filter id, announcements data-val) of the smallest periods covering everything since each mark.
+
+    The historical period follows last_trade_date and the announcements period last_broadcast_time, so a company
+    whose announcements failed in an earlier run gets the whole gap asked for again.
+    """
+    checkpoint = get_checkpoint(symbol)
+    return (_smallest_period(checkpoint.get("last_trade_date"), default)[1],
+            _smallest_period(checkpoint.get("last_broadcast_time"), default)[2])
+
+def since_date(symbol, default_days=365, mark="last_trade_date"):
+    """First date that still needs fetching for symbol: the date of its mark (last_trade_date or
+    last_broadcast_time), or default_days ago"""
+    value = get_checkpoint(symbol).get(mark)
+    if value is None:
+        return datetime.date.today() - datetime.timedelta(days=default_days)
+    return value.date()
+
+def new_historical_rows(symbol, docs, date_key="Date"):
+    """Drop rows older than the stored high-water mark; the last stored day is kept so late corrections still land"""
+    last_trade_date = get_checkpoint(symbol).get("last_trade_date")
+    if last_trade_date is None:
+        return list(docs)
+    return [doc for doc in docs if (_parse_date(doc[date_key]) or last_trade_date) >= last_trade_date]
+
+def new_announcements(symbol, docs, time_key="Broadcast Date/Time"):
+    """Drop announcements broadcast at or before the stored high-water mark"""
+    last_broadcast_time = get_checkpoint(symbol).get("last_broadcast_time")
+    if last_broadcast_time is None:
+        return list(docs)
+    return [doc for doc in docs if (_parse_date(doc[time_key]) or datetime.datetime.max) > last_broadcast_time]
+
+def advance_checkpoint(symbol, historical_docs=(), announcement_docs=(), date_key="Date", time_key="Broadcast Date/Time"):
+    """Record the newest trade date and broadcast time among documents that have been written"""
+    trade_dates = [d for d in (_parse_date(doc[date_key]) for doc in historical_docs) if d]
+    broadcast_times = [t for t in (_parse_date(doc[time_key]) for doc in announcement_docs) if t]
+    update_checkpoint(
+        symbol,
+        last_trade_date=max(trade_dates) if trade_dates else None,
+        last_broadcast_time=max(broadcast_times) if broadcast_times else None,
+    )
+
+def advance_written_checkpoint(writer, symbol, historical_docs=(), announcement_docs=()):
+    """Flush writer, then advance_checkpoint for the collections whose documents for symbol were all written;
+    returns False if any failed (their mark stays put, so the next run fetches them again)"""
+    writer.flush()
+    failed = {name: writer.take_failures(symbol, name) for name in ("historical_data", "announcements")}
+    for name, count in failed.items():
+        if count:
+            print(f"{symbol}: {count} {name} documents failed to write; not advancing that checkpoint")
+    advance_checkpoint(
+        symbol,
+        () if failed["historical_data"] else historical_docs,
+        () if failed["announcements"] else announcement_docs,
+    )
+    return not any(failed.values())
+
+# --- Resumable runs -----------------------------------------------------------
+
+def _run_id(run_name):
+    return _open_runs.get(run_name) or f"{run_name}:{datetime.date.today().isoformat()}"
+
+def open_run(run_name):
+    """Open today's run of run_name and return the items (symbols) it already finished: those of an interrupted
+    run from earlier today, or none for a new run. Runs from earlier days are never resumed."""
+    today = datetime.date.today().isoformat()
+    run_id = f"{run_name}:{today}"
+    _open_runs[run_name] = run_id
+    runs.delete_many({"run_name": run_name, "_id": {"$ne": run_id}})
+    runs.delete_one({"_id": run_name})  # from before runs were kept per day
+    run = runs.find_one({"_id": run_id})
+    if run and not run.get("completed"):
+        return set(run.get("done", []))
+
+    runs.replace_one(
+        {"_id": run_id},
+        {"_id": run_id, "run_name": run_name, "date": today, "done": [], "started_at": datetime.datetime.now(),
+         "completed": False},
+        upsert=True
+    )
+    return set()
+
+def start_run(run_name, items):
+    """Return the items (symbols) still to do: all of them for a new run, or the unfinished ones if today's run
+    was interrupted"""
+    items = list(items)
+    done = open_run(run_name)
+    if not done:
+        return items
+    remaining = [item for item in items if item not in done]
+    print(f"Resuming interrupted run '{run_name}': {len(items) - len(remaining)} done, {len(remaining)} remaining.")
+    return remaining
+
+def mark_done(run_name, item):
+    runs.update_one({"_id": _run_id(run_name)}, {"$addToSet": {"done": item}})
+
+def finish_run(run_name):
+    runs.update_one({"_id": _run_id(run_name)}, {"$set": {"completed": True, "finished_at": datetime.datetime.now()}})
@@ -0,0 +1,128 @@
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from page_readiness import wait_for, rows_present, print_step_timings, LIVE_EQUITY_ROWS
+from download_manager import print_download_stats
+from browser_factory import print_browser_stats
+from run_metrics import begin_run_metrics, write_run_report
+
+from CompleteDataScraping_withPreprocessing import (
+    DOWNLOAD_DIR,
+    LIVE_EQUITY_URL,
+    create_driver,
+    live_equity_symbols,
+    scrape_company,
+    writer,
+)
+from scrape_checkpoints import open_run, mark_done, finish_run
+
+RUN_NAME = "scrape_nse_historical_data_parallel"
+
+# Every worker gets its own Chrome profile and download directory under here
+WORKER_DIR = os.path.join(DOWNLOAD_DIR, "_workers")
+
+# Default cap on the number of browsers running at the same time
+MAX_WORKERS = 4
+
+def worker_directories(worker_id):
+    """Create and return the (download_dir, profile_dir) pair owned by one worker"""
+    worker_root = os.path.join(WORKER_DIR, f"worker_{worker_id}")
+    download_dir = os.path.join(worker_root, "downloads")
+    profile_dir = os.path.join(worker_root, "profile")
+    os.makedirs(download_dir, exist_ok=True)
+    os.makedirs(profile_dir, exist_ok=True)
+    return download_dir, profile_dir
+
+def _start_worker_driver(download_dir, profile_dir):
+    """Launch a driver for a worker and open the live equity table"""
+    driver = create_driver(download_dir, profile_dir)
+    driver.get(LIVE_EQUITY_URL)
+    wait_for(driver, rows_present(LIVE_EQUITY_ROWS, min_rows=2), "live_equity_table")  # Let the main table load
+    return driver
+
+def _quit_driver(driver):
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def _run_worker(worker_id, jobs, results, done):
+    """Pull row indices off the queue until it is empty, scraping each one with this worker's driver.
+
+    A row is resolved to its symbol in this worker's own table; symbols in done (finished earlier today) are skipped.
+    """
+    download_dir, profile_dir = worker_directories(worker_id)
+    driver = None
+
+    while True:
+        try:
+            i = jobs.get_nowait()
+        except queue.Empty:
+            break
+
+        symbol = None
+        try:
+            if driver is None:
+                driver = _start_worker_driver(download_dir, profile_dir)
+                main_tab = driver.current_window_handle
+
+            symbols = live_equity_symbols(driver, [i])
+            if not symbols:
+                raise RuntimeError(f"row {i} of the live equity table is empty")
+            symbol = symbols[0]
+            if symbol in done:
+                print(f"[worker {worker_id}] {symbol} was already scraped today; skipping")
+                continue
+
+            company_name = scrape_company(driver, symbol, main_tab, download_dir)
+            if company_name:
+                mark_done(RUN_NAME, symbol)
+            results.append({"row": i, "worker": worker_id, "company": company_name, "error": None})
+        except Exception as e:
+            print(f"[worker {worker_id}] Error processing company {symbol or f'in row {i}'}:", str(e))
+            results.append({"row": i, "worker": worker_id, "company": None, "error": str(e)})
+
+            # Throw the browser away so a crashed or stuck session cannot fail the rest of this worker's jobs
+            _quit_driver(driver)
+            driver = None
+
+    _quit_driver(driver)
+
+def scrape_nse_historical_data_parallel(rows=range(2, 7), max_workers=MAX_WORKERS):
+    """Scrape the given equityStockTable rows using up to max_workers isolated browsers"""
+    begin_run_metrics(RUN_NAME)
+    # Rows are only resolved to symbols once each worker has its table open, so today's done symbols are
+    # skipped by the workers
+    done = open_run(RUN_NAME)
+    if done:
+        print(f"Resuming interrupted run '{RUN_NAME}': {len(done)} companies already done today.")
+    jobs = queue.Queue()
+    for i in rows:
+        jobs.put(i)
+
+    worker_count = max(1, min(max_workers, jobs.qsize()))
+    results = []
+    started = time.time()
+
+    with ThreadPoolExecutor(max_workers=worker_count) as pool:
+        futures = [pool.submit(_run_worker, worker_id, jobs, results, done) for worker_id in range(worker_count)]
+        for future in futures:
+            future.result()
+
+    writer.flush()
+    finish_run(RUN_NAME)
+    elapsed = time.time() - started
+    scraped = [r for r in results if r["company"]]
+    print(f"\nCompleted scraping {len(scraped)}/{len(results)} companies with {worker_count} workers in {elapsed:.1f}s.")
+    print_step_timings()
+    print_download_stats()
+    print_browser_stats()
+    writer.report()
+    write_run_report(writer)
+    return results
+
+if __name__ == "__main__":
+    scrape_nse_historical_data_parallel()
@@ -0,0 +1,205 @@
+import datetime
+import hashlib
+import re
+import sys
+import pandas as pd
+from bson.int64 import Int64
+from dateutil import parser
+from pymongo import MongoClient, ReplaceOne, DeleteOne
+
+from mongo_writer import MARKET_DB, SCRATCH_MARKET_DB
+from scrape_checkpoints import STATE_DB, SCRATCH_STATE_DB
+
+# MongoDB Setup
+client = MongoClient("mongodb://localhost:27017/")
+
+# Per collection: which fields are doubles, int64s and datetimes, the format NSE prints each date in, and either
+# the field whose typed value becomes the _id or the fields whose content hash does
+SCHEMAS = {
+    "historical_data": {
+        "float": ["OPEN", "HIGH", "LOW", "PREV_CLOSE", "LTP", "CLOSE", "VWAP", "52W_H", "52W_L", "VALUE"],
+        "int": ["VOLUME", "No_of_Trades"],
+        "datetime": {"Date": "%d-%b-%Y"},
+        "id": "Date",
+    },
+    "announcements": {
+        "datetime": {"Broadcast Date/Time": "%d-%b-%Y %H:%M:%S"},
+        "hash": ["Broadcast Date/Time", "Subject", "Announcement"],
+    },
+    "trade_information": {
+        "float": ["Traded Volume (Lakhs)", "Traded Value (₹ Cr)", "Total Market Cap (₹ Cr)",
+                  "Free Float Market Cap (₹ Cr)", "Impact Cost", "% of Deliverable / Traded Quantity",
+                  "Applicable Margin Rate", "Face Value",
+                  # complete_data_scraping_one_company.py labels these with "Cr."
+                  "Traded Value (₹ Cr.)", "Total Market Cap (₹ Cr.)", "Free Float Market Cap (₹ Cr.)"],
+    },
+    "price_information": {
+        "float": ["52 Week High", "52 Week Low", "Upper Band", "Lower Band", "Price Band (%)",
+                  "Daily Volatility", "Annualised Volatility", "Tick Size"],
+        "datetime": {"52 Week High Date": "%d-%b-%Y", "52 Week Low Date": "%d-%b-%Y"},
+    },
+    "securities_information": {
+        "float": ["Adjusted P/E", "Symbol P/E"],
+        "datetime": {"Date of Listing": "%d-%b-%Y"},
+    },
+}
+
+# Databases that are not a per-symbol database of the old layout
+SYSTEM_DATABASES = {"admin", "config", "local", "scraper_state", STATE_DB, MARKET_DB,
+                    SCRATCH_STATE_DB, SCRATCH_MARKET_DB}
+
+MIGRATION_BATCH_SIZE = 1000
+
+_NOT_NUMERIC = re.compile(r"[^0-9.\-]")
+
+# Display artefacts that differ between the page, the CSV and the API but do not change the content
+_TEXT_NOISE = re.compile(r"(\s*read less)?[\s.!?]*$")
+
+# --- Single values ------------------------------------------------------------
+
+def to_float(value):
+    """'1,234.50' / '₹ 12.3' / 12 -> float; None for blanks and placeholders such as '-'"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    try:
+        return float(_NOT_NUMERIC.sub("", str(value)))
+    except ValueError:
+        return None
+
+def to_int(value):
+    number = to_float(value)
+    return None if number is None else Int64(round(number))
+
+def to_datetime(value, fmt=None):
+    """Parse an NSE date string (trying fmt first); datetimes pass through, unparseable text is returned unchanged"""
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    if value is None or str(value).strip() in ("", "-"):
+        return None
+    text = " ".join(str(value).split())
+    if fmt:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    try:
+        return parser.parse(text, dayfirst=True)
+    except (ValueError, OverflowError):
+        return value
+
+def _normalized_part(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    text = " ".join(str(value if value is not None else "").split()).lower()
+    return _TEXT_NOISE.sub("", text)
+
+def content_id(symbol, *parts):
+    """Stable _id from the symbol and the normalized content (same text and time -> same id on every source)"""
+    key = "\x1f".join([symbol] + [_normalized_part(p) for p in parts])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def typed_document(collection_name, doc, symbol=None):
+    """Copy of doc with the collection's numeric and date fields converted to doubles, int64s and datetimes"""
+    schema = SCHEMAS.get(collection_name, {})
+    typed = dict(doc)
+    for field in schema.get("float", []):
+        if field in typed:
+            typed[field] = to_float(typed[field])
+    for field in schema.get("int", []):
+        if field in typed:
+            typed[field] = to_int(typed[field])
+    for field, fmt in schema.get("datetime", {}).items():
+        if field in typed:
+            typed[field] = to_datetime(typed[field], fmt)
+    id_field = schema.get("id")
+    if id_field and isinstance(typed.get(id_field), datetime.datetime):
+        typed["_id"] = typed[id_field]
+    hash_fields = schema.get("hash")
+    if hash_fields and symbol is not None:
+        typed["_id"] = content_id(symbol, *(typed.get(field) for field in hash_fields))
+    return typed
+
+# --- Whole DataFrames (CSV ingest) --------------------------------------------
+
+def typed_frame(collection_name, frame, symbol=None):
+    """Vectorized typed_document: returns a copy of frame whose columns hold floats, Int64s and datetimes"""
+    schema = SCHEMAS.get(collection_name, {})
+    frame = frame.copy()
+    for field in schema.get("float", []) + schema.get("int", []):
+        if field in frame.columns:
+            frame[field] = pd.to_numeric(frame[field].astype(str).str.replace(_NOT_NUMERIC, "", regex=True), errors="coerce")
+    for field in schema.get("int", []):
+        if field in frame.columns:
+            frame[field] = frame[field].round().astype("Int64")
+    for field, fmt in schema.get("datetime", {}).items():
+        if field in frame.columns:
+            text = frame[field].astype(str).str.split().str.join(" ")
+            parsed = pd.to_datetime(text, format=fmt, errors="coerce")
+            # Only rows that do not match the usual format go through the slower dateutil path
+            missed = parsed.isna() & ~text.isin(["", "-"])
+            if missed.any():
+                parsed[missed] = pd.to_datetime(text[missed].map(lambda v: to_datetime(v, fmt)), errors="coerce")
+            frame[field] = parsed
+    id_field = schema.get("id")
+    if id_field and id_field in frame.columns:
+        frame["_id"] = frame[id_field].where(frame[id_field].notna(), frame.get("_id"))
+    hash_fields = schema.get("hash")
+    if hash_fields and symbol is not None:
+        frame["_id"] = [content_id(symbol, *parts) for parts in zip(*(frame[field] for field in hash_fields))]
+    return frame
+
+def frame_records(frame, collection_name=None):
+    """frame.to_dict("records") with BSON-friendly values: None for NaN/NaT, datetime and Int64 instead of numpy types"""
+    int_fields = set(SCHEMAS.get(collection_name, {}).get("int", []))
+    columns = {}
+    for name in frame.columns:
+        series = frame[name]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = [None if pd.isna(v) else v.to_pydatetime() for v in series]
+        elif name in int_fields:
+            values = [None if pd.isna(v) else Int64(v) for v in series]
+        else:
+            values = [None if (v is None or (isinstance(v, float) and v != v)) else v for v in series.tolist()]
+        columns[name] = values
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+# --- One-shot migration of string-typed collections ---------------------------
+
+def migrate_collection(collection, collection_name=None):
+    """Rewrite every document of collection in typed form; returns the number of documents changed"""
+    collection_name = collection_name or collection.name
+    changed = 0
+    ops = []
+    for doc in collection.find():
+        typed = typed_document(collection_name, doc, collection.database.name)
+        if typed == doc:
+            continue
+        # historical_data and announcements get new _ids, so the original has to be replaced, not updated
+        if typed["_id"] != doc["_id"]:
+            ops.append(DeleteOne({"_id": doc["_id"]}))
+        ops.append(ReplaceOne({"_id": typed["_id"]}, typed, upsert=True))
+        changed += 1
+        if len(ops) >= MIGRATION_BATCH_SIZE:
+            collection.bulk_write(ops, ordered=True)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=True)
+    return changed
+
+def migrate_all(symbols=None):
+    """Migrate the typed collections of every symbol database (or just the given symbols)"""
+    symbols = symbols or [name for name in client.list_database_names() if name not in SYSTEM_DATABASES]
+    for symbol in symbols:
+        db = client[symbol]
+        existing = set(db.list_collection_names())
+        for collection_name in SCHEMAS:
+            if collection_name in existing:
+                changed = migrate_collection(db[collection_name])
+                print(f"{symbol}.{collection_name}: {changed} documents migrated")
+
+if __name__ == "__main__":
+    migrate_all(sys.argv[1:] or None)